@@ -0,0 +1,13 @@
+import argparse
+
+from src.batch import answer_questions
+from src.constants import BATCH_MAX_WORKERS
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Answer a file of (league, question) pairs offline')
+    parser.add_argument('input_path', help='JSONL or CSV file with league and question fields')
+    parser.add_argument('output_path', help='JSONL file to write answers to, existing answers are skipped')
+    parser.add_argument('--workers', type=int, default=BATCH_MAX_WORKERS, help='Number of concurrent LLM calls')
+    args = parser.parse_args()
+
+    answer_questions(input_path=args.input_path, output_path=args.output_path, max_workers=args.workers)
@@ -0,0 +1,66 @@
+import os
+import time
+import argparse
+
+import numpy as np
+
+from src.mock_mistral import start_mock_server
+
+METHODS = ['none', 'lexical', 'cross-encoder']
+
+
+def query_term_recall(query: str, full_context: str, compressed_context: str, word_pattern):
+    # Share of the query terms found in the retrieved chunks that survive compression
+    query_terms = set(word_pattern.findall(query.lower()))
+    found = query_terms & set(word_pattern.findall(full_context.lower()))
+    if not found:
+        return 1.0
+    return len(found & set(word_pattern.findall(compressed_context.lower()))) / len(found)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the prompt tokens, latency and retrieval effect of context compression')
+    parser.add_argument('--questions', default=os.path.join(os.path.dirname(__file__), '..', 'data', 'eval', 'league_questions.jsonl'))
+    parser.add_argument('--with-llm', action='store_true', help='Also time the answer generation for each prompt')
+    parser.add_argument('--mock', action='store_true', help='Use the local Mistral stand-in instead of the real API')
+    args = parser.parse_args()
+
+    # The endpoint is read when src.constants is imported, so set it before importing the pipeline
+    if args.mock:
+        os.environ['MISTRAL_ENDPOINT'] = start_mock_server(chat_latency='fixed:0.5').get_endpoint()
+        os.environ.setdefault('MISTRAL_API_KEY', 'mock')
+
+    from src.Sports import Sports
+    from src.batch import read_questions
+    from src.faiss_db import load_faiss_db, query_faiss_with_rerank
+    from src.inference import construct_prompt, invoke_llm
+    from src.context_compression import compress_context, count_tokens, WORD_PATTERN
+
+    results = {method: {'tokens': [], 'compress_seconds': [], 'llm_seconds': [], 'recall': []} for method in METHODS}
+    dbs = {}
+    for q in read_questions(args.questions):
+        sport = Sports[q['league']]
+        if sport not in dbs:
+            dbs[sport] = load_faiss_db(sport)
+        context_list = query_faiss_with_rerank(dbs[sport], query=q['question'])
+        full_context = ' '.join(doc.page_content for doc in context_list)
+
+        for method in METHODS:
+            start = time.perf_counter()
+            compressed = compress_context(context_list, query=q['question'], method=method)
+            results[method]['compress_seconds'].append(time.perf_counter() - start)
+
+            prompt = construct_prompt(sport=sport, query=q['question'], context_list=compressed, chat_history=[])
+            results[method]['tokens'].append(count_tokens(prompt))
+            results[method]['recall'].append(query_term_recall(q['question'], full_context, ' '.join(doc.page_content for doc in compressed), WORD_PATTERN))
+            if args.with_llm:
+                start = time.perf_counter()
+                invoke_llm(prompt=prompt)
+                results[method]['llm_seconds'].append(time.perf_counter() - start)
+
+    baseline_tokens = np.mean(results['none']['tokens'])
+    print(f'{"Method":<15}{"Prompt tokens":>15}{"Reduction":>11}{"Compress ms":>13}{"Term recall":>13}{"Answer s":>10}')
+    for method, result in results.items():
+        llm = f'{np.mean(result["llm_seconds"]):>10.2f}' if result['llm_seconds'] else f'{"-":>10}'
+        print(f'{method:<15}{np.mean(result["tokens"]):>15.0f}{1 - np.mean(result["tokens"]) / baseline_tokens:>11.1%}'
+              f'{np.mean(result["compress_seconds"]) * 1000:>13.1f}{np.mean(result["recall"]):>13.1%}{llm}')
@@ -0,0 +1,46 @@
+import os
+import time
+import argparse
+
+from src.mock_mistral import start_mock_server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare first question latency with and without prefetching the league')
+    parser.add_argument('--leagues', nargs='*', help='Defaults to every league')
+    parser.add_argument('--endpoint', help='Use an already running API instead of starting the local stand-in')
+    args = parser.parse_args()
+
+    # The endpoint is read when src.constants is imported, so set it before importing the pipeline
+    if args.endpoint is None:
+        args.endpoint = start_mock_server(chat_latency='fixed:0.3', embedding_latency='fixed:0.05').get_endpoint()
+    os.environ['MISTRAL_ENDPOINT'] = args.endpoint
+    os.environ.setdefault('MISTRAL_API_KEY', 'mock')
+
+    from src import pipeline
+    from src.Sports import Sports
+    from src.faiss_db import load_ranker
+    from src.prefetch import Prefetcher
+    from src.constants import STARTER_QUESTIONS
+
+    def clear_caches():
+        # Start each measurement from a freshly started app
+        pipeline._dbs.clear()
+        load_ranker.cache_clear()
+
+    print(f'{"League":<8}{"Cold":>9}{"Prefetched":>12}')
+    for sport in [Sports[league] for league in args.leagues] if args.leagues else list(Sports):
+        question = STARTER_QUESTIONS[sport.name][0]
+        clear_caches()
+        start = time.perf_counter()
+        pipeline.answer_question(sport, question)
+        cold = time.perf_counter() - start
+
+        # Prefetch as the UI does when the league is selected, then ask once it has finished
+        clear_caches()
+        prefetcher = Prefetcher(enabled=True)
+        prefetcher.prefetch(sport)
+        prefetcher.in_flight[(sport, sport.value.current_season)].result()
+        start = time.perf_counter()
+        pipeline.answer_question(sport, question, query_embedding=prefetcher.get_query_embedding(sport, question))
+        prefetched = time.perf_counter() - start
+        print(f'{sport.name:<8}{cold:>9.3f}{prefetched:>12.3f}')
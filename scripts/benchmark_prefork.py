@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure pre-fork throughput and per worker memory for 1 to N workers')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--turns', type=int, default=200, help='Turns answered at each worker count')
+    parser.add_argument('--questions', default=os.path.join(os.path.dirname(__file__), '..', 'data', 'eval', 'league_questions.jsonl'))
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    # Run the API stand-in in its own process with almost no latency, so the local CPU bound stages dominate
+    mock = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), 'mock_mistral_server.py'), '--port', str(args.port),
+                             '--chat-latency', 'fixed:0.01', '--embedding-latency', 'fixed:0.01', '--chunk-interval', '0'])
+    time.sleep(1)
+
+    # The endpoint is read when src.constants is imported, so set it before importing the pipeline
+    os.environ['MISTRAL_ENDPOINT'] = f'http://127.0.0.1:{args.port}'
+    os.environ.setdefault('MISTRAL_API_KEY', 'mock')
+    from src.batch import read_questions
+    from src.prefork import PreforkServer
+
+    questions = read_questions(args.questions)
+    requests = [{'league': q['league'], 'question': q['question']} for q in questions]
+    worker_counts = sorted({1, args.max_workers} | {n for n in [2, 4, 8, 16, 32] if n < args.max_workers})
+
+    try:
+        print(f'{"Workers":>8}{"Turns/sec":>11}{"Speedup":>9}{"RSS/worker MB":>15}{"PSS/worker MB":>15}{"Private/worker MB":>19}')
+        baseline = None
+        for num_workers in worker_counts:
+            prefork = PreforkServer(num_workers=num_workers)
+            prefork.start()
+            with ThreadPoolExecutor(max_workers=2 * num_workers) as executor:
+                list(executor.map(prefork.answer, requests[:num_workers]))  # Warm up every worker
+                start = time.perf_counter()
+                list(executor.map(prefork.answer, [requests[i % len(requests)] for i in range(args.turns)]))
+                throughput = args.turns / (time.perf_counter() - start)
+
+            memory = prefork.get_worker_memory()
+            baseline = baseline or throughput
+            average = lambda field: sum(m[field] for m in memory) / max(1, len(memory))
+            print(f'{num_workers:>8}{throughput:>11.1f}{throughput / baseline:>9.2f}{average("rss_mb"):>15.0f}{average("pss_mb"):>15.0f}{average("private_mb"):>19.0f}')
+            prefork.close()
+    finally:
+        mock.terminate()
@@ -0,0 +1,80 @@
+import os
+import time
+import argparse
+
+import numpy as np
+
+from src.mock_mistral import start_mock_server
+
+
+def rank_correlation(a: list, b: list):
+    # Spearman correlation between two sets of scores for the same passages
+    ranks_a, ranks_b = np.argsort(np.argsort(a)), np.argsort(np.argsort(b))
+    if len(a) < 2 or ranks_a.std() == 0 or ranks_b.std() == 0:
+        return 1.0
+    return float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the ONNX reranker engine with the flashrank reranker on the question set')
+    parser.add_argument('--questions', default=os.path.join(os.path.dirname(__file__), '..', 'data', 'eval', 'league_questions.jsonl'))
+    parser.add_argument('--threads', type=int, default=1, help='Intra-op threads for the ONNX engine')
+    parser.add_argument('--max-tokens', type=int, default=256, help='Tokens per pair, applied to every reranker so they score the same text')
+    parser.add_argument('--top-n', type=int, default=3)
+    parser.add_argument('--mock', action='store_true', help='Use the local Mistral stand-in to embed the questions')
+    args = parser.parse_args()
+
+    # The endpoint is read when src.constants is imported, so set it before importing the pipeline
+    if args.mock:
+        os.environ['MISTRAL_ENDPOINT'] = start_mock_server().get_endpoint()
+        os.environ.setdefault('MISTRAL_API_KEY', 'mock')
+
+    from flashrank import Ranker, RerankRequest
+    from src.Sports import Sports
+    from src.batch import read_questions
+    from src.faiss_db import load_faiss_db, query_faiss_db
+    from src.reranker import RerankerEngine, ScoreCache
+    from src.constants import MODEL_FOLDER
+
+    # Retrieve the candidates once so every reranker scores the same pairs
+    requests, dbs = [], {}
+    for q in read_questions(args.questions):
+        sport = Sports[q['league']]
+        if sport not in dbs:
+            dbs[sport] = load_faiss_db(sport)
+        docs = query_faiss_db(dbs[sport], query=q['question'], k=15)
+        requests.append(RerankRequest(query=q['question'], passages=[{'id': i, 'text': doc.page_content, 'meta': doc.metadata} for i, doc in enumerate(docs)]))
+    pairs = sum(len(request.passages) for request in requests)
+
+    rankers = {'flashrank': Ranker(model_name='ms-marco-MiniLM-L-12-v2', cache_dir=MODEL_FOLDER, max_length=args.max_tokens)}
+    for precision in ['fp32', 'int8']:
+        # A zero TTL disables the score cache so the model runs on every pair
+        rankers[f'onnx-{precision}'] = RerankerEngine(precision=precision, intra_op_threads=args.threads, max_tokens=args.max_tokens, cache=ScoreCache(ttl=0))
+
+    results = {}
+    for name, ranker in rankers.items():
+        ranker.rerank(requests[0])  # Warm up
+        start = time.perf_counter()
+        results[name] = [{r['id']: r['score'] for r in ranker.rerank(request)} for request in requests]
+        results[name + ' seconds'] = time.perf_counter() - start
+
+    print(f'{len(requests)} questions, {pairs} pairs, every reranker truncating pairs to {args.max_tokens} tokens')
+    print(f'{"Reranker":<12}{"Pairs/sec":>11}{"Top-" + str(args.top_n) + " overlap":>15}{"Spearman":>10}')
+    for name in rankers:
+        overlaps, correlations = [], []
+        for baseline, scores in zip(results['flashrank'], results[name]):
+            ids = sorted(baseline)
+            top_baseline = set(sorted(ids, key=baseline.get, reverse=True)[:args.top_n])
+            top = set(sorted(ids, key=scores.get, reverse=True)[:args.top_n])
+            overlaps.append(len(top_baseline & top) / max(1, len(top_baseline)))
+            correlations.append(rank_correlation([baseline[i] for i in ids], [scores[i] for i in ids]))
+        print(f'{name:<12}{pairs / results[name + " seconds"]:>11.1f}{np.mean(overlaps):>15.1%}{np.mean(correlations):>10.3f}')
+
+    # A repeat of the same questions within the TTL is served from the score cache
+    cached = RerankerEngine(precision='int8', intra_op_threads=args.threads, max_tokens=args.max_tokens)
+    for request in requests:
+        cached.rerank(request)
+    start = time.perf_counter()
+    for request in requests:
+        cached.rerank(request)
+    print(f'{"int8 cached":<12}{pairs / (time.perf_counter() - start):>11.1f}  (cache hits {cached.cache.hits}, misses {cached.cache.misses})')
@@ -0,0 +1,21 @@
+import argparse
+
+from src.build import build, mark_built, STAGES
+from src.constants import BUILD_MAX_WORKERS
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild the stale processed text, chunks and FAISS indexes')
+    parser.add_argument('--leagues', nargs='+', help='Only build these leagues (default: all)')
+    parser.add_argument('--stage', choices=STAGES, default=STAGES[-1], help='Last stage to build (default: index)')
+    parser.add_argument('--dry-run', action='store_true', help='List what would be rebuilt without running anything')
+    parser.add_argument('--force', action='store_true', help='Rebuild even if the outputs are up to date')
+    parser.add_argument('--mark-built', action='store_true', help='Record the existing outputs as up to date without rebuilding')
+    parser.add_argument('--fetch', action='store_true', help='Re-scrape web based rulebooks first (unchanged pages are skipped)')
+    parser.add_argument('--jobs', type=int, default=BUILD_MAX_WORKERS, help='Number of leagues to build in parallel')
+    args = parser.parse_args()
+
+    stages = STAGES[:STAGES.index(args.stage) + 1]
+    if args.mark_built:
+        mark_built(leagues=args.leagues, stages=stages)
+    else:
+        build(leagues=args.leagues, stages=stages, dry_run=args.dry_run, force=args.force, max_workers=args.jobs, fetch=args.fetch)
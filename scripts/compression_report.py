@@ -0,0 +1,20 @@
+import os
+
+from src.Sports import Sports
+from src.vector_compression import compare_compression
+from src.constants import FAISS_DB_FOLDER
+
+if __name__ == '__main__':
+    # Compare memory saved vs recall lost for every index that has its vectors on disk
+    print(f'{"League":<8}{"Method":<10}{"Bytes":>12}{"Saved":>8}{"Recall@3":>10}{"Rescored":>10}')
+    for sport in Sports:
+        index_folder = os.path.join(FAISS_DB_FOLDER, sport.value.index_name)
+        if not os.path.exists(os.path.join(index_folder, 'index.faiss')):
+            print(f'{sport.value.league_name:<8}skipped, no index.faiss')
+            continue
+
+        results = compare_compression(index_folder)
+        float_bytes = results[0]['bytes']
+        for result in results:
+            saved = 1 - result['bytes'] / float_bytes
+            print(f'{sport.value.league_name:<8}{result["method"]:<10}{result["bytes"]:>12}{saved:>8.0%}{result["recall"]:>10.3f}{result["rescored_recall"]:>10.3f}')
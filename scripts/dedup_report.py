@@ -0,0 +1,51 @@
+import os
+import pickle
+from collections import Counter
+
+import faiss
+
+from src.Sports import Sports
+from src.dedup import ChunkDeduplicator, normalized_hash
+from src.constants import FAISS_DB_FOLDER
+
+if __name__ == '__main__':
+    # Run every existing chunk through one deduplicator, in the same order the build would see them
+    deduplicator = ChunkDeduplicator()
+    total_chunks = 0
+    intra_league = Counter()
+    shared_with = Counter()
+    vector_bytes = 0
+    for sport in Sports:
+        index_pkl = os.path.join(FAISS_DB_FOLDER, sport.value.index_name, 'index.pkl')
+        if not os.path.exists(index_pkl):
+            continue
+        with open(index_pkl, 'rb') as f:
+            docstore, _ = pickle.load(f)
+        vector_bytes = faiss.read_index(os.path.join(FAISS_DB_FOLDER, sport.value.index_name, 'index.faiss')).d * 4
+
+        league = sport.value.league_name
+        seen = set()
+        for i, doc in enumerate(docstore._dict.values()):
+            total_chunks += 1
+            norm_hash = normalized_hash(doc.page_content)
+            if norm_hash in seen:
+                intra_league[league] += 1
+                continue
+            seen.add(norm_hash)
+
+            canonical = deduplicator.find_or_add((league, i), doc.page_content)
+            if canonical != (league, i):
+                shared_with[(league, canonical[0])] += 1
+
+    saved = sum(intra_league.values()) + sum(shared_with.values())
+    print(f'{total_chunks} chunks across all leagues')
+    for league, count in intra_league.items():
+        print(f'{league}: {count} exact duplicate chunks within the rulebook')
+    for (league, other), count in shared_with.most_common():
+        print(f'{league}: {count} chunks shared with {other}')
+    print(f'Embedding calls saved: {saved} ({saved / max(1, total_chunks):.1%})')
+
+    # Storing shared vectors once is deferred: every league's index is a self-contained LangChain FAISS folder that is
+    # loaded, compressed and sharded on its own, so a shared store would need its own id maps in all of those paths
+    print(f'Index bytes saved: 0. Each league\'s index still stores its own copy of a shared vector, '
+          f'storing them once would save {saved * vector_bytes / 1e6:.2f} MB of float32 vectors')
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from langchain_mistralai import MistralAIEmbeddings
+
+from src.Sports import Sports
+from src.batch import read_questions
+from src.faiss_db import load_faiss_db
+from src.league_classifier import classify_league, keyword_logits, centroid_logits, rank_leagues, load_centroids
+from src.constants import MISTRAL_API_KEY, MISTRAL_ENDPOINT, FAISS_DB_FOLDER, CLASSIFIER_LEXICON_CONFIDENCE
+
+
+def report(name: str, labels: list, predictions: list, latencies: list):
+    top1 = np.mean([ranked[0][0].name == label for label, ranked in zip(labels, predictions)])
+    any_match = np.mean([label in [sport.name for sport, _ in ranked] for label, ranked in zip(labels, predictions)])
+    print(f'{name}: top-1 accuracy {top1:.1%}, label in returned leagues {any_match:.1%}, '
+          f'latency mean {np.mean(latencies) * 1000:.2f}ms p95 {np.percentile(latencies, 95) * 1000:.2f}ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the accuracy and latency of the league classifier')
+    parser.add_argument('--questions', default=os.path.join(FAISS_DB_FOLDER, '..', 'eval', 'league_questions.jsonl'))
+    parser.add_argument('--lexicon-only', action='store_true', help='Only evaluate the keyword lexicon (no API calls)')
+    parser.add_argument('--compare-full-search', action='store_true', help='Also time searching every league index')
+    args = parser.parse_args()
+
+    questions = read_questions(args.questions)
+    labels = [q['league'] for q in questions]
+
+    # Keywords only
+    predictions, latencies = [], []
+    for q in questions:
+        start = time.perf_counter()
+        predictions.append(rank_leagues(keyword_logits(q['question'])))
+        latencies.append(time.perf_counter() - start)
+    report('Lexicon only', labels, predictions, latencies)
+    if args.lexicon_only:
+        sys.exit()
+
+    # Embed every question up front so the classifier latency excludes the API call
+    load_centroids()
+    embedding_model = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY, endpoint=MISTRAL_ENDPOINT)
+    start = time.perf_counter()
+    embeddings = embedding_model.embed_documents([q['question'] for q in questions])
+    print(f'Embedding: {(time.perf_counter() - start) / len(questions) * 1000:.2f}ms per question (batched)')
+
+    # Centroids only, to see what the keywords add on top of them
+    predictions, latencies = [], []
+    for embedding in embeddings:
+        start = time.perf_counter()
+        predictions.append(rank_leagues(centroid_logits(embedding)))
+        latencies.append(time.perf_counter() - start)
+    report('Centroids only', labels, predictions, latencies)
+
+    predictions, latencies = [], []
+    for q, embedding in zip(questions, embeddings):
+        start = time.perf_counter()
+        predictions.append(classify_league(q['question'], query_embedding=embedding)[0])
+        latencies.append(time.perf_counter() - start)
+    report('Lexicon + centroids', labels, predictions, latencies)
+
+    # The fast path only embeds when the keywords are not decisive
+    skipped = 0
+    for q in questions:
+        logits = keyword_logits(q['question'])
+        skipped += max(logits.values()) > 0 and rank_leagues(logits)[0][1] >= CLASSIFIER_LEXICON_CONFIDENCE
+    print(f'Embedding call skipped by the keyword fast path for {skipped}/{len(questions)} questions')
+
+    if args.compare_full_search:
+        dbs = [load_faiss_db(sport) for sport in Sports if os.path.exists(os.path.join(FAISS_DB_FOLDER, sport.value.index_name, 'index.faiss'))]
+        latencies = []
+        for embedding in embeddings:
+            start = time.perf_counter()
+            for db in dbs:
+                db.similarity_search_by_vector(embedding, k=15)
+            latencies.append(time.perf_counter() - start)
+        print(f'Full search of {len(dbs)} indexes: latency mean {np.mean(latencies) * 1000:.2f}ms p95 {np.percentile(latencies, 95) * 1000:.2f}ms')
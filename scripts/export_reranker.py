@@ -0,0 +1,6 @@
+from src.reranker import export_onnx_models, get_onnx_model_path
+
+if __name__ == '__main__':
+    # Writes the fp32 and int8 ONNX rerankers used when SPORTSQA_RERANKER=onnx
+    export_onnx_models()
+    print(f'Exported {get_onnx_model_path("fp32")} and {get_onnx_model_path("int8")}')
@@ -0,0 +1,38 @@
+import os
+import argparse
+
+from src.mock_mistral import start_mock_server_process
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Drive full QA turns at a target arrival rate and report per stage latency')
+    parser.add_argument('--rate', type=float, default=2.0, help='Target arrivals per second')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds to generate load for')
+    parser.add_argument('--questions', default=os.path.join(os.path.dirname(__file__), '..', 'data', 'eval', 'league_questions.jsonl'))
+    parser.add_argument('--stream', action='store_true', help='Stream the generation stage and report time to first token')
+    parser.add_argument('--endpoint', help='Use an already running API instead of starting the local stand-in')
+    parser.add_argument('--chat-latency', default='lognormal:-0.7,0.5')
+    parser.add_argument('--embedding-latency', default='fixed:0.05')
+    parser.add_argument('--chunk-interval', type=float, default=0.02)
+    parser.add_argument('--rate-limit-probability', type=float, default=0.0)
+    parser.add_argument('--no-request-policy', action='store_true', help='Send single unhedged LLM requests, to compare tail latency')
+    args = parser.parse_args()
+
+    # The endpoint is read when src.constants is imported, so set it before importing the pipeline
+    if args.endpoint is None:
+        _, args.endpoint = start_mock_server_process(chat_latency=args.chat_latency, embedding_latency=args.embedding_latency,
+                                                     chunk_interval=args.chunk_interval, rate_limit_probability=args.rate_limit_probability)
+    os.environ['MISTRAL_ENDPOINT'] = args.endpoint
+    os.environ.setdefault('MISTRAL_API_KEY', 'mock')
+    if args.no_request_policy:
+        os.environ['SPORTSQA_REQUEST_POLICY'] = '0'
+
+    from src.batch import read_questions
+    from src.load_test import run_load_test, print_summary
+    from src.inference import request_policy
+    from src.pipeline import get_pipeline_metrics
+
+    print(f'Running {args.rate} turns/sec for {args.duration}s against {args.endpoint}')
+    summary = run_load_test(read_questions(args.questions), rate=args.rate, duration=args.duration, stream=args.stream)
+    print_summary(summary)
+    print(f'Shared answers: {get_pipeline_metrics()["coalescing"]}')
+    print(f'LLM request policy: {request_policy.get_stats()}')
@@ -0,0 +1,17 @@
+import argparse
+
+from src.mock_mistral import MockMistralServer
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the Mistral chat and embeddings API')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--chat-latency', default='lognormal:-0.7,0.5', help="e.g. 'fixed:0.5', 'uniform:0.2,1.0', 'lognormal:mu,sigma', 'spike:0.5,10,0.02'")
+    parser.add_argument('--embedding-latency', default='fixed:0.05')
+    parser.add_argument('--chunk-interval', type=float, default=0.02, help='Seconds between streamed chunks')
+    parser.add_argument('--rate-limit-probability', type=float, default=0.0, help='Fraction of requests answered with a 429')
+    args = parser.parse_args()
+
+    server = MockMistralServer(args.port, chat_latency=args.chat_latency, embedding_latency=args.embedding_latency,
+                               chunk_interval=args.chunk_interval, rate_limit_probability=args.rate_limit_probability)
+    print(f'Mock Mistral API listening, run the app with MISTRAL_ENDPOINT={server.get_endpoint()}')
+    server.serve_forever()
@@ -0,0 +1,14 @@
+import argparse
+
+from src.prefork import PreforkServer, serve
+from src.constants import PREFORK_WORKERS, PREFORK_MAX_TASKS_PER_CHILD, PREFORK_PORT
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load every index and the reranker once, then answer turns from a pool of forked workers')
+    parser.add_argument('--workers', type=int, default=PREFORK_WORKERS)
+    parser.add_argument('--max-tasks-per-child', type=int, default=PREFORK_MAX_TASKS_PER_CHILD)
+    parser.add_argument('--port', type=int, default=PREFORK_PORT)
+    args = parser.parse_args()
+
+    print(f'Starting {args.workers} workers, run the app with PREFORK_ENDPOINT=http://127.0.0.1:{args.port}')
+    serve(args.port, PreforkServer(num_workers=args.workers, max_tasks_per_child=args.max_tasks_per_child))
@@ -1,9 +1,5 @@
-import os
-
-from src.Sports import Sports
-from src.constants import PROCESSED_DATA_FOLDER
+from src.build import build
 
 if __name__ == '__main__':
-    for sport in Sports:
-        if not os.path.exists(os.path.join(PROCESSED_DATA_FOLDER, f'{sport.value.league_name}_processed.txt')):
-            sport.process_text()
+    # Only reprocess the leagues whose raw rulebook or processing code changed
+    build(stages=['processed'])
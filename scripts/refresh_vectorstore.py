@@ -1,7 +1,6 @@
-from src.Sports import Sports
+from src.build import build
 
 
 if __name__ == '__main__':
-    for sport in Sports:
-        print(f'Embedding {sport.value.league_name} rules to vectorstore...')
-        sport.value.embed_document()
\ No newline at end of file
+    # Re-chunks and re-embeds every index without reprocessing the raw text, unchanged chunks still reuse their cached embeddings
+    build(stages=['chunks', 'index'], force=True)
@@ -0,0 +1,39 @@
+import time
+import argparse
+
+from langchain_mistralai import MistralAIEmbeddings
+
+from src.Sports import Sports
+from src.retrieval_service import start_retrieval_service, list_shards, ShardedRetriever
+from src.constants import MISTRAL_API_KEY, MISTRAL_ENDPOINT, RETRIEVAL_WORKERS, RETRIEVAL_BASE_PORT
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the league indexes from separate worker processes, or query them')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help='Start the shard workers')
+    serve_parser.add_argument('--workers', type=int, default=RETRIEVAL_WORKERS)
+    serve_parser.add_argument('--base-port', type=int, default=RETRIEVAL_BASE_PORT)
+    query_parser = subparsers.add_parser('query', help='Search one or more leagues through running workers')
+    query_parser.add_argument('question')
+    query_parser.add_argument('--endpoints', nargs='+', required=True)
+    query_parser.add_argument('--leagues', nargs='*', choices=[sport.name for sport in Sports], help='Defaults to every league')
+    query_parser.add_argument('-k', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        processes, endpoints = start_retrieval_service(num_workers=args.workers, base_port=args.base_port)
+        print(f'Serving {len(list_shards())} shards, run the app with RETRIEVAL_SERVICE_ENDPOINTS={",".join(endpoints)}')
+        while all(process.is_alive() for process in processes):
+            time.sleep(1)
+    else:
+        retriever = ShardedRetriever(args.endpoints)
+        shards = [shard for shard in retriever.shard_endpoints if args.leagues is None or shard[0] in args.leagues]
+        query_embedding = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY, endpoint=MISTRAL_ENDPOINT).embed_query(args.question)
+
+        start = time.perf_counter()
+        docs, missing = retriever.search(shards, query_embedding, k=args.k)
+        print(f'Searched {len(shards)} shards in {time.perf_counter() - start:.3f}s, {len(missing)} missing: {missing}')
+        for doc in docs:
+            print(f'[{doc.metadata.get("league")} {doc.metadata.get("season")}] {doc.page_content[:120]!r}')
+        for endpoint, stats in retriever.get_worker_stats().items():
+            print(f'{endpoint}: {len(stats["shards"])} shards, {len(stats["loaded"])} loaded, max RSS {stats["max_rss_mb"]:.0f} MB')
@@ -1,24 +1,173 @@
 # Imports
 import os
+import copy
+import json
+import difflib
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
 
 from langchain_community.document_loaders import TextLoader, PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
 from langchain_mistralai import MistralAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_community.document_loaders import TextLoader
 
-from src.constants import FAISS_DB_FOLDER, MISTRAL_API_KEY
+from src.embedding_cache import EmbeddingCache, hash_text
+from src.dedup import normalized_hash
+from src.vector_compression import compress_index
+from src.constants import FAISS_DB_FOLDER, MISTRAL_API_KEY, MISTRAL_ENDPOINT, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL
+from src.constants import EMBEDDING_CACHE_FOLDER, DIFF_CONTEXT_PARAGRAPHS
+from src.constants import HTTP_CACHE_FOLDER, HTTP_FIXTURES_FOLDER, HTTP_TIMEOUT_SECONDS, HTTP_POOL_SIZE, HTTP_OFFLINE, FAISS_INDEX_COMPRESSION
+
+# One pooled HTTP session shared by every sport
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=2)
+            _http_session.mount('https://', adapter)
+            _http_session.mount('http://', adapter)
+        return _http_session
 
 # Parent sports class
 class BaseSport():
-    
-    def __init__(self, raw_data_path, processed_data_path, online_link, league_name, sport_name):
+
+    def __init__(self, raw_data_path, processed_data_path, online_link, league_name, sport_name, season=None, previous_seasons=None):
         self.raw_data_path = raw_data_path
         self.processed_data_path = processed_data_path
         self.online_link = online_link
         self.league_name = league_name
         self.sport_name = sport_name
-    
+
+        # The current season uses the original file names, older seasons are added by season label
+        self.season = season
+        self.current_season = season
+        self.seasons = {season: raw_data_path}
+        self.seasons.update(previous_seasons or {})
+        self.index_name = f'faiss_index_{league_name}'
+
+    def get_seasons(self):
+        """
+        Returns the season labels from oldest to newest
+        """
+        return sorted(self.seasons)
+
+    def for_season(self, season):
+        """
+        Returns a copy of this sport pointing at the files and index for the given season
+        """
+        if season is None or season == self.current_season:
+            return self
+        if season not in self.seasons:
+            raise ValueError(f'No {self.league_name} rulebook for the {season} season')
+
+        season_obj = copy.copy(self)
+        season_obj.season = season
+        season_obj.raw_data_path = self.seasons[season]
+        season_obj.processed_data_path = self.processed_data_path.replace('_processed.txt', f'_{season}_processed.txt')
+        season_obj.index_name = f'faiss_index_{self.league_name}_{season}'
+        return season_obj
+
+    def match_season(self, year: str):
+        """
+        Returns the season label starting with the given year, e.g. '2023' -> '2023-24'
+        """
+        for season in self.get_seasons():
+            if season.startswith(year):
+                return season
+        return None
+
+    def get_http_cache_paths(self, url: str):
+        url_hash = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(HTTP_CACHE_FOLDER, f'{url_hash}.json'), os.path.join(HTTP_CACHE_FOLDER, f'{url_hash}.body')
+
+    def get_http_fixture_path(self, url: str):
+        return os.path.join(HTTP_FIXTURES_FOLDER, f'{hashlib.sha256(url.encode()).hexdigest()}.html')
+
+    def fetch(self, url: str, parse):
+        """
+        Fetches a page with a conditional request against the local response cache and parses it with parse(content).
+        The response is only cached once it has parsed, so a page that fails to parse is fetched and parsed again next time.
+        Returns the parsed page and whether it changed since it was last fetched.
+        """
+        meta_path, body_path = self.get_http_cache_paths(url)
+        cached = None
+        if os.path.exists(meta_path) and os.path.exists(body_path):
+            with open(meta_path, 'r') as f:
+                cached = json.load(f)
+
+        # Offline mode replays the recorded responses, falling back to the committed fixtures, instead of hitting the live site
+        if HTTP_OFFLINE:
+            if cached is None:
+                body_path = self.get_http_fixture_path(url)
+                if not os.path.exists(body_path):
+                    raise FileNotFoundError(f'No recorded response or fixture for {url}')
+            with open(body_path, 'rb') as f:
+                return parse(f.read()), False
+
+        headers = {}
+        if cached is not None:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = get_http_session().get(url, headers=headers, timeout=HTTP_TIMEOUT_SECONDS)
+        if response.status_code == 304 and cached is not None:
+            with open(body_path, 'rb') as f:
+                return parse(f.read()), False
+        response.raise_for_status()
+        parsed = parse(response.content)
+
+        # Save the response so the next fetch can be conditional
+        os.makedirs(HTTP_CACHE_FOLDER, exist_ok=True)
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        changed = cached is None or content_hash != cached.get('content_hash')
+        with open(body_path, 'wb') as f:
+            f.write(response.content)
+        with open(meta_path, 'w') as f:
+            json.dump({'url': url,
+                       'etag': response.headers.get('ETag'),
+                       'last_modified': response.headers.get('Last-Modified'),
+                       'content_hash': content_hash}, f)
+        return parsed, changed
+
+    def dedupe_sections(self, sections: list):
+        """
+        Drops repeated sections of text, keeping the first occurrence of each
+        """
+        seen = set()
+        unique_sections = []
+        for section in sections:
+            section_hash = hashlib.sha256(section.encode()).hexdigest()
+            if section_hash not in seen:
+                seen.add(section_hash)
+                unique_sections.append(section)
+        return unique_sections
+
+    def refresh_raw_text(self):
+        """
+        Re-scrapes the raw text of web based rulebooks if the page changed. Returns True if the raw text was rewritten.
+        """
+        if not hasattr(self, 'scrape_data'):
+            return False
+        raw_text = self.scrape_data(only_if_changed=os.path.exists(self.raw_data_path))
+        if raw_text is None:
+            return False  # The page has not changed since the last scrape
+        with open(self.raw_data_path, 'w') as f:
+            f.write(raw_text)
+        return True
+
+    def get_diff_index_name(self, from_season, to_season):
+        return f'faiss_index_{self.league_name}_diff_{from_season}_{to_season}'
+
     def load_document(self):
         """
         Loads the document using the appropriate langchain document loader and returns the result
@@ -29,24 +178,114 @@ class BaseSport():
             return TextLoader(self.processed_data_path).load()
         else:
             raise ValueError('Document type not supported')
-    
-    
+
+
     def load_processed_text(self):
         with open(self.processed_data_path, 'r') as f:
             return f.read()
-    
-    
-    def embed_document(self):
+
+
+    def load_embedding_cache(self):
+        # The cache is shared by every league and season so identical or near-identical chunks are embedded once
+        return EmbeddingCache(os.path.join(EMBEDDING_CACHE_FOLDER, 'embeddings.pkl'))
+
+
+    def chunk_document(self):
         # Load the raw text with the document loader
         docs = TextLoader(self.processed_data_path).load()
-        
+
         # Chunk the text for the FAISS db
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=250)
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
         chunked_docs = text_splitter.split_documents(docs)
+        for doc in chunked_docs:
+            doc.metadata.update({'league': self.league_name, 'season': self.season, 'chunk_hash': hash_text(doc.page_content)})
         
-        # Initialize the embedding model
-        embedding_model = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY)
-        
+        # Drop chunks that repeat earlier text in the same rulebook word for word
+        unique_docs = {}
+        for doc in chunked_docs:
+            unique_docs.setdefault(normalized_hash(doc.page_content), doc)
+        if len(unique_docs) < len(chunked_docs):
+            print(f'Dropped {len(chunked_docs) - len(unique_docs)} duplicate {self.league_name} chunks')
+        return list(unique_docs.values())
+
+
+    def embed_chunks(self, chunked_docs, embedding_cache=None):
+        # Initialize the embedding model and reuse the vectors of any chunk seen in another season
+        embedding_model = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY, endpoint=MISTRAL_ENDPOINT, model=EMBEDDING_MODEL)
+        cache = embedding_cache or self.load_embedding_cache()
+        texts = [doc.page_content for doc in chunked_docs]
+        embeddings = cache.embed(texts, embedding_model)
+        cache.save()
+        print(f'{self.league_name} embedding calls so far: {cache.stats["embedded"]} made, '
+              f'{cache.stats["cached"] + cache.stats["near_duplicates"]} saved')
+
         # Create and save the FAISS db
-        db = FAISS.from_documents(chunked_docs, embedding_model)
-        db.save_local(os.path.join(FAISS_DB_FOLDER, f'faiss_index_{self.league_name}'))
\ No newline at end of file
+        db = FAISS.from_embeddings(list(zip(texts, embeddings)), embedding_model, metadatas=[doc.metadata for doc in chunked_docs])
+        db.save_local(os.path.join(FAISS_DB_FOLDER, self.index_name))
+        if FAISS_INDEX_COMPRESSION is not None:
+            compress_index(os.path.join(FAISS_DB_FOLDER, self.index_name), method=FAISS_INDEX_COMPRESSION)
+
+
+    def embed_document(self, embedding_cache=None):
+        self.embed_chunks(self.chunk_document(), embedding_cache=embedding_cache)
+
+
+    def build_diff_documents(self, from_season, to_season):
+        """
+        Compares the processed text of two seasons paragraph by paragraph and returns a document per change
+        """
+        old_paragraphs = [p.strip() for p in self.for_season(from_season).load_processed_text().split('\n') if p.strip()]
+        new_paragraphs = [p.strip() for p in self.for_season(to_season).load_processed_text().split('\n') if p.strip()]
+
+        diff_docs = []
+        matcher = difflib.SequenceMatcher(a=old_paragraphs, b=new_paragraphs, autojunk=False)
+        for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+            if tag == 'equal':
+                continue
+
+            # Keep a little surrounding text so the change can be found by what rule it belongs to
+            context = '\n'.join(new_paragraphs[max(0, new_start - DIFF_CONTEXT_PARAGRAPHS):new_start])
+            removed = '\n'.join(old_paragraphs[old_start:old_end])
+            added = '\n'.join(new_paragraphs[new_start:new_end])
+
+            content = f'Rule change in the {self.league_name} rulebook from {from_season} to {to_season}.\n'
+            if context:
+                content += f'Context: {context}\n'
+            if removed:
+                content += f'Removed in {to_season}: {removed}\n'
+            if added:
+                content += f'Added in {to_season}: {added}\n'
+            diff_docs.append(Document(page_content=content, metadata={'league': self.league_name, 'change_type': tag,
+                                                                      'from_season': from_season, 'to_season': to_season}))
+        return diff_docs
+
+
+    def embed_diff(self, from_season, to_season, embedding_cache=None):
+        # Chunk any large changes the same way as the rulebooks
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        diff_docs = text_splitter.split_documents(self.build_diff_documents(from_season, to_season))
+        if not diff_docs:
+            print(f'No changes found in the {self.league_name} rulebook from {from_season} to {to_season}')
+            diff_docs = [Document(page_content=f'There were no rule changes in the {self.league_name} rulebook from {from_season} to {to_season}.',
+                                  metadata={'league': self.league_name, 'change_type': 'none', 'from_season': from_season, 'to_season': to_season})]
+
+        embedding_model = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY, endpoint=MISTRAL_ENDPOINT, model=EMBEDDING_MODEL)
+        cache = embedding_cache or self.load_embedding_cache()
+        texts = [doc.page_content for doc in diff_docs]
+        embeddings = cache.embed(texts, embedding_model)
+        cache.save()
+
+        db = FAISS.from_embeddings(list(zip(texts, embeddings)), embedding_model, metadatas=[doc.metadata for doc in diff_docs])
+        db.save_local(os.path.join(FAISS_DB_FOLDER, self.get_diff_index_name(from_season, to_season)))
+
+
+    def embed_all_seasons(self):
+        """
+        Embeds every season of the rulebook plus a diff index between each pair of consecutive seasons
+        """
+        cache = self.load_embedding_cache()
+        seasons = self.get_seasons()
+        for season in seasons:
+            self.for_season(season).embed_document(embedding_cache=cache)
+        for from_season, to_season in zip(seasons, seasons[1:]):
+            self.embed_diff(from_season, to_season, embedding_cache=cache)
@@ -16,7 +16,8 @@ class MLB_Baseball(BaseSport):
                 processed_data_path = os.path.join(PROCESSED_DATA_FOLDER, 'MLB_processed.txt'),
                 online_link = 'https://img.mlbstatic.com/mlb-images/image/upload/mlb/wqn5ah4c3qtivwx3jatm.pdf', 
                 league_name = 'MLB', 
-                sport_name = 'Baseball'
+                sport_name = 'Baseball',
+                season = '2023'
             )
         
         
@@ -17,7 +17,8 @@ class NBA_Basketball(BaseSport):
             processed_data_path = os.path.join(PROCESSED_DATA_FOLDER, 'NBA_processed.txt'),
             online_link = 'https://ak-static.cms.nba.com/wp-content/uploads/sites/4/2022/10/Official-Playing-Rules-2022-23-NBA-Season.pdf', 
             league_name = 'NBA', 
-            sport_name = 'Basketball'
+            sport_name = 'Basketball',
+            season = '2023-24'
         )
     
     
@@ -70,7 +71,8 @@ class WNBA_Basketball(BaseSport):
             processed_data_path = os.path.join(PROCESSED_DATA_FOLDER, 'WNBA_processed.txt'),
             online_link = 'https://cdn.wnba.com/league/2022/05/2022-WNBA-RULE-BOOK-FINAL.pdf', 
             league_name = 'WNBA', 
-            sport_name = 'Basketball'
+            sport_name = 'Basketball',
+            season = '2022'
         )        
     
     
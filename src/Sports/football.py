@@ -17,7 +17,8 @@ class NFL_Football(BaseSport):
             processed_data_path = os.path.join(PROCESSED_DATA_FOLDER, 'NFL_processed.txt'),
             online_link = 'https://operations.nfl.com/media/tvglh0mx/2023-rulebook_final.pdf', 
             league_name = 'NFL', 
-            sport_name = 'Football'
+            sport_name = 'Football',
+            season = '2023'
         )
         
         
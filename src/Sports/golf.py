@@ -16,7 +16,8 @@ class PGA_Golf(BaseSport):
                 processed_data_path = os.path.join(PROCESSED_DATA_FOLDER, 'PGA_processed.txt'),
                 online_link = 'https://qualifying.pgatourhq.com/static-assets/uploads/2024-PGA-TOUR-Champions-Player-Handbook-1-4-24.pdf', 
                 league_name = 'PGA', 
-                sport_name = 'Golf'
+                sport_name = 'Golf',
+                season = '2024'
             )
         
         
@@ -17,7 +17,8 @@ class NHL_Hockey(BaseSport):
             processed_data_path = os.path.join(PROCESSED_DATA_FOLDER, 'NHL_processed.txt'),
             online_link = 'https://media.nhl.com/site/asset/public/ext/2023-24/2023-24Rulebook.pdf', 
             league_name = 'NHL', 
-            sport_name = 'Hockey'
+            sport_name = 'Hockey',
+            season = '2023-24'
         )
     
     def load_raw_text(self):
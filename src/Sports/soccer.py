@@ -1,6 +1,5 @@
 # Imports
 import os
-import requests
 
 from bs4 import BeautifulSoup
 from PyPDF2 import PdfReader
@@ -19,7 +18,8 @@ class FIFA_Soccer(BaseSport):
             processed_data_path = os.path.join(PROCESSED_DATA_FOLDER, 'FIFA_processed.txt'),
             online_link = 'https://downloads.theifab.com/downloads/laws-of-the-game-2023-24?l=en', 
             league_name = 'FIFA', 
-            sport_name = 'Soccer'
+            sport_name = 'Soccer',
+            season = '2023-24'
         )
     
     
@@ -67,7 +67,8 @@ class MLS_Soccer(BaseSport):
             processed_data_path = os.path.join(PROCESSED_DATA_FOLDER, 'MLS_processed.txt'),
             online_link = 'https://www.mlssoccer.com/about/competition-guidelines', 
             league_name = 'MLS', 
-            sport_name = 'Soccer'
+            sport_name = 'Soccer',
+            season = '2023-24'
         )
     
     def load_raw_text(self):
@@ -88,23 +89,26 @@ class MLS_Soccer(BaseSport):
             return raw_text
     
     
-    def scrape_data(self):
-        # Create the raw text file for later
-        raw_text = ''
-
-        # Request the webpage
-        html = requests.get(self.online_link)
-
-        # Parse the html and save the text
-        soup = BeautifulSoup(html.content, 'html.parser')
+    def scrape_data(self, only_if_changed=False):
+        """
+        Scrapes the rules from the web and returns them as a string, or None if only_if_changed and the page has not changed
+        """
+        # Request and parse the webpage
+        raw_text, changed = self.fetch(self.online_link, parse=self.parse_rules)
+        if only_if_changed and not changed:
+            return None
+        return raw_text
+    
+    
+    def parse_rules(self, html):
+        """
+        Returns the text of the competition guidelines article
+        """
+        soup = BeautifulSoup(html, 'html.parser')
         
         # Get the main rules
         main_rules = soup.find(name='div', attrs={'class':'oc-c-article__body d3-l-grid--inner'})
-        for section in main_rules:
-            if section.text not in raw_text:
-                raw_text += section.text
-        
-        return raw_text
+        return ''.join(self.dedupe_sections([section.text for section in main_rules]))
     
 
 
@@ -1,6 +1,5 @@
 # Imports
 import os
-import requests
 
 from PyPDF2 import PdfReader
 from bs4 import BeautifulSoup
@@ -19,7 +18,8 @@ class USAU_Ultimate(BaseSport):
             processed_data_path = os.path.join(PROCESSED_DATA_FOLDER, 'USAU_processed.txt'),
             online_link = 'https://usaultimate.org/rules/', 
             league_name = 'USAU', 
-            sport_name = 'Ultimate Frisbee'
+            sport_name = 'Ultimate Frisbee',
+            season = '2024'
         )
     
     
@@ -41,32 +41,28 @@ class USAU_Ultimate(BaseSport):
             return raw_text
     
     
-    def scrape_data(self):
+    def scrape_data(self, only_if_changed=False):
         """
-        Scrapes the rules from the web and returns them as a string
+        Scrapes the rules from the web and returns them as a string, or None if only_if_changed and the page has not changed
         """
-        # Create the raw text file for later
-        raw_text = ''
-
-        # Request the webpage
-        html = requests.get(self.online_link)
-
-        # Parse the html and save the text
-        soup = BeautifulSoup(html.content, 'html.parser')
+        # Request and parse the webpage
+        raw_text, changed = self.fetch(self.online_link, parse=self.parse_rules)
+        if only_if_changed and not changed:
+            return None
+        return raw_text
+    
+    
+    def parse_rules(self, html):
+        """
+        Returns the text of the main rules and appendices in the rules page
+        """
+        soup = BeautifulSoup(html, 'html.parser')
         
-        # Get the main rules
-        main_rules = soup.find(name='ol', attrs={'class':'main-rules'}).find_all(name='li')
-        for section in main_rules:
-            if section.text not in raw_text:
-                raw_text += section.text
-            
-        # Get the appendices
-        appendices = soup.find(name='ol', attrs={'class':'appendices'}).find_all(name='li')
-        for section in appendices:
-           if section.text not in raw_text:
-                raw_text += section.text
+        # Get the main rules and the appendices, nested items are already part of their parent's text
+        main_rules = soup.find(name='ol', attrs={'class':'main-rules'}).find_all(name='li', recursive=False)
+        appendices = soup.find(name='ol', attrs={'class':'appendices'}).find_all(name='li', recursive=False)
         
-        return raw_text
+        return ''.join(self.dedupe_sections([section.text for section in main_rules + appendices]))
     
     
     def process_text(self):
@@ -99,7 +95,8 @@ class WFDF_Ultimate(BaseSport):
             processed_data_path = os.path.join(PROCESSED_DATA_FOLDER, 'WFDF_processed.txt'),
             online_link = 'https://rules.wfdf.sport/wp-content/uploads/2022/01/WFDF-Rules-of-Ultimate-2021-2024-1.pdf', 
             league_name = 'WFDF', 
-            sport_name = 'Ultimate Frisbee'
+            sport_name = 'Ultimate Frisbee',
+            season = '2024'
         )
 
     def load_raw_text(self):
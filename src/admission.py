@@ -0,0 +1,189 @@
+# Imports
+import time
+import threading
+from contextlib import contextmanager
+
+from src.constants import ADMISSION_STAGE_LIMITS, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT_SECONDS, SINGLE_FLIGHT_TIMEOUT_SECONDS
+
+
+class OverloadedError(RuntimeError):
+    """
+    Raised when a request is shed because a stage is at capacity
+    """
+    pass
+
+
+class StreamBroadcast():
+    """
+    Buffers the tokens of one stream so any number of subscribers can replay it from the start while it is produced
+    """
+
+    def __init__(self):
+        self.tokens = []
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def publish(self, token):
+        with self.condition:
+            self.tokens.append(token)
+            self.condition.notify_all()
+
+    def finish(self, error: Exception = None):
+        with self.condition:
+            self.done = True
+            self.error = error
+            self.condition.notify_all()
+
+    def subscribe(self, timeout: float = None):
+        """
+        Yields every token from the start, raising TimeoutError if no new token arrives within timeout seconds
+        """
+        position = 0
+        while True:
+            with self.condition:
+                if not self.condition.wait_for(lambda: position < len(self.tokens) or self.done, timeout=timeout):
+                    raise TimeoutError
+                tokens = self.tokens[position:]
+                done, error = self.done, self.error
+            for token in tokens:
+                yield token
+            position += len(tokens)
+            if done and position >= len(self.tokens):
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight():
+    """
+    Shares one execution between identical concurrent requests. The first caller for a key runs the work
+    and every caller that arrives while it is in flight gets the same result (or the same token stream).
+    A key is given up on, so the next caller starts a new execution, once the work fails or stalls for timeout seconds.
+    """
+
+    def __init__(self, timeout: float = SINGLE_FLIGHT_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.metrics = {'executions': 0, 'coalesced': 0, 'timed_out': 0}
+
+    def join(self, key):
+        # Returns (broadcast, is_leader)
+        with self.lock:
+            if key in self.in_flight:
+                self.metrics['coalesced'] += 1
+                return self.in_flight[key], False
+            broadcast = StreamBroadcast()
+            self.in_flight[key] = broadcast
+            self.metrics['executions'] += 1
+            return broadcast, True
+
+    def leave(self, key, broadcast: StreamBroadcast):
+        # Only evict the key if it still belongs to this execution, a stalled one may already have been replaced
+        with self.lock:
+            if self.in_flight.get(key) is broadcast:
+                del self.in_flight[key]
+
+    def stream(self, key, function, *args, **kwargs):
+        """
+        Yields the tokens of function(*args, **kwargs), which must return an iterator, shared across identical keys.
+        The work always runs on its own thread, so it finishes (and releases what it holds) at its own pace however slowly
+        the callers read. With key None nothing is shared. Raises OverloadedError if no token arrives within the timeout.
+        """
+        def produce():
+            error = None
+            try:
+                for token in function(*args, **kwargs):
+                    broadcast.publish(token)
+            except Exception as e:
+                error = e
+            # Evict before finishing so a caller arriving now starts afresh instead of replaying a failure
+            if key is not None:
+                self.leave(key, broadcast)
+            broadcast.finish(error=error)
+
+        if key is None:
+            broadcast, is_leader = StreamBroadcast(), True
+        else:
+            broadcast, is_leader = self.join(key)
+        if is_leader:
+            threading.Thread(target=produce, daemon=True).start()
+        try:
+            yield from broadcast.subscribe(timeout=self.timeout)
+        except TimeoutError:
+            with self.lock:
+                self.metrics['timed_out'] += 1
+            if key is not None:
+                self.leave(key, broadcast)
+            raise OverloadedError('The answer is taking too long, please try again shortly') from None
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Returns function(*args, **kwargs), shared across identical keys
+        """
+        results = list(self.stream(key, lambda: iter([function(*args, **kwargs)])))
+        return results[0]
+
+    def get_metrics(self):
+        with self.lock:
+            return {**self.metrics, 'in_flight': len(self.in_flight)}
+
+
+class AdmissionController():
+    """
+    Limits the concurrent calls per pipeline stage with a bounded wait queue, shedding load instead of timing out
+    """
+
+    def __init__(self, limits: dict = ADMISSION_STAGE_LIMITS, max_queue: int = ADMISSION_MAX_QUEUE, timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.limits = limits
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.semaphores = {stage: threading.BoundedSemaphore(limit) for stage, limit in limits.items()}
+        self.lock = threading.Lock()
+        self.metrics = {stage: {'active': 0, 'waiting': 0, 'admitted': 0, 'rejected': 0, 'timed_out': 0} for stage in limits}
+        # Optional function(stage, seconds, error) called after each stage, e.g. by the load test to time every stage
+        self.observer = None
+
+    def notify(self, stage: str, seconds: float = None, error: bool = False):
+        if self.observer is not None:
+            self.observer(stage, seconds, error)
+
+    @contextmanager
+    def admit(self, stage: str):
+        metrics = self.metrics[stage]
+        with self.lock:
+            full = metrics['waiting'] >= self.max_queue
+            metrics['rejected' if full else 'waiting'] += 1
+        if full:
+            self.notify(stage, error=True)
+            raise OverloadedError(f'The {stage} stage is overloaded, please try again shortly')
+
+        acquired = self.semaphores[stage].acquire(timeout=self.timeout)
+        with self.lock:
+            metrics['waiting'] -= 1
+            if not acquired:
+                metrics['timed_out'] += 1
+            else:
+                metrics['active'] += 1
+                metrics['admitted'] += 1
+        if not acquired:
+            self.notify(stage, error=True)
+            raise OverloadedError(f'The {stage} stage is busy, please try again shortly')
+
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.notify(stage, error=True)
+            raise
+        else:
+            self.notify(stage, time.perf_counter() - start)
+        finally:
+            with self.lock:
+                metrics['active'] -= 1
+            self.semaphores[stage].release()
+
+    def get_metrics(self):
+        with self.lock:
+            return {stage: dict(metrics) for stage, metrics in self.metrics.items()}
@@ -0,0 +1,162 @@
+# Imports
+import os
+import csv
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from langchain_mistralai import MistralAIEmbeddings
+
+from src.Sports import Sports
+from src.dedup import collapse_duplicate_documents
+from src.context_compression import compress_context
+from src.faiss_db import load_faiss_db, rerank_documents_batch
+from src.inference import construct_prompt, invoke_llm
+from src.constants import MISTRAL_API_KEY, MISTRAL_ENDPOINT, BATCH_MAX_WORKERS, BATCH_MAX_RETRIES, BATCH_RETRY_BACKOFF_SECONDS
+from src.constants import LLM_INPUT_COST_PER_MILLION_TOKENS, LLM_OUTPUT_COST_PER_MILLION_TOKENS
+from src.constants import EMBEDDING_COST_PER_MILLION_TOKENS, CHARS_PER_TOKEN
+
+
+def read_questions(input_path: str):
+    """
+    Reads (league, question) pairs from a JSONL or CSV file and returns them as a list of dicts
+    """
+    questions = []
+    with open(input_path, 'r', newline='') as f:
+        if input_path.endswith('.jsonl'):
+            rows = [json.loads(line) for line in f if line.strip()]
+        elif input_path.endswith('.csv'):
+            rows = list(csv.DictReader(f))
+        else:
+            raise ValueError('Input file type not supported')
+
+    for row in rows:
+        questions.append({'league': row['league'].strip().upper(), 'question': row['question'].strip()})
+    return questions
+
+
+def read_completed(output_path: str):
+    """
+    Returns the (league, question) keys that already have an answer in the output file
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, 'r') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Skip a partially written last line
+            if result.get('error') is None:
+                completed.add((result['league'], result['question']))
+    return completed
+
+
+def group_by_league(questions: list):
+    # Group the questions so each FAISS index is only loaded once
+    grouped = {}
+    for question in questions:
+        grouped.setdefault(question['league'], []).append(question['question'])
+    return grouped
+
+
+def estimate_tokens(text: str):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def estimate_cost(prompt_tokens: int, completion_tokens: int, embedding_tokens: int):
+    return (prompt_tokens * LLM_INPUT_COST_PER_MILLION_TOKENS
+            + completion_tokens * LLM_OUTPUT_COST_PER_MILLION_TOKENS
+            + embedding_tokens * EMBEDDING_COST_PER_MILLION_TOKENS) / 1_000_000
+
+
+def invoke_llm_with_retries(prompt: str, max_retries: int = BATCH_MAX_RETRIES):
+    # Retry with exponential backoff since the API is rate limited
+    for attempt in range(max_retries + 1):
+        try:
+            return invoke_llm(prompt=prompt)
+        except Exception:
+            if attempt == max_retries:
+                raise
+            time.sleep(BATCH_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+
+def retrieve_context_for_league(sport: Sports, questions: list):
+    """
+    Embeds all of the questions for a league in one batch, reranks every question's results together
+    and returns the compressed context for each
+    """
+    db = load_faiss_db(sport=sport)
+    embedding_model = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY, endpoint=MISTRAL_ENDPOINT)
+    query_embeddings = embedding_model.embed_documents(questions)
+
+    docs_lists = [collapse_duplicate_documents(db.similarity_search_by_vector(query_embedding, k=15)) for query_embedding in query_embeddings]
+    context_lists = rerank_documents_batch(docs_lists, queries=questions)
+    return [compress_context(context_list, query=question) for question, context_list in zip(questions, context_lists)]
+
+
+def answer_questions(input_path: str, output_path: str, max_workers: int = BATCH_MAX_WORKERS):
+    """
+    Answers every question in the input file and streams the results to the output file as JSONL.
+    Questions already answered in the output file are skipped so an interrupted run can be resumed.
+    """
+    start_time = time.perf_counter()
+    completed = read_completed(output_path)
+    remaining = [q for q in read_questions(input_path) if (q['league'], q['question']) not in completed]
+    print(f'{len(completed)} questions already answered, {len(remaining)} remaining')
+
+    totals = {'answered': 0, 'failed': 0, 'cost': 0.0}
+    write_lock = threading.Lock()
+
+    with open(output_path, 'a') as output_file, ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def write_result(result: dict):
+            with write_lock:
+                output_file.write(json.dumps(result) + '\n')
+                output_file.flush()
+
+        for league, questions in group_by_league(remaining).items():
+            try:
+                sport = Sports[league]
+            except KeyError:
+                for question in questions:
+                    write_result({'league': league, 'question': question, 'answer': None, 'error': 'Unknown league'})
+                    totals['failed'] += 1
+                continue
+
+            # Retrieval is batched per league, generation is spread over the worker pool
+            print(f'Retrieving context for {len(questions)} {league} questions...')
+            context_lists = retrieve_context_for_league(sport=sport, questions=questions)
+
+            futures = {}
+            for question, context_list in zip(questions, context_lists):
+                prompt = construct_prompt(sport=sport, query=question, context_list=context_list, chat_history=[])
+                futures[executor.submit(invoke_llm_with_retries, prompt)] = (question, prompt)
+
+            for future in as_completed(futures):
+                question, prompt = futures[future]
+                try:
+                    answer = future.result()
+                    error = None
+                except Exception as e:
+                    answer = None
+                    error = str(e)
+
+                cost = estimate_cost(prompt_tokens=estimate_tokens(prompt),
+                                     completion_tokens=estimate_tokens(answer or ''),
+                                     embedding_tokens=estimate_tokens(question))
+                write_result({'league': league, 'question': question, 'answer': answer, 'error': error, 'estimated_cost': cost})
+                totals['cost'] += cost
+                totals['answered' if error is None else 'failed'] += 1
+
+    # Report the throughput and cost of the run
+    elapsed = time.perf_counter() - start_time
+    processed = totals['answered'] + totals['failed']
+    print(f'Answered {totals["answered"]} questions ({totals["failed"]} failed) in {elapsed:.1f}s')
+    if processed:
+        print(f'Throughput: {processed / elapsed:.2f} questions/sec')
+        print(f'Estimated cost: ${totals["cost"]:.4f} total, ${totals["cost"] / processed:.6f} per question')
+    return totals
@@ -0,0 +1,248 @@
+# Imports
+import os
+import json
+import hashlib
+import inspect
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from langchain_core.documents import Document
+from langchain_mistralai import MistralAIEmbeddings
+
+from src import dedup, embedding_cache, vector_compression
+from src.vector_compression import get_compressed_index_path
+from src.Sports import Sports
+from src.Sports.base import BaseSport
+from src.constants import MISTRAL_API_KEY, MISTRAL_ENDPOINT, FAISS_DB_FOLDER, CHUNKS_FOLDER, BUILD_MANIFEST_PATH, BUILD_MAX_WORKERS, HTTP_POOL_SIZE
+from src.constants import ACCEPTABLE_CHARS, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL, DIFF_CONTEXT_PARAGRAPHS
+from src.constants import FAISS_INDEX_COMPRESSION, PQ_SUBQUANTIZERS, NEAR_DUPLICATE_THRESHOLD, MINHASH_PERMUTATIONS, MINHASH_BAND_ROWS, MINHASH_SHINGLE_WORDS
+
+# Build stages in the order they run: raw -> processed -> chunks -> index (+ diff between seasons)
+STAGES = ['processed', 'chunks', 'index']
+
+
+def hash_file(path: str):
+    if not os.path.exists(path):
+        return None
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def hash_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def index_exists(index_name: str, compressed: bool = False):
+    # A partially written index (e.g. only index.pkl) counts as missing, as does a missing compressed copy when one is configured
+    index_folder = os.path.join(FAISS_DB_FOLDER, index_name)
+    if compressed and FAISS_INDEX_COMPRESSION is not None and not os.path.exists(get_compressed_index_path(index_folder, FAISS_INDEX_COMPRESSION)):
+        return False
+    return all(os.path.exists(os.path.join(index_folder, f)) for f in ['index.faiss', 'index.pkl'])
+
+
+def get_chunks_path(sport_obj):
+    return os.path.join(CHUNKS_FOLDER, f'{sport_obj.index_name}_chunks.json')
+
+
+def save_chunks(chunked_docs: list, chunks_path: str):
+    os.makedirs(os.path.dirname(chunks_path), exist_ok=True)
+    with open(chunks_path, 'w') as f:
+        json.dump([{'page_content': doc.page_content, 'metadata': doc.metadata} for doc in chunked_docs], f)
+
+
+def load_chunks(chunks_path: str):
+    with open(chunks_path, 'r') as f:
+        return [Document(**chunk) for chunk in json.load(f)]
+
+
+def load_manifest():
+    if not os.path.exists(BUILD_MANIFEST_PATH):
+        return {}
+    with open(BUILD_MANIFEST_PATH, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict):
+    with open(BUILD_MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def get_normalization_source(sport_obj):
+    # The processing code holds the normalization table, so any edit to it invalidates the processed text
+    sport_class = type(sport_obj)
+    return inspect.getsource(sport_class.load_raw_text) + inspect.getsource(sport_class.process_text) + ACCEPTABLE_CHARS
+
+
+def get_code_version(*code):
+    # Hash of the source of the functions and modules a stage runs, so editing them invalidates its output
+    return hashlib.sha256(''.join(inspect.getsource(c) for c in code).encode()).hexdigest()
+
+
+def get_chunking_version():
+    # Chunking drops exact duplicates using the dedup normalization
+    return get_code_version(BaseSport.chunk_document, dedup)
+
+
+def get_index_version():
+    # Embedding reuses cached and near-duplicate vectors, and the index may be saved with a compressed copy
+    return hash_key(get_code_version(BaseSport.embed_chunks, embedding_cache, dedup, vector_compression),
+                    NEAR_DUPLICATE_THRESHOLD, MINHASH_PERMUTATIONS, MINHASH_BAND_ROWS, MINHASH_SHINGLE_WORDS,
+                    FAISS_INDEX_COMPRESSION, PQ_SUBQUANTIZERS if FAISS_INDEX_COMPRESSION == 'pq' else None)
+
+
+def build_league(league_name: str, manifest: dict, stages: list = STAGES, dry_run: bool = False, force: bool = False, quiet: bool = False):
+    """
+    Rebuilds the stale stages of every season of a league and returns the (target, key, output_exists) of each stage that ran.
+    A stage is stale if its output is missing or its key (input content hash plus parameters) changed.
+    """
+    sport = Sports[league_name]
+    built = []
+
+    def run_stage(target: str, key: str, output_exists: bool, upstream_stale: bool, action):
+        # Returns True if the stage ran (or would run in a dry run)
+        stale = force or upstream_stale or not output_exists or manifest.get(target) != key
+        if not stale:
+            return False
+        if not quiet:
+            print(f'{"Would build" if dry_run else "Building"} {target}')
+        if not dry_run:
+            action()
+        built.append((target, key, output_exists))
+        return True
+
+    seasons = sport.value.get_seasons()
+    processed_stale = {}
+    for season in seasons:
+        sport_obj = sport.value.for_season(season)
+        chunks_path = get_chunks_path(sport_obj)
+
+        # raw -> processed
+        stale = False
+        if 'processed' in stages:
+            key = hash_key(hash_file(sport_obj.raw_data_path), get_normalization_source(sport_obj))
+            stale = run_stage(f'{sport_obj.index_name}/processed', key, os.path.exists(sport_obj.processed_data_path),
+                              False, sport_obj.process_text)
+        processed_stale[season] = stale
+
+        # processed -> chunks
+        if 'chunks' in stages:
+            key = hash_key(hash_file(sport_obj.processed_data_path), CHUNK_SIZE, CHUNK_OVERLAP, get_chunking_version())
+            stale = run_stage(f'{sport_obj.index_name}/chunks', key, os.path.exists(chunks_path),
+                              stale, lambda: save_chunks(sport_obj.chunk_document(), chunks_path))
+
+        # chunks -> index
+        if 'index' in stages:
+            key = hash_key(hash_file(chunks_path), EMBEDDING_MODEL, get_index_version())
+            run_stage(f'{sport_obj.index_name}/index', key, index_exists(sport_obj.index_name, compressed=True),
+                      stale, lambda: sport_obj.embed_chunks(load_chunks(chunks_path)))
+
+    # processed (two seasons) -> diff index
+    if 'index' in stages:
+        for from_season, to_season in zip(seasons, seasons[1:]):
+            diff_index_name = sport.value.get_diff_index_name(from_season, to_season)
+            key = hash_key(hash_file(sport.value.for_season(from_season).processed_data_path),
+                           hash_file(sport.value.for_season(to_season).processed_data_path),
+                           DIFF_CONTEXT_PARAGRAPHS, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL,
+                           get_code_version(BaseSport.build_diff_documents, BaseSport.embed_diff), get_index_version())
+            run_stage(f'{diff_index_name}/index', key, index_exists(diff_index_name),
+                      processed_stale[from_season] or processed_stale[to_season],
+                      lambda: sport.value.embed_diff(from_season, to_season))
+
+    return built
+
+
+def refresh_web_sources(leagues: list):
+    """
+    Re-scrapes the web based rulebooks concurrently. Pages that have not changed leave the raw text untouched,
+    so their hash (and every stage after it) stays the same.
+    """
+    scraped = [Sports[league].value for league in leagues if hasattr(Sports[league].value, 'scrape_data')]
+    with ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE) as executor:
+        for sport_obj, changed in zip(scraped, executor.map(lambda sport_obj: sport_obj.refresh_raw_text(), scraped)):
+            print(f'{sport_obj.league_name} rules {"changed" if changed else "unchanged"} online')
+
+
+def embed_shared_chunks(leagues: list, manifest: dict, force: bool = False):
+    """
+    Embeds the chunks of every stale league index through one cache in this process before the indexes are built in
+    parallel. Each build worker has its own copy of the cache, so without this a chunk shared by two leagues built at
+    the same time (e.g. the same rule in the NBA and WNBA rulebooks) would be embedded by both.
+    """
+    cache = Sports[leagues[0]].value.load_embedding_cache()
+    embedding_model = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY, endpoint=MISTRAL_ENDPOINT, model=EMBEDDING_MODEL)
+    for league in leagues:
+        stale = {target for target, _, _ in build_league(league, manifest, stages=['index'], dry_run=True, force=force, quiet=True)}
+        texts = []
+        for season in Sports[league].value.get_seasons():
+            sport_obj = Sports[league].value.for_season(season)
+            if f'{sport_obj.index_name}/index' in stale and os.path.exists(get_chunks_path(sport_obj)):
+                texts.extend(doc.page_content for doc in load_chunks(get_chunks_path(sport_obj)))
+        if texts:
+            cache.embed(texts, embedding_model)
+    cache.save()
+
+
+def build(leagues: list = None, stages: list = STAGES, dry_run: bool = False, force: bool = False, max_workers: int = BUILD_MAX_WORKERS, fetch: bool = False):
+    """
+    Rebuilds only the stale leagues, in parallel, and records what was built in the manifest.
+    The index stage runs after every league's chunks are up to date and their embeddings have been shared.
+    """
+    leagues = leagues or Sports.get_all_names()
+    manifest = load_manifest()
+    if fetch and not dry_run:
+        refresh_web_sources(leagues)
+
+    phases = [stages]
+    if 'index' in stages and not dry_run:
+        phases = [[stage for stage in stages if stage != 'index'], ['index']]
+
+    failed = []
+    for phase in phases:
+        leagues = [league for league in leagues if league not in failed]
+        if not phase or not leagues:
+            continue
+        if phase == ['index'] and not dry_run:
+            embed_shared_chunks(leagues, manifest, force=force)
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {league: executor.submit(build_league, league, manifest, phase, dry_run, force) for league in leagues}
+
+        for league, future in futures.items():
+            try:
+                built = future.result()
+            except Exception as e:
+                print(f'Failed to build {league}: {e}')
+                failed.append(league)
+                continue
+            if not dry_run:
+                manifest.update((target, key) for target, key, _ in built)
+
+    if not dry_run:
+        save_manifest(manifest)
+    if failed:
+        raise RuntimeError(f'Build failed for {", ".join(failed)}')
+
+
+def mark_built(leagues: list = None, stages: list = STAGES):
+    """
+    Records the existing outputs as up to date without rebuilding them, e.g. for indexes built before the manifest existed
+    """
+    leagues = leagues or Sports.get_all_names()
+    manifest = load_manifest()
+    for league in leagues:
+        # Chunking is local and cheap, so write out any missing chunk files that the existing indexes were built from
+        if 'chunks' in stages:
+            for season in Sports[league].value.get_seasons():
+                sport_obj = Sports[league].value.for_season(season)
+                if os.path.exists(sport_obj.processed_data_path) and not os.path.exists(get_chunks_path(sport_obj)):
+                    save_chunks(sport_obj.chunk_document(), get_chunks_path(sport_obj))
+
+        # A dry run against an empty manifest lists every target with its current key
+        for target, key, output_exists in build_league(league, manifest={}, stages=stages, dry_run=True, quiet=True):
+            if output_exists:
+                manifest[target] = key
+            else:
+                print(f'Not marking {target} as built since its output is missing')
+    save_manifest(manifest)
@@ -8,6 +8,10 @@ try:
 except:
     MISTRAL_API_KEY = st.secrets['MISTRAL_API_KEY']
 
+# Point this at the local stand-in server (scripts/mock_mistral_server.py) for load testing.
+# This is the base URL, the client adds the /v1/... paths itself
+MISTRAL_ENDPOINT = os.environ.get('MISTRAL_ENDPOINT', 'https://api.mistral.ai')
+
 # Folders
 RAW_DATA_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw')
 PROCESSED_DATA_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed')
@@ -52,4 +56,166 @@ There is some chat history to help you make your decision.
 </chat_history>
 
 User Question: {question}
-'''
\ No newline at end of file
+'''
+
+# Batch Processing
+BATCH_MAX_WORKERS = 4
+BATCH_MAX_RETRIES = 3
+BATCH_RETRY_BACKOFF_SECONDS = 2
+
+# Pricing in USD per million tokens, used for cost estimates only
+LLM_INPUT_COST_PER_MILLION_TOKENS = 0.7
+LLM_OUTPUT_COST_PER_MILLION_TOKENS = 0.7
+EMBEDDING_COST_PER_MILLION_TOKENS = 0.1
+CHARS_PER_TOKEN = 4
+
+# Conversation History
+CONVERSATION_MAX_MESSAGES = 8       # Messages kept verbatim before older ones are folded into the summary
+ROUTER_HISTORY_MESSAGES = 2         # The router only needs the last exchange
+ANSWER_HISTORY_MESSAGES = 6
+CONVERSATION_SUMMARY_MAX_CHARS = 1000
+CONVERSATION_TRANSCRIPT_MAX_MESSAGES = 200  # Messages shown in the chat, kept apart from what goes in the prompt
+SESSION_IDLE_TIMEOUT_SECONDS = 60 * 60
+CONVERSATION_DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'conversations.db')
+CONVERSATION_STORE_BACKEND = os.environ.get('CONVERSATION_STORE_BACKEND', 'memory')  # 'memory' or 'sqlite'
+
+# Chunking and Embedding
+CHUNK_SIZE = 1500
+CHUNK_OVERLAP = 250
+EMBEDDING_CACHE_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'data', 'embeddings')
+DIFF_CONTEXT_PARAGRAPHS = 1  # Unchanged paragraphs kept around each change in the diff index
+EMBEDDING_MODEL = 'mistral-embed'
+
+# Build Cache
+CHUNKS_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'data', 'chunks')
+BUILD_MANIFEST_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'build_manifest.json')
+BUILD_MAX_WORKERS = 4
+
+# Web Scraping
+HTTP_CACHE_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'data', 'http_cache')
+HTTP_TIMEOUT_SECONDS = 30
+HTTP_POOL_SIZE = 8
+HTTP_OFFLINE = os.environ.get('SPORTSQA_OFFLINE', '0') == '1'  # Replay cached responses (or the fixtures) only, e.g. for offline tests
+HTTP_FIXTURES_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'data', 'http_fixtures')  # Trimmed recorded pages, committed
+
+# Vector Compression
+FAISS_INDEX_COMPRESSION = os.environ.get('FAISS_INDEX_COMPRESSION')  # None (full float32), 'fp16', 'sq8' or 'pq'
+RESCORE_FACTOR = 4        # Candidates fetched from the compressed index per result, re-scored with the exact vectors
+PQ_SUBQUANTIZERS = 64     # Must divide the embedding dimension (1024 for mistral-embed)
+
+# League Classifier
+CLASSIFIER_TEMPERATURE = 0.02     # Scales the cosine similarity to the league centroids before the softmax
+CLASSIFIER_KEYWORD_WEIGHT = 5.0   # Logit added per keyword hit, split between the leagues that share the keyword
+CLASSIFIER_PRIOR_WEIGHT = 1.0     # Logit added to the league the user has selected
+CLASSIFIER_MIN_CONFIDENCE = 0.2   # Other leagues above this confidence are returned alongside the top one
+CLASSIFIER_LEXICON_CONFIDENCE = 0.9  # Skip the embedding call if the keywords alone are this confident
+LEAGUE_CENTROIDS_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'faiss', 'league_centroids.pkl')
+# Words that are common outside a single league (e.g. 'pull', 'goaltender') are left out, one hit outweighs the centroids
+LEAGUE_KEYWORDS = {
+    # League and sport names
+    'nfl': ['NFL'], 'football': ['NFL'], 'nba': ['NBA'], 'wnba': ['WNBA'], 'basketball': ['NBA', 'WNBA'],
+    'nhl': ['NHL'], 'hockey': ['NHL'], 'mlb': ['MLB'], 'baseball': ['MLB'], 'pga': ['PGA'], 'golf': ['PGA'],
+    'mls': ['MLS'], 'fifa': ['FIFA'], 'ifab': ['FIFA'], 'world cup': ['FIFA'], 'soccer': ['MLS', 'FIFA'],
+    'usau': ['USAU'], 'usa ultimate': ['USAU'], 'wfdf': ['WFDF'], 'ultimate': ['USAU', 'WFDF'], 'frisbee': ['USAU', 'WFDF'],
+    # Football
+    'touchdown': ['NFL'], 'quarterback': ['NFL'], 'fumble': ['NFL'], 'first down': ['NFL'], 'punt': ['NFL'],
+    'pass interference': ['NFL'], 'sack': ['NFL'], 'two-point conversion': ['NFL'], 'fair catch': ['NFL'],
+    'onside kick': ['NFL'], 'field goal': ['NFL', 'NBA', 'WNBA'], 'kickoff': ['NFL', 'MLS', 'FIFA'],
+    'end zone': ['NFL', 'USAU', 'WFDF'], 'interception': ['NFL', 'USAU', 'WFDF'],
+    # Basketball
+    'dunk': ['NBA', 'WNBA'], 'three-pointer': ['NBA', 'WNBA'], 'free throw': ['NBA', 'WNBA'], 'shot clock': ['NBA', 'WNBA'],
+    'goaltending': ['NBA', 'WNBA'], 'traveling': ['NBA', 'WNBA'], 'dribble': ['NBA', 'WNBA'], 'backcourt': ['NBA', 'WNBA'],
+    'flagrant': ['NBA', 'WNBA'], 'rebound': ['NBA', 'WNBA'], 'jump ball': ['NBA', 'WNBA'],
+    # Hockey
+    'icing': ['NHL'], 'puck': ['NHL'], 'power play': ['NHL'], 'penalty box': ['NHL'], 'faceoff': ['NHL'], 'face-off': ['NHL'],
+    'high-sticking': ['NHL'], 'slashing': ['NHL'], 'blue line': ['NHL'], 'crease': ['NHL'], 'boarding': ['NHL'],
+    'offside': ['NHL', 'MLS', 'FIFA'],
+    # Baseball
+    'pitcher': ['MLB'], 'balk': ['MLB'], 'inning': ['MLB'], 'home run': ['MLB'], 'batter': ['MLB'], 'infield fly': ['MLB'],
+    'pitch clock': ['MLB'], 'bunt': ['MLB'], 'foul ball': ['MLB'], 'designated hitter': ['MLB'], 'strike zone': ['MLB'],
+    # Soccer
+    'penalty kick': ['MLS', 'FIFA'], 'var': ['MLS', 'FIFA'], 'yellow card': ['MLS', 'FIFA'], 'red card': ['MLS', 'FIFA'],
+    'handball': ['MLS', 'FIFA'], 'corner kick': ['MLS', 'FIFA'], 'throw-in': ['MLS', 'FIFA'], 'goal kick': ['MLS', 'FIFA'],
+    'free kick': ['MLS', 'FIFA'], 'stoppage time': ['MLS', 'FIFA'], 'designated player': ['MLS'],
+    # Ultimate
+    'pick': ['USAU', 'WFDF'], 'stall': ['USAU', 'WFDF'], 'marker': ['USAU', 'WFDF'],
+    'callahan': ['USAU', 'WFDF'], 'spirit of the game': ['USAU', 'WFDF'], 'disc': ['USAU', 'WFDF'], 'observer': ['USAU'],
+    # Golf
+    'bunker': ['PGA'], 'putt': ['PGA'], 'putting green': ['PGA'], 'tee': ['PGA'], 'caddie': ['PGA'], 'hole': ['PGA'],
+    'par': ['PGA'], 'birdie': ['PGA'], 'fairway': ['PGA'], 'mulligan': ['PGA'], 'scorecard': ['PGA'],
+}
+
+# Chunk Deduplication
+MINHASH_PERMUTATIONS = 64
+MINHASH_BAND_ROWS = 4            # 16 bands of 4 rows, pairs above ~0.6 similarity become candidates
+MINHASH_SHINGLE_WORDS = 5
+NEAR_DUPLICATE_THRESHOLD = 0.9   # Estimated Jaccard similarity above which two chunks are treated as the same
+
+# Context Compression
+CONTEXT_COMPRESSION = os.environ.get('CONTEXT_COMPRESSION', 'cross-encoder')  # 'cross-encoder', 'lexical' or 'none'
+CONTEXT_TOKEN_BUDGET = 500
+
+# Admission Control
+ADMISSION_STAGE_LIMITS = {'router': 8, 'retrieval': 4, 'rerank': 2, 'compression': 2, 'generation': 8}  # Concurrent calls per stage
+ADMISSION_MAX_QUEUE = 32              # Requests allowed to wait per stage before new ones are shed
+ADMISSION_QUEUE_TIMEOUT_SECONDS = 10  # Longest a request waits for a stage before it is shed
+SINGLE_FLIGHT_TIMEOUT_SECONDS = 60    # Longest a caller waits for the next token of a shared answer before the answer is abandoned
+
+# Retrieval Service
+RETRIEVAL_SERVICE_ENDPOINTS = [e for e in os.environ.get('RETRIEVAL_SERVICE_ENDPOINTS', '').split(',') if e] or None  # e.g. 'http://127.0.0.1:8801,http://127.0.0.1:8802'
+RETRIEVAL_WORKERS = 2                  # Shard worker processes started by scripts/retrieval_service.py
+RETRIEVAL_BASE_PORT = 8801             # Worker i listens on RETRIEVAL_BASE_PORT + i
+RETRIEVAL_MAX_LOADED_SHARDS = 4        # Indexes a worker keeps loaded at once, least recently used are dropped
+RETRIEVAL_SHARD_TIMEOUT_SECONDS = 2.0  # Shards slower than this are left out of the merged results
+RETRIEVAL_DISCOVERY_RETRY_SECONDS = 30  # How long to search locally before asking an unreachable retrieval service again
+
+# Prefetch
+PREFETCH_ENABLED = os.environ.get('SPORTSQA_PREFETCH', '1') != '0'  # Set SPORTSQA_PREFETCH=0 to measure cold first questions
+PREFETCH_WORKERS = 2          # Background threads warming up leagues
+MAX_LOADED_INDEXES = 4        # League indexes kept loaded in the app process, least recently used are dropped
+PREFETCH_MAX_EMBEDDINGS = 256 # Pre-embedded starter questions kept, least recently used are dropped
+PREFETCH_RETRY_SECONDS = 300  # A league that failed to warm up (e.g. its index is missing) is not tried again for this long
+STARTER_QUESTIONS = {
+    'NFL': ['What is pass interference?', 'How does overtime work?', 'What is a fumble?'],
+    'NBA': ['What is a travel?', 'What is goaltending?', 'How many fouls until a player fouls out?'],
+    'WNBA': ['What is a travel?', 'How long is the shot clock?', 'How many fouls until a player fouls out?'],
+    'NHL': ['What is icing?', 'What is offside?', 'How does overtime work?'],
+    'USAU': ['What is a stall count?', 'What happens after a foul call?', 'What is a pick?'],
+    'WFDF': ['What is a stall count?', 'What happens after a foul call?', 'What is a pick?'],
+    'MLB': ['What is the infield fly rule?', 'What is a balk?', 'How does the pitch clock work?'],
+    'MLS': ['What is offside?', 'When is a handball called?', 'How does VAR work?'],
+    'FIFA': ['What is offside?', 'When is a handball called?', 'How does VAR work?'],
+    'PGA': ['What happens if my ball is out of bounds?', 'When can I take relief?', 'What is a penalty stroke?'],
+}
+
+# LLM Request Policy
+LLM_MODEL = 'open-mixtral-8x7b'
+LLM_FALLBACK_MODEL = 'open-mistral-7b'  # Smaller, faster model used when the main one times out or is degraded
+ROUTER_MODEL = LLM_MODEL                # Set to LLM_FALLBACK_MODEL to always route with the faster model
+LLM_REQUEST_POLICY = os.environ.get('SPORTSQA_REQUEST_POLICY', '1') != '0'  # Set to 0 to send single unhedged requests
+LLM_TIMEOUT_SECONDS = 20                # Give up on the main model and use the fallback after this long
+LLM_HEDGE_PERCENTILE = 95               # Send a duplicate request once the first is slower than this percentile
+LLM_HEDGE_MIN_SAMPLES = 20              # Latencies needed before the percentile is trusted
+LLM_HEDGE_DEFAULT_SECONDS = 3.0         # Hedge delay used until then
+LLM_CIRCUIT_FAILURE_THRESHOLD = 5       # Consecutive failed requests that open the circuit
+LLM_CIRCUIT_RESET_SECONDS = 30          # How long the circuit stays open before trying the main model again
+LLM_MAX_ATTEMPTS = 32                   # Requests to the main model running at once, abandoned ones included. No duplicates are sent beyond this
+
+# Reranker
+RERANKER_BACKEND = os.environ.get('SPORTSQA_RERANKER', 'flashrank')  # 'flashrank' or 'onnx' for the tuned engine in src/reranker.py
+RERANKER_PRECISION = os.environ.get('SPORTSQA_RERANKER_PRECISION', 'int8')  # 'int8' (dynamically quantized) or 'fp32'
+RERANKER_HF_MODEL = 'cross-encoder/ms-marco-MiniLM-L-12-v2'  # Weights exported to ONNX by scripts/export_reranker.py
+RERANKER_INTRA_OP_THREADS = int(os.environ.get('SPORTSQA_RERANKER_THREADS', 1))  # Threads per operator, per worker
+RERANKER_INTER_OP_THREADS = 1     # Operators run in parallel, 1 runs the graph sequentially
+RERANKER_MAX_TOKENS = 256         # Query and passage tokens per pair, the longer of the two is truncated to fit
+RERANKER_TOP_N = 3                # Documents kept after reranking, same as FlashrankRerank
+RERANKER_CACHE_TTL_SECONDS = 300  # How long a (query, chunk) score is reused
+RERANKER_CACHE_SIZE = 10000       # Scores kept in the cache at once
+RERANKER_BATCH_PAIRS = 64         # Query and passage pairs scored per model call when reranking many questions at once
+
+# Pre-fork Serving
+PREFORK_WORKERS = os.cpu_count() or 1  # Worker processes forked by scripts/prefork_server.py
+PREFORK_MAX_TASKS_PER_CHILD = 500      # Turns a worker answers before it is replaced by a fresh fork
+PREFORK_PORT = 8900
+PREFORK_ENDPOINT = os.environ.get('PREFORK_ENDPOINT')  # e.g. 'http://127.0.0.1:8900', makes the UI send turns to the workers
+PREFORK_TIMEOUT_SECONDS = 120          # Longest the front end waits for a worker to answer
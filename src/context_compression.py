@@ -0,0 +1,104 @@
+# Imports
+import re
+import math
+from collections import Counter
+
+from flashrank import RerankRequest
+from langchain_core.documents import Document
+
+from src.dedup import normalize_text
+from src.faiss_db import load_ranker
+from src.constants import CONTEXT_COMPRESSION, CONTEXT_TOKEN_BUDGET, CHARS_PER_TOKEN
+
+SENTENCE_SPLIT_PATTERN = re.compile(r'(?<=[.!?;:])\s+|\n+')
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def split_sentences(text: str):
+    return [sentence.strip() for sentence in SENTENCE_SPLIT_PATTERN.split(text) if sentence.strip()]
+
+
+def count_tokens(text: str):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def lexical_scores(query: str, sentences: list):
+    """
+    BM25 style score of each sentence against the query, with the idf taken over the retrieved sentences
+    """
+    query_terms = set(WORD_PATTERN.findall(query.lower()))
+    sentence_terms = [Counter(WORD_PATTERN.findall(sentence.lower())) for sentence in sentences]
+    document_frequency = Counter(term for terms in sentence_terms for term in terms)
+    average_length = sum(sum(terms.values()) for terms in sentence_terms) / max(1, len(sentences))
+
+    scores = []
+    for terms in sentence_terms:
+        length = sum(terms.values())
+        score = 0.0
+        for term in query_terms & set(terms):
+            idf = math.log(1 + (len(sentences) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            score += idf * terms[term] * 2.2 / (terms[term] + 1.2 * (0.25 + 0.75 * length / max(1, average_length)))
+        scores.append(score)
+    return scores
+
+
+def cross_encoder_scores(query: str, sentences: list):
+    # Reuse the reranker that is already loaded for retrieval
+    results = load_ranker().rerank(RerankRequest(query=query, passages=[{'id': i, 'text': s} for i, s in enumerate(sentences)]))
+    scores = [0.0] * len(sentences)
+    for result in results:
+        scores[result['id']] = float(result['score'])
+    return scores
+
+
+def compress_context(context_list: list, query: str, token_budget: int = CONTEXT_TOKEN_BUDGET, method: str = CONTEXT_COMPRESSION):
+    """
+    Keeps only the sentences of the retrieved chunks that best answer the query, up to the token budget.
+    Kept sentences stay in their original order and adjacent ones are merged back into passages.
+    """
+    if method == 'none' or not context_list:
+        return context_list
+
+    # Split every chunk into sentences, dropping sentences repeated by the chunk overlap
+    sentences = []  # (chunk index, sentence index, text)
+    seen = set()
+    for chunk_index, doc in enumerate(context_list):
+        for sentence_index, sentence in enumerate(split_sentences(doc.page_content)):
+            normalized = normalize_text(sentence)
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                sentences.append((chunk_index, sentence_index, sentence))
+    if not sentences:
+        return context_list
+
+    if method == 'cross-encoder':
+        scores = cross_encoder_scores(query, [text for _, _, text in sentences])
+    elif method == 'lexical':
+        scores = lexical_scores(query, [text for _, _, text in sentences])
+    else:
+        raise ValueError('Context compression method not supported')
+
+    # Greedily keep the best sentences that fit in the budget
+    kept = []
+    used_tokens = 0
+    for position in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+        tokens = count_tokens(sentences[position][2])
+        if used_tokens + tokens > token_budget and kept:
+            continue
+        kept.append(position)
+        used_tokens += tokens
+
+    # Rebuild one document per chunk, merging runs of adjacent sentences into a single passage
+    compressed = []
+    for chunk_index, doc in enumerate(context_list):
+        chunk_sentences = sorted((sentences[i][1], sentences[i][2]) for i in kept if sentences[i][0] == chunk_index)
+        if not chunk_sentences:
+            continue
+        passages = [[chunk_sentences[0][1]]]
+        for (previous_index, _), (sentence_index, text) in zip(chunk_sentences, chunk_sentences[1:]):
+            if sentence_index == previous_index + 1:
+                passages[-1].append(text)
+            else:
+                passages.append([text])
+        compressed.append(Document(page_content=' ... '.join(' '.join(passage) for passage in passages), metadata=doc.metadata))
+    return compressed
@@ -0,0 +1,218 @@
+# Imports
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from src.constants import CONVERSATION_MAX_MESSAGES, CONVERSATION_SUMMARY_MAX_CHARS, SESSION_IDLE_TIMEOUT_SECONDS, CONVERSATION_TRANSCRIPT_MAX_MESSAGES
+from src.constants import CONVERSATION_STORE_BACKEND, CONVERSATION_DB_PATH
+
+
+def summarize_message(message: dict):
+    """
+    Cheap extractive summary of a single message: its first sentence, prefixed with who said it
+    """
+    speaker = 'User' if message['role'] == 'user' else 'You'
+    first_sentence = message['content'].strip().split('\n')[0].split('. ')[0]
+    return f'{speaker}: {first_sentence}'
+
+
+def fold_into_summary(summary: str, messages: list, max_chars: int = CONVERSATION_SUMMARY_MAX_CHARS):
+    # Append the new messages and keep only the most recent part of the summary
+    summary = '\n'.join([summary] + [summarize_message(message) for message in messages]).strip()
+    if len(summary) > max_chars:
+        summary = summary[-max_chars:].split('\n', 1)[-1]
+    return summary
+
+
+# Parent conversation store class
+class ConversationStore(ABC):
+    """
+    Keeps the last few messages of each session verbatim and a rolling summary of everything older for the prompt,
+    plus a separate transcript of the conversation for display. Subclasses only need to implement the storage methods below.
+    """
+
+    def __init__(self, max_messages: int = CONVERSATION_MAX_MESSAGES, idle_timeout: float = SESSION_IDLE_TIMEOUT_SECONDS,
+                 max_transcript_messages: int = CONVERSATION_TRANSCRIPT_MAX_MESSAGES):
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.max_transcript_messages = max_transcript_messages
+        self.lock = threading.Lock()
+        self.last_eviction = time.time()
+
+    @abstractmethod
+    def load_session(self, session_id: str):
+        pass
+
+    @abstractmethod
+    def save_session(self, session_id: str, messages: list, summary: str):
+        pass
+
+    @abstractmethod
+    def load_transcript(self, session_id: str):
+        pass
+
+    @abstractmethod
+    def append_transcript(self, session_id: str, message: dict):
+        pass
+
+    @abstractmethod
+    def delete_sessions(self, session_ids: list):
+        pass
+
+    @abstractmethod
+    def idle_sessions(self, cutoff: float):
+        pass
+
+    def append(self, session_id: str, role: str, content: str):
+        with self.lock:
+            messages, summary = self.load_session(session_id)
+            messages.append({'role': role, 'content': content})
+            self.append_transcript(session_id, {'role': role, 'content': content})
+
+            # Fold the oldest messages into the summary once the window is full
+            if len(messages) > self.max_messages:
+                overflow = len(messages) - self.max_messages
+                summary = fold_into_summary(summary, messages[:overflow])
+                messages = messages[overflow:]
+            self.save_session(session_id, messages, summary)
+        self.evict_idle()
+
+    def get_messages(self, session_id: str):
+        """
+        Returns the transcript to display, which keeps messages after they are folded out of the prompt window
+        """
+        with self.lock:
+            return self.load_transcript(session_id)
+
+    def get_history(self, session_id: str, max_messages: int, include_summary: bool = True):
+        """
+        Returns the chat history to put in a prompt: a summary of everything before the last max_messages messages
+        (if any) followed by those messages
+        """
+        with self.lock:
+            messages, summary = self.load_session(session_id)
+        window_start = max(0, len(messages) - max_messages) if max_messages > 0 else len(messages)
+        history = messages[window_start:]
+        if include_summary:
+            # Verbatim messages older than the window are summarized too, so nothing falls between the summary and the window
+            summary = fold_into_summary(summary, messages[:window_start]) if window_start else summary
+            if summary:
+                history = [{'role': 'summary', 'content': summary}] + history
+        return history
+
+    def clear(self, session_id: str):
+        with self.lock:
+            self.delete_sessions([session_id])
+
+    def evict_idle(self):
+        # Only scan for idle sessions every so often
+        now = time.time()
+        if now - self.last_eviction < self.idle_timeout / 10:
+            return
+        self.last_eviction = now
+        with self.lock:
+            self.delete_sessions(self.idle_sessions(cutoff=now - self.idle_timeout))
+
+    def get_stats(self, session_id: str):
+        """
+        Returns the number of messages and approximate bytes held for a session
+        """
+        with self.lock:
+            messages, summary = self.load_session(session_id)
+            transcript = self.load_transcript(session_id)
+        return {
+            'messages': len(messages),
+            'transcript_messages': len(transcript),
+            'summary_chars': len(summary),
+            'bytes': sum(len(m['content'].encode()) for m in messages + transcript) + len(summary.encode())
+        }
+
+
+class InMemoryConversationStore(ConversationStore):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sessions = {}
+
+    def load_session(self, session_id: str):
+        session = self.sessions.get(session_id)
+        if session is None:
+            return [], ''
+        return list(session['messages']), session['summary']
+
+    def save_session(self, session_id: str, messages: list, summary: str):
+        transcript = self.sessions.get(session_id, {}).get('transcript', [])
+        self.sessions[session_id] = {'messages': messages, 'summary': summary, 'transcript': transcript, 'last_active': time.time()}
+
+    def load_transcript(self, session_id: str):
+        return list(self.sessions.get(session_id, {}).get('transcript', []))
+
+    def append_transcript(self, session_id: str, message: dict):
+        session = self.sessions.setdefault(session_id, {'messages': [], 'summary': '', 'transcript': [], 'last_active': time.time()})
+        session['transcript'] = (session['transcript'] + [message])[-self.max_transcript_messages:]
+
+    def delete_sessions(self, session_ids: list):
+        for session_id in session_ids:
+            self.sessions.pop(session_id, None)
+
+    def idle_sessions(self, cutoff: float):
+        return [session_id for session_id, session in self.sessions.items() if session['last_active'] < cutoff]
+
+
+class SqliteConversationStore(ConversationStore):
+
+    def __init__(self, db_path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, summary TEXT, last_active REAL)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS messages (session_id TEXT, position INTEGER, role TEXT, content TEXT)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, position)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS transcript (session_id TEXT, role TEXT, content TEXT)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS transcript_session ON transcript (session_id)')
+        self.connection.commit()
+
+    def load_session(self, session_id: str):
+        row = self.connection.execute('SELECT summary FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+        if row is None:
+            return [], ''
+        rows = self.connection.execute('SELECT role, content FROM messages WHERE session_id = ? ORDER BY position', (session_id,)).fetchall()
+        return [{'role': role, 'content': content} for role, content in rows], row[0]
+
+    def save_session(self, session_id: str, messages: list, summary: str):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)', (session_id, summary, time.time()))
+            self.connection.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+            self.connection.executemany('INSERT INTO messages VALUES (?, ?, ?, ?)',
+                                        [(session_id, i, m['role'], m['content']) for i, m in enumerate(messages)])
+
+    def load_transcript(self, session_id: str):
+        rows = self.connection.execute('SELECT role, content FROM transcript WHERE session_id = ? ORDER BY rowid', (session_id,)).fetchall()
+        return [{'role': role, 'content': content} for role, content in rows]
+
+    def append_transcript(self, session_id: str, message: dict):
+        with self.connection:
+            self.connection.execute('INSERT INTO transcript VALUES (?, ?, ?)', (session_id, message['role'], message['content']))
+            self.connection.execute('DELETE FROM transcript WHERE session_id = ? AND rowid NOT IN '
+                                    '(SELECT rowid FROM transcript WHERE session_id = ? ORDER BY rowid DESC LIMIT ?)',
+                                    (session_id, session_id, self.max_transcript_messages))
+
+    def delete_sessions(self, session_ids: list):
+        with self.connection:
+            for session_id in session_ids:
+                self.connection.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+                self.connection.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+                self.connection.execute('DELETE FROM transcript WHERE session_id = ?', (session_id,))
+
+    def idle_sessions(self, cutoff: float):
+        rows = self.connection.execute('SELECT session_id FROM sessions WHERE last_active < ?', (cutoff,)).fetchall()
+        return [row[0] for row in rows]
+
+
+def create_conversation_store(backend: str = CONVERSATION_STORE_BACKEND):
+    if backend == 'memory':
+        return InMemoryConversationStore()
+    elif backend == 'sqlite':
+        return SqliteConversationStore(db_path=CONVERSATION_DB_PATH)
+    else:
+        raise ValueError('Conversation store backend not supported')
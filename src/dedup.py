@@ -0,0 +1,117 @@
+# Imports
+import re
+import hashlib
+
+import numpy as np
+
+from src.constants import LEAGUE_KEYWORDS, MINHASH_PERMUTATIONS, MINHASH_BAND_ROWS, MINHASH_SHINGLE_WORDS, NEAR_DUPLICATE_THRESHOLD
+
+# League names are replaced so e.g. the NBA and WNBA versions of the same rule normalize to the same text
+LEAGUE_NAMES = sorted({league.lower() for leagues in LEAGUE_KEYWORDS.values() for league in leagues})
+LEAGUE_NAME_PATTERN = re.compile(r'\b(' + '|'.join(LEAGUE_NAMES) + r')\b')
+
+# Fixed random permutations (a * x + b) mod p so signatures are comparable across runs and processes
+MERSENNE_PRIME = (1 << 31) - 1
+PERMUTATION_RNG = np.random.default_rng(13)
+PERMUTATION_A = PERMUTATION_RNG.integers(1, MERSENNE_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+PERMUTATION_B = PERMUTATION_RNG.integers(0, MERSENNE_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalize_text(text: str):
+    text = LEAGUE_NAME_PATTERN.sub('league', text.lower())
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text).split())
+
+
+def normalized_hash(text: str):
+    return hashlib.sha256(normalize_text(text).encode()).hexdigest()
+
+
+def minhash_signature(text: str):
+    """
+    Returns the MinHash signature of the word shingles of the normalized text
+    """
+    words = normalize_text(text).split()
+    shingles = {' '.join(words[i:i + MINHASH_SHINGLE_WORDS]) for i in range(max(1, len(words) - MINHASH_SHINGLE_WORDS + 1))}
+    hashes = np.array([int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), 'little') for s in shingles], dtype=np.uint64)
+    permuted = (np.outer(hashes, PERMUTATION_A) + PERMUTATION_B) % MERSENNE_PRIME
+    return permuted.min(axis=0)
+
+
+def estimate_similarity(signature_a, signature_b):
+    return float(np.mean(signature_a == signature_b))
+
+
+class ChunkDeduplicator():
+    """
+    Finds exact (after normalization) and near-duplicate chunks using MinHash with LSH banding
+    """
+
+    def __init__(self, threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self.normalized = {}   # normalized hash -> chunk key
+        self.signatures = {}   # chunk key -> signature
+        self.buckets = {}      # (band, band hash) -> chunk keys
+
+    def get_bands(self, signature):
+        for band, start in enumerate(range(0, len(signature), MINHASH_BAND_ROWS)):
+            yield band, signature[start:start + MINHASH_BAND_ROWS].tobytes()
+
+    def find_duplicate(self, text: str, signature=None):
+        """
+        Returns the key of a previously added chunk that duplicates this text, or None
+        """
+        norm_hash = normalized_hash(text)
+        if norm_hash in self.normalized:
+            return self.normalized[norm_hash]
+
+        # Only compare against chunks that share at least one LSH band
+        signature = minhash_signature(text) if signature is None else signature
+        candidates = set()
+        for bucket in self.get_bands(signature):
+            candidates.update(self.buckets.get(bucket, []))
+        best_key, best_similarity = None, self.threshold
+        for key in candidates:
+            similarity = estimate_similarity(signature, self.signatures[key])
+            if similarity >= best_similarity:
+                best_key, best_similarity = key, similarity
+        return best_key
+
+    def add(self, key, text: str, signature=None):
+        signature = minhash_signature(text) if signature is None else signature
+        self.normalized.setdefault(normalized_hash(text), key)
+        self.signatures[key] = signature
+        for bucket in self.get_bands(signature):
+            self.buckets.setdefault(bucket, []).append(key)
+
+    def restore(self, normalized: dict, signatures: dict):
+        # Rebuild the LSH buckets from saved state
+        self.normalized = dict(normalized)
+        self.signatures = dict(signatures)
+        self.buckets = {}
+        for key, signature in self.signatures.items():
+            for bucket in self.get_bands(signature):
+                self.buckets.setdefault(bucket, []).append(key)
+
+    def find_or_add(self, key, text: str):
+        """
+        Returns the key of the canonical chunk for this text, adding it as a new canonical chunk if it is not a duplicate
+        """
+        signature = minhash_signature(text)
+        duplicate = self.find_duplicate(text, signature=signature)
+        if duplicate is not None:
+            return duplicate
+        self.add(key, text, signature=signature)
+        return key
+
+
+def collapse_duplicate_documents(docs: list):
+    """
+    Drops search results that duplicate a higher ranked result, e.g. the same rule from the NBA and WNBA
+    rulebooks or from two seasons of the same rulebook
+    """
+    deduplicator = ChunkDeduplicator()
+    unique_docs = []
+    for i, doc in enumerate(docs):
+        if deduplicator.find_or_add(i, doc.page_content) == i:
+            unique_docs.append(doc)
+    return unique_docs
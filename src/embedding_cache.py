@@ -0,0 +1,87 @@
+# Imports
+import os
+import fcntl
+import hashlib
+import pickle
+
+from src.dedup import ChunkDeduplicator
+
+
+def hash_text(text: str):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class EmbeddingCache():
+    """
+    Maps the content hash of a chunk to its embedding so each chunk is only ever embedded once, across seasons and leagues.
+    Chunks that are near-duplicates of an already embedded chunk (e.g. the same rule in the NBA and WNBA rulebooks)
+    share its embedding instead of being embedded again.
+    """
+
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self.embeddings = {}
+        self.deduplicator = ChunkDeduplicator()
+        self.stats = {'embedded': 0, 'cached': 0, 'near_duplicates': 0}
+        if os.path.exists(cache_path):
+            self.load()
+
+    def load(self):
+        with open(self.cache_path, 'rb') as f:
+            state = pickle.load(f)
+        self.embeddings = state['embeddings']
+        self.deduplicator.restore(state['normalized'], state['signatures'])
+
+    def embed(self, texts: list, embedding_model):
+        """
+        Returns an embedding for every text, only calling the embedding model for texts not seen before
+        """
+        hashes = [hash_text(text) for text in texts]
+        missing = {}
+        aliases = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash in self.embeddings or text_hash in missing or text_hash in aliases:
+                self.stats['cached'] += 1
+                continue
+
+            # Reuse the embedding of a near-duplicate chunk if there is one
+            canonical_hash = self.deduplicator.find_or_add(text_hash, text)
+            if canonical_hash != text_hash and (canonical_hash in self.embeddings or canonical_hash in missing):
+                aliases[text_hash] = canonical_hash
+                self.stats['near_duplicates'] += 1
+            else:
+                missing[text_hash] = text
+
+        if missing:
+            new_embeddings = embedding_model.embed_documents(list(missing.values()))
+            self.embeddings.update(zip(missing.keys(), new_embeddings))
+            self.stats['embedded'] += len(missing)
+
+        # Aliased chunks point at the same list, so pickle only stores the vector once
+        for text_hash, canonical_hash in aliases.items():
+            self.embeddings[text_hash] = self.embeddings[canonical_hash]
+        print(f'Embedded {len(missing)} new chunks, reused {len(aliases)} near-duplicate and {len(texts) - len(missing) - len(aliases)} cached chunks')
+
+        return [self.embeddings[text_hash] for text_hash in hashes]
+
+    def save(self):
+        """
+        Merges this cache into the one on disk, since several leagues may be built in parallel
+        """
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.exists(self.cache_path):
+                embeddings, deduplicator = self.embeddings, self.deduplicator
+                self.deduplicator = ChunkDeduplicator()
+                self.load()
+                self.embeddings.update(embeddings)
+                self.deduplicator.restore({**self.deduplicator.normalized, **deduplicator.normalized},
+                                          {**self.deduplicator.signatures, **deduplicator.signatures})
+
+            temp_path = self.cache_path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                pickle.dump({'embeddings': self.embeddings,
+                             'normalized': self.deduplicator.normalized,
+                             'signatures': self.deduplicator.signatures}, f)
+            os.replace(temp_path, self.cache_path)
@@ -1,32 +1,24 @@
 # Imports
 import os
+import re
+from functools import lru_cache
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_mistralai import MistralAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain.retrievers.document_compressors import FlashrankRerank
-from langchain.retrievers import ContextualCompressionRetriever
-from flashrank import Ranker
+from flashrank import Ranker, RerankRequest
+from langchain_core.documents import Document
 
 from src.Sports import Sports
-from src.constants import FAISS_DB_FOLDER, MODEL_FOLDER, MISTRAL_API_KEY
+from src.dedup import collapse_duplicate_documents
+from src.vector_compression import load_compressed_db, get_compressed_index_path
+from src.reranker import RerankerEngine, score_pairs
+from src.constants import FAISS_DB_FOLDER, MODEL_FOLDER, MISTRAL_API_KEY, MISTRAL_ENDPOINT, FAISS_INDEX_COMPRESSION, RERANKER_BACKEND, RERANKER_TOP_N
 
 
 def embed_single_document(sport: Sports):
-    # Load the document for the sport
-    sport_obj = sport.value
-    docs = sport_obj.load_document()
-    
-    # Chunk the text for the FAISS db
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=250)
-    chunked_docs = text_splitter.split_documents(docs)
-    
-    # Initialize the embedding model
-    embedding_model = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY)
-    
-    # Create and save the FAISS db
-    db = FAISS.from_documents(chunked_docs, embedding_model)
-    db.save_local(os.path.join(FAISS_DB_FOLDER, f'faiss_index_{sport_obj.league_name}'))
+    # Embed every season of the sport, reusing the vectors of chunks that did not change
+    sport.value.embed_all_seasons()
     
     
 def embed_all_documents():
@@ -34,19 +26,111 @@ def embed_all_documents():
         embed_single_document(sport)
 
 
-def load_faiss_db(sport: Sports):
+def load_faiss_db(sport: Sports, season: str = None):
     # Get info needed to load the db and then return the loaded db
+    sport_obj = sport.value.for_season(season)
+    embedding_model = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY, endpoint=MISTRAL_ENDPOINT)
+    index_folder = os.path.join(FAISS_DB_FOLDER, sport_obj.index_name)
+    
+    # Use the compressed index with exact re-scoring if one has been built
+    if FAISS_INDEX_COMPRESSION is not None:
+        if os.path.exists(get_compressed_index_path(index_folder, FAISS_INDEX_COMPRESSION)):
+            return load_compressed_db(index_folder, embedding_model, method=FAISS_INDEX_COMPRESSION)
+        print(f'Warning: no {FAISS_INDEX_COMPRESSION} index for {sport_obj.index_name}, loading the float32 index. Run scripts/build.py to build it')
+    return FAISS.load_local(index_folder, embedding_model, allow_dangerous_deserialization=True)
+
+
+def load_diff_db(sport: Sports, from_season: str, to_season: str):
+    # The diff index is built at ingest time so change questions only search the changes
+    sport_obj = sport.value
+    embedding_model = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY, endpoint=MISTRAL_ENDPOINT)
+    return FAISS.load_local(os.path.join(FAISS_DB_FOLDER, sport_obj.get_diff_index_name(from_season, to_season)), embedding_model, allow_dangerous_deserialization=True)
+
+
+def get_season_change(sport: Sports, query: str):
+    """
+    Returns the (from_season, to_season) pair if the query asks what changed between two seasons we have, otherwise None
+    """
+    if not re.search(r'\b(change|changed|changes|different|difference|new)\b', query.lower()):
+        return None
+
+    # Match the years mentioned in the question to the seasons of the sport
     sport_obj = sport.value
-    embedding_model = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY)
-    return FAISS.load_local(os.path.join(FAISS_DB_FOLDER, f'faiss_index_{sport_obj.league_name}'), embedding_model, allow_dangerous_deserialization=True)
+    seasons = [sport_obj.match_season(year) for year in re.findall(r'\b(?:19|20)\d{2}\b', query)]
+    seasons = sorted(set(season for season in seasons if season is not None))
+    if len(seasons) != 2:
+        return None
+    return seasons[0], seasons[1]
 
 def query_faiss_db(db, query: str, k: int = 3):
     retriever = db.as_retriever(search_type="similarity", search_kwargs={'k': k})
     return retriever.invoke(query)
 
 
-def query_faiss_with_rerank(db, query: str):
-    compressor = FlashrankRerank(client=Ranker(model_name='ms-marco-MiniLM-L-12-v2', cache_dir=MODEL_FOLDER))
-    retriever = db.as_retriever(search_type="similarity", search_kwargs={'k': 15})
-    compression_retriever = ContextualCompressionRetriever(base_compressor=compressor, base_retriever=retriever)
-    return compression_retriever.get_relevant_documents(query)
+@lru_cache(maxsize=1)
+def load_ranker():
+    # Only load the reranking model once per process
+    if RERANKER_BACKEND == 'onnx':
+        return RerankerEngine()
+    return Ranker(model_name='ms-marco-MiniLM-L-12-v2', cache_dir=MODEL_FOLDER)
+
+
+def rerank_documents(docs: list, query: str):
+    ranker = load_ranker()
+    if not isinstance(ranker, RerankerEngine):
+        compressor = FlashrankRerank(client=ranker)
+        return compressor.compress_documents(docs, query)
+
+    # Same output as FlashrankRerank, with the chunk metadata passed along so scores can be cached per chunk
+    passages = [{'id': i, 'text': doc.page_content, 'meta': doc.metadata} for i, doc in enumerate(docs)]
+    results = ranker.rerank(RerankRequest(query=query, passages=passages))[:RERANKER_TOP_N]
+    return [Document(page_content=r['text'], metadata={**r['meta'], 'relevance_score': r['score']}) for r in results]
+
+
+def rerank_documents_batch(docs_lists: list, queries: list):
+    """
+    Same as rerank_documents for many queries at once. Every query and document pair is scored together,
+    RERANKER_BATCH_PAIRS pairs per model call, instead of running the model once per query.
+    """
+    ranker = load_ranker()
+    if isinstance(ranker, RerankerEngine):
+        scores = ranker.score_batch([(query, [{'text': doc.page_content, 'meta': doc.metadata} for doc in docs])
+                                     for query, docs in zip(queries, docs_lists)])
+    else:
+        flat_scores = score_pairs(ranker, [(query, doc.page_content) for query, docs in zip(queries, docs_lists) for doc in docs])
+        scores, start = [], 0
+        for docs in docs_lists:
+            scores.append(flat_scores[start:start + len(docs)])
+            start += len(docs)
+
+    # Keep the top documents of each query, with their score in the metadata like FlashrankRerank
+    context_lists = []
+    for docs, doc_scores in zip(docs_lists, scores):
+        ranked = sorted(zip(docs, doc_scores), key=lambda pair: pair[1], reverse=True)[:RERANKER_TOP_N]
+        context_lists.append([Document(page_content=doc.page_content, metadata={**doc.metadata, 'relevance_score': score})
+                              for doc, score in ranked])
+    return context_lists
+
+
+def query_faiss_with_rerank(db, query: str, query_embedding: list = None):
+    # Skip embedding the query again if it was already embedded, e.g. by the league classifier
+    if query_embedding is not None:
+        docs = db.similarity_search_by_vector(query_embedding, k=15)
+    else:
+        docs = query_faiss_db(db, query=query, k=15)
+    
+    # Collapse duplicate hits so the reranker and prompt don't see the same passage twice
+    return rerank_documents(collapse_duplicate_documents(docs), query=query)
+
+
+def query_rule_changes(sport: Sports, from_season: str, to_season: str, query: str, k: int = 15):
+    """
+    Searches the diff indexes of every consecutive pair of seasons between from_season and to_season and reranks the changes
+    """
+    seasons = sport.value.get_seasons()
+    seasons = seasons[seasons.index(from_season):seasons.index(to_season) + 1]
+
+    docs = []
+    for older, newer in zip(seasons, seasons[1:]):
+        docs.extend(query_faiss_db(load_diff_db(sport, from_season=older, to_season=newer), query=query, k=k))
+    return rerank_documents(collapse_duplicate_documents(docs), query=query)
@@ -1,5 +1,12 @@
 # Imports
 import os
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
 
 from langchain_community.llms.huggingface_pipeline import HuggingFacePipeline
 from langchain_core.messages import HumanMessage, AIMessage
@@ -7,10 +14,292 @@ from langchain_mistralai.chat_models import ChatMistralAI
 
 from src.Sports import Sports
 from src.faiss_db import load_faiss_db, query_faiss_db
-from src.constants import PROMPT_TEMPLATE, IS_CONTEXT_REQUIRED_PROMPT_TEMPLATE, MISTRAL_API_KEY
+from src.constants import (PROMPT_TEMPLATE, IS_CONTEXT_REQUIRED_PROMPT_TEMPLATE, MISTRAL_API_KEY, MISTRAL_ENDPOINT, LLM_MODEL,
+                           LLM_FALLBACK_MODEL, ROUTER_MODEL, LLM_REQUEST_POLICY, LLM_TIMEOUT_SECONDS, LLM_HEDGE_PERCENTILE,
+                           LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_DEFAULT_SECONDS, LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RESET_SECONDS,
+                           LLM_MAX_ATTEMPTS)
+
+def initialize_mistral_chat(model: str = LLM_MODEL):
+    return ChatMistralAI(mistral_api_key=MISTRAL_API_KEY, endpoint=MISTRAL_ENDPOINT, model=model, temperature=0.2, safe_mode=True,
+                         timeout=LLM_TIMEOUT_SECONDS)
+
+
+class CircuitBreaker():
+    """
+    Stops sending requests to the main model after repeated failures, then lets a single trial request through
+    once the reset time has passed
+    """
+
+    def __init__(self, failure_threshold: int = LLM_CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = LLM_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def get_state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half-open' if time.monotonic() - self.opened_at >= self.reset_seconds else 'open'
+
+    def allow_request(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_seconds and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class RequestPolicy():
+    """
+    Sends LLM requests with a hedged duplicate once the first is slower than the recent latency percentile,
+    a timeout that falls back to the smaller model, and a circuit breaker that skips the main model while it is degraded.
+    Latencies are kept per model and call type ('invoke' for full responses, 'stream' for time to first token),
+    and each model has its own circuit breaker.
+    """
+
+    def __init__(self, fallback_model: str = LLM_FALLBACK_MODEL, timeout: float = LLM_TIMEOUT_SECONDS, hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+                 enabled: bool = LLM_REQUEST_POLICY, max_attempts: int = LLM_MAX_ATTEMPTS):
+        self.fallback_model = fallback_model
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.enabled = enabled
+        self.latencies = {}  # (model, call type) -> recent latencies
+        self.breakers = {}   # model -> CircuitBreaker
+        self.max_attempts = max_attempts
+        self.attempts_in_flight = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_attempts, thread_name_prefix='llm')
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'hedges': 0, 'hedges_skipped': 0, 'hedge_wins': 0, 'timeouts': 0, 'errors': 0, 'fallbacks': 0, 'circuit_skips': 0}
+
+    def count(self, stat: str):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def submit(self, function, *args):
+        # Runs an attempt on the bounded pool, counting it until it ends even after it has been abandoned
+        with self.lock:
+            self.attempts_in_flight += 1
+        future = self.executor.submit(function, *args)
+        future.add_done_callback(self.end_attempt)
+        return future
+
+    def end_attempt(self, future):
+        with self.lock:
+            self.attempts_in_flight -= 1
+
+    def can_hedge(self):
+        # Abandoned attempts still hold a thread until they end, so no duplicates are sent while the pool is full
+        with self.lock:
+            if self.attempts_in_flight < self.max_attempts:
+                return True
+            self.stats['hedges_skipped'] += 1
+            return False
+
+    def get_hedge_delay(self, model: str, call: str):
+        with self.lock:
+            latencies = self.latencies.get((model, call), [])
+            if len(latencies) < LLM_HEDGE_MIN_SAMPLES:
+                return LLM_HEDGE_DEFAULT_SECONDS
+            return float(np.percentile(latencies, self.hedge_percentile))
+
+    def record_latency(self, model: str, call: str, seconds: float):
+        # Timed out requests are recorded at the timeout so the tail they make up is not left out of the percentile
+        with self.lock:
+            self.latencies.setdefault((model, call), deque(maxlen=500)).append(seconds)
+
+    def get_breaker(self, model: str):
+        with self.lock:
+            return self.breakers.setdefault(model, CircuitBreaker())
+
+    def use_main_model(self, model: str):
+        if model == self.fallback_model or self.get_breaker(model).allow_request():
+            return True
+        self.count('circuit_skips')
+        return False
+
+    def invoke(self, prompt: str, model: str = LLM_MODEL):
+        """
+        Returns the response text of the first request to answer
+        """
+        if not self.enabled:
+            return initialize_mistral_chat(model).invoke(prompt).content
+        self.count('requests')
+        if not self.use_main_model(model):
+            self.count('fallbacks')
+            return initialize_mistral_chat(self.fallback_model).invoke(prompt).content
+
+        start = time.monotonic()
+        breaker = self.get_breaker(model)
+        chat = initialize_mistral_chat(model)
+        futures = [self.submit(chat.invoke, prompt)]
+        done, _ = wait(futures, timeout=self.get_hedge_delay(model, 'invoke'))
+        if not done and self.can_hedge():
+            # The first request is slow, race a duplicate against it
+            self.count('hedges')
+            futures.append(self.submit(chat.invoke, prompt))
+
+        # Take the first request that succeeds, the other one finishes in the background and is discarded
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, self.timeout - (time.monotonic() - start)), return_when=FIRST_COMPLETED)
+            if not done:
+                self.count('timeouts')
+                self.record_latency(model, 'invoke', self.timeout)
+                break
+            for future in done:
+                if future.exception() is None:
+                    self.record_latency(model, 'invoke', time.monotonic() - start)
+                    breaker.record_success()
+                    if future is not futures[0]:
+                        self.count('hedge_wins')
+                    for other in pending:
+                        other.cancel()
+                    return future.result().content
+                self.count('errors')
+
+        for future in pending:
+            future.cancel()
+        breaker.record_failure()
+        self.count('fallbacks')
+        return initialize_mistral_chat(self.fallback_model).invoke(prompt).content
+
+    def stream(self, prompt: str, model: str = LLM_MODEL):
+        """
+        Yields the chunks of the first stream to produce a token, hedging on time to first token
+        """
+        if not self.enabled:
+            yield from initialize_mistral_chat(model).stream(prompt)
+            return
+        self.count('requests')
+        if not self.use_main_model(model):
+            self.count('fallbacks')
+            yield from initialize_mistral_chat(self.fallback_model).stream(prompt)
+            return
+
+        start = time.monotonic()
+        deadline = start + self.timeout
+        breaker = self.get_breaker(model)
+        chat = initialize_mistral_chat(model)
+        chunks = queue.Queue()
+        stops = []  # One per attempt, so stopping the loser never stops the winner
+
+        def run_attempt(attempt: int, stop: threading.Event):
+            # Stream into the shared queue until the attempt finishes or is stopped, always ending with (attempt, None, error)
+            error = None
+            stream = chat.stream(prompt)
+            try:
+                for chunk in stream:
+                    if stop.is_set():
+                        break
+                    chunks.put((attempt, chunk, None))
+            except Exception as e:
+                error = e
+            finally:
+                # Closes the response of an abandoned attempt instead of reading it to the end. A read that is stuck
+                # waiting on the server is bounded by the client timeout.
+                stream.close()
+                chunks.put((attempt, None, error))
+
+        def start_attempt():
+            stops.append(threading.Event())
+            self.submit(run_attempt, len(stops) - 1, stops[-1])
+
+        start_attempt()
+        ended, winner, hedged = set(), None, False
+        hedge_at = start + self.get_hedge_delay(model, 'stream')
+        try:
+            while winner is None:
+                now = time.monotonic()
+                if now >= deadline:
+                    self.count('timeouts')
+                    self.record_latency(model, 'stream', self.timeout)
+                    break
+                if not hedged and now >= hedge_at:
+                    hedged = True
+                    if self.can_hedge():
+                        self.count('hedges')
+                        start_attempt()
+                if len(ended) == len(stops):
+                    break  # Every attempt failed before its first token
+                try:
+                    attempt, chunk, error = chunks.get(timeout=max(0.01, (deadline if hedged else min(hedge_at, deadline)) - now))
+                except queue.Empty:
+                    continue
+                if chunk is None:
+                    # An attempt failed (or finished empty) before its first token
+                    self.count('errors')
+                    ended.add(attempt)
+                    hedge_at = time.monotonic()  # Hedge right away rather than waiting on nothing
+                    continue
+                winner = attempt
+                self.record_latency(model, 'stream', time.monotonic() - start)
+                breaker.record_success()
+                if winner == 1:
+                    self.count('hedge_wins')
+                for loser, stop in enumerate(stops):
+                    if loser != winner:
+                        stop.set()
+                yield chunk
+
+            if winner is None:
+                for stop in stops:
+                    stop.set()
+                breaker.record_failure()
+                self.count('fallbacks')
+                yield from initialize_mistral_chat(self.fallback_model).stream(prompt)
+                return
+
+            # Keep yielding the winner's chunks, the loser's are dropped. A winner that goes quiet for the whole
+            # timeout is given up on, so a stalled stream cannot hang the caller.
+            while True:
+                try:
+                    attempt, chunk, error = chunks.get(timeout=self.timeout)
+                except queue.Empty:
+                    self.count('timeouts')
+                    raise TimeoutError(f'{model} stopped streaming for {self.timeout}s')
+                if attempt != winner:
+                    continue
+                if error is not None:
+                    raise error
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            # Also stops the attempts if the caller stops reading early
+            for stop in stops:
+                stop.set()
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            latencies = {key: list(values) for key, values in self.latencies.items()}
+            breakers = dict(self.breakers)
+        stats['circuit'] = {model: breaker.get_state() for model, breaker in breakers.items()}
+        for (model, call), values in latencies.items():
+            stats.update({f'{model} {call} p{p}': float(np.percentile(values, p)) for p in [50, 99]})
+        return stats
+
 
-def initialize_mistral_chat():
-    return ChatMistralAI(mistral_api_key=MISTRAL_API_KEY, model='open-mixtral-8x7b', temperature=0.2, safe_mode=True)
+# One policy per process so latencies and the circuit state are shared across sessions
+request_policy = RequestPolicy()
 
 
 def add_context_to_prompt(context_list, prompt: str):
@@ -46,6 +335,8 @@ def add_conversation_histroy_to_prompt(chat_histroy: list, prompt: str):
             final_chat_list.append(f'User: {chat["content"]}')
         elif chat['role'] == 'assistant':
             final_chat_list.append(f'You: {chat["content"]}')
+        elif chat['role'] == 'summary':
+            final_chat_list.append(f'Summary of the earlier conversation:\n{chat["content"]}')
         
     # Add the final chat list
     return prompt.replace('{chat_history}', '\n'.join(final_chat_list))
@@ -69,24 +360,21 @@ def construct_prompt(sport: Sports, query: str = '', context_list: list = None,
     return prompt
 
 def invoke_llm(prompt: str):
-    chat = initialize_mistral_chat()
-    return chat.invoke(prompt).content
+    return request_policy.invoke(prompt, model=LLM_MODEL)
 
 def stream_llm(prompt: str):
-    chat = initialize_mistral_chat()
-    return chat.stream(prompt)
+    return request_policy.stream(prompt, model=LLM_MODEL)
 
 
 def context_required(sport: Sports, query: str, chat_history: list):
-    chat = initialize_mistral_chat()
     prompt = add_sport_to_prompt(sport=sport, prompt=IS_CONTEXT_REQUIRED_PROMPT_TEMPLATE)
     prompt = add_query_to_prompt(query=query, prompt=prompt)
     prompt = add_conversation_histroy_to_prompt(chat_histroy=chat_history, prompt=prompt)
-    response = chat.invoke(prompt)
+    response = request_policy.invoke(prompt, model=ROUTER_MODEL)
     
-    if 'yes' in response.content.split()[0].lower():
+    if 'yes' in response.split()[0].lower():
         return True
-    elif 'no' in response.content.split()[0].lower():
+    elif 'no' in response.split()[0].lower():
         return False
     else:
         return False  # Return false if it is unclear
\ No newline at end of file
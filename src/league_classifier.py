@@ -0,0 +1,120 @@
+# Imports
+import os
+import re
+import pickle
+from functools import lru_cache
+
+import faiss
+import numpy as np
+from langchain_mistralai import MistralAIEmbeddings
+
+from src.Sports import Sports
+from src.constants import FAISS_DB_FOLDER, MISTRAL_API_KEY, MISTRAL_ENDPOINT, LEAGUE_KEYWORDS, LEAGUE_CENTROIDS_PATH
+from src.constants import CLASSIFIER_TEMPERATURE, CLASSIFIER_KEYWORD_WEIGHT, CLASSIFIER_PRIOR_WEIGHT
+from src.constants import CLASSIFIER_MIN_CONFIDENCE, CLASSIFIER_LEXICON_CONFIDENCE
+
+# Match whole words and simple plurals, e.g. 'pick' also matches 'picks'
+KEYWORD_PATTERNS = {keyword: re.compile(r'\b' + re.escape(keyword) + r'(s|es)?\b') for keyword in LEAGUE_KEYWORDS}
+
+
+def compute_centroid(index_path: str):
+    # Mean of every chunk vector in the league's index, normalized for cosine similarity
+    index = faiss.read_index(index_path)
+    centroid = index.reconstruct_n(0, index.ntotal).mean(axis=0)
+    return centroid / np.linalg.norm(centroid)
+
+
+@lru_cache(maxsize=1)
+def load_centroids():
+    """
+    Returns a dict of league name -> centroid, recomputing any that are missing or older than their index
+    """
+    cached = {}
+    if os.path.exists(LEAGUE_CENTROIDS_PATH):
+        with open(LEAGUE_CENTROIDS_PATH, 'rb') as f:
+            cached = pickle.load(f)
+
+    centroids = {}
+    updated = False
+    for sport in Sports:
+        index_path = os.path.join(FAISS_DB_FOLDER, sport.value.index_name, 'index.faiss')
+        if not os.path.exists(index_path):
+            continue  # Leagues without vectors are classified by keywords only
+        mtime = os.path.getmtime(index_path)
+        if sport.name in cached and cached[sport.name]['mtime'] == mtime:
+            centroids[sport.name] = cached[sport.name]['centroid']
+        else:
+            centroids[sport.name] = compute_centroid(index_path)
+            cached[sport.name] = {'mtime': mtime, 'centroid': centroids[sport.name]}
+            updated = True
+
+    if updated:
+        with open(LEAGUE_CENTROIDS_PATH, 'wb') as f:
+            pickle.dump(cached, f)
+    return centroids
+
+
+def keyword_logits(question: str):
+    # Each keyword hit adds weight to the leagues that use it, split evenly when shared
+    logits = {name: 0.0 for name in Sports.get_all_names()}
+    question = question.lower()
+    for keyword, leagues in LEAGUE_KEYWORDS.items():
+        if KEYWORD_PATTERNS[keyword].search(question):
+            for league in leagues:
+                logits[league] += CLASSIFIER_KEYWORD_WEIGHT / len(leagues)
+    return logits
+
+
+def softmax(logits: dict):
+    names = list(logits)
+    values = np.array([logits[name] for name in names])
+    values = np.exp(values - values.max())
+    return dict(zip(names, values / values.sum()))
+
+
+def rank_leagues(logits: dict):
+    """
+    Returns a list of (Sports, confidence) pairs, most likely first, keeping every league above the minimum confidence
+    """
+    confidences = sorted(softmax(logits).items(), key=lambda item: item[1], reverse=True)
+    ranked = [(Sports[name], float(confidence)) for name, confidence in confidences]
+    return [ranked[0]] + [(sport, confidence) for sport, confidence in ranked[1:] if confidence >= CLASSIFIER_MIN_CONFIDENCE]
+
+
+def centroid_logits(query_embedding: list):
+    """
+    Returns the cosine similarity of the query to each league's centroid, scaled by the temperature
+    """
+    query = np.array(query_embedding, dtype=np.float32)
+    query = query / np.linalg.norm(query)
+    similarities = {name: float(query @ centroid) for name, centroid in load_centroids().items()}
+
+    # Leagues with no centroid get the mean similarity so they are not ruled out entirely
+    mean_similarity = np.mean(list(similarities.values())) if similarities else 0.0
+    return {name: similarities.get(name, mean_similarity) / CLASSIFIER_TEMPERATURE for name in Sports.get_all_names()}
+
+
+def classify_league(question: str, prior: Sports = None, query_embedding: list = None, embedding_model=None, use_centroids: bool = True):
+    """
+    Maps a free-form question to one or more leagues. Keywords are checked first and the embedding call is
+    skipped when they are decisive, otherwise the query embedding is compared with each league's centroid.
+    With use_centroids=False only the keywords are used and no embedding is ever made.
+    The query embedding is returned so it can be reused for retrieval.
+    """
+    logits = keyword_logits(question)
+    if prior is not None:
+        logits[prior.name] += CLASSIFIER_PRIOR_WEIGHT
+
+    # Fast path: the keywords alone settle it
+    ranked = rank_leagues(logits)
+    if not use_centroids or (query_embedding is None and max(logits.values()) > 0 and ranked[0][1] >= CLASSIFIER_LEXICON_CONFIDENCE):
+        return ranked, query_embedding
+
+    # Compare the question with the centroid of every league's index
+    if query_embedding is None:
+        embedding_model = embedding_model or MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY, endpoint=MISTRAL_ENDPOINT)
+        query_embedding = embedding_model.embed_query(question)
+    for name, logit in centroid_logits(query_embedding).items():
+        logits[name] += logit
+
+    return rank_leagues(logits), query_embedding
@@ -0,0 +1,103 @@
+# Imports
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src import pipeline
+from src.Sports import Sports
+from src.faiss_db import load_ranker
+from src.constants import ADMISSION_STAGE_LIMITS
+
+# Every stage the pipeline admits requests to, plus the whole turn
+STAGES = list(ADMISSION_STAGE_LIMITS) + ['turn']
+
+
+class StageStats():
+    """
+    Thread safe record of the latency and errors of each stage of a turn
+    """
+
+    def __init__(self):
+        self.latencies = {stage: [] for stage in STAGES}
+        self.errors = {stage: 0 for stage in STAGES}
+        self.first_token = []
+        self.lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float = None, error: bool = False):
+        with self.lock:
+            if error:
+                self.errors[stage] += 1
+            else:
+                self.latencies[stage].append(seconds)
+
+    def summary(self, elapsed: float):
+        rows = []
+        for stage in STAGES:
+            latencies = self.latencies[stage]
+            attempts = len(latencies) + self.errors[stage]
+            row = {'stage': stage, 'count': len(latencies), 'error_rate': self.errors[stage] / attempts if attempts else 0.0}
+            if latencies:
+                row.update({f'p{p}': float(np.percentile(latencies, p)) for p in [50, 90, 99]})
+            rows.append(row)
+        return {'throughput': len(self.latencies['turn']) / elapsed, 'stages': rows,
+                'first_token_p50': float(np.percentile(self.first_token, 50)) if self.first_token else None}
+
+
+def run_turn(sport: Sports, question: str, stats: StageStats, stream: bool = False):
+    """
+    Answers one question through the same pipeline as the UI. The pipeline reports each stage it runs to the stats.
+    """
+    start = time.perf_counter()
+    try:
+        if stream:
+            stream = pipeline.stream_answer(sport, question)
+            next(stream)  # The prompt and leagues come before the first token
+            for i, _ in enumerate(stream):
+                if i == 0:
+                    with stats.lock:
+                        stats.first_token.append(time.perf_counter() - start)
+        else:
+            pipeline.answer_question(sport, question)
+    except Exception:
+        stats.record('turn', error=True)
+        return
+    stats.record('turn', time.perf_counter() - start)
+
+
+def run_load_test(questions: list, rate: float, duration: float, max_concurrency: int = 256, stream: bool = False, seed: int = 0):
+    """
+    Open loop load test: turns arrive as a Poisson process at the target rate regardless of how fast they finish
+    """
+    rng = random.Random(seed)
+    stats = StageStats()
+    # Time every stage as it leaves admission, including the requests it sheds
+    pipeline.admission.observer = stats.record
+
+    # Warm up the indexes and reranker so the first arrivals don't measure loading
+    for sport in {Sports[q['league']] for q in questions}:
+        pipeline.get_db(sport)
+    load_ranker()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        next_arrival = start
+        while next_arrival - start < duration:
+            time.sleep(max(0.0, next_arrival - time.perf_counter()))
+            q = rng.choice(questions)
+            executor.submit(run_turn, Sports[q['league']], q['question'], stats, stream)
+            next_arrival += rng.expovariate(rate)
+    pipeline.admission.observer = None
+    return stats.summary(elapsed=time.perf_counter() - start)
+
+
+def print_summary(summary: dict):
+    print(f'Throughput: {summary["throughput"]:.2f} turns/sec')
+    if summary['first_token_p50'] is not None:
+        print(f'Time to first token p50: {summary["first_token_p50"]:.3f}s')
+    print(f'{"Stage":<12}{"Count":>8}{"Errors":>8}{"p50":>9}{"p90":>9}{"p99":>9}')
+    for row in summary['stages']:
+        latencies = ''.join(f'{row[p]:>9.3f}' if p in row else f'{"-":>9}' for p in ['p50', 'p90', 'p99'])
+        print(f'{row["stage"]:<12}{row["count"]:>8}{row["error_rate"]:>8.1%}{latencies}')
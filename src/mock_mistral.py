@@ -0,0 +1,166 @@
+# Imports
+import json
+import time
+import random
+import hashlib
+import threading
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+EMBEDDING_DIMENSION = 1024
+MOCK_ANSWER = ('According to the rulebook, this is handled by the officials as described in the relevant section. '
+               'Let me know if you have any other questions about the rules!')
+
+
+def parse_latency(spec: str):
+    """
+    Parses a latency distribution into a function returning seconds. Supported specs:
+    'fixed:0.5', 'uniform:0.2,1.0', 'lognormal:mu,sigma' and 'spike:base,spike,probability'
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',')] if params else []
+    if kind == 'fixed':
+        return lambda: values[0]
+    elif kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    elif kind == 'lognormal':
+        return lambda: random.lognormvariate(values[0], values[1])
+    elif kind == 'spike':
+        # Mostly fast, occasionally very slow, to mimic a degraded upstream
+        return lambda: values[1] if random.random() < values[2] else values[0]
+    else:
+        raise ValueError(f'Latency distribution {kind} not supported')
+
+
+def mock_embedding(text: str):
+    # Deterministic unit vector per text so repeated queries embed the same way
+    rng = random.Random(hashlib.sha256(text.encode()).digest())
+    vector = [rng.gauss(0, 1) for _ in range(EMBEDDING_DIMENSION)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+
+def mock_completion(prompt: str):
+    # The router prompt asks for a YES/NO answer
+    if "Only respond with 'YES' or 'NO'" in prompt:
+        return 'YES'
+    return MOCK_ANSWER
+
+
+class MockMistralHandler(BaseHTTPRequestHandler):
+    """
+    Mimics the /v1/chat/completions and /v1/embeddings endpoints used by ChatMistralAI and MistralAIEmbeddings
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass  # Keep the load test output readable
+
+    def send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        config = self.server.config
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        self.server.record(self.path)
+
+        # Injected rate limiting
+        if random.random() < config['rate_limit_probability']:
+            self.send_json(429, {'message': 'Requests rate limit exceeded'})
+            return
+
+        if self.path == '/v1/embeddings':
+            time.sleep(config['embedding_latency']())
+            inputs = body.get('input', [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self.send_json(200, {'id': 'mock', 'object': 'list', 'model': body.get('model', 'mistral-embed'),
+                                 'data': [{'object': 'embedding', 'index': i, 'embedding': mock_embedding(text)} for i, text in enumerate(inputs)],
+                                 'usage': {'prompt_tokens': sum(len(text) // 4 for text in inputs), 'completion_tokens': 0,
+                                           'total_tokens': sum(len(text) // 4 for text in inputs)}})
+        elif self.path == '/v1/chat/completions':
+            prompt = '\n'.join(message.get('content', '') for message in body.get('messages', []))
+            content = mock_completion(prompt)
+            usage = {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(content) // 4, 'total_tokens': (len(prompt) + len(content)) // 4}
+            time.sleep(config['chat_latency']())  # Time to first token
+            if body.get('stream'):
+                self.stream_completion(body, content, usage)
+            else:
+                self.send_json(200, {'id': 'mock', 'object': 'chat.completion', 'created': int(time.time()), 'model': body.get('model'),
+                                     'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                                     'usage': usage})
+        else:
+            self.send_json(404, {'message': f'Unknown endpoint {self.path}'})
+
+    def stream_completion(self, body: dict, content: str, usage: dict):
+        # Server-sent events, one word per chunk, paced like a real model
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        words = content.split(' ')
+        for i, word in enumerate(words):
+            chunk = {'id': 'mock', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': body.get('model'),
+                     'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': word + (' ' if i < len(words) - 1 else '')},
+                                  'finish_reason': 'stop' if i == len(words) - 1 else None}]}
+            if i == len(words) - 1:
+                chunk['usage'] = usage
+            self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+            self.wfile.flush()
+            time.sleep(self.server.config['chunk_interval'])
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class MockMistralServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, chat_latency: str = 'fixed:0.5', embedding_latency: str = 'fixed:0.05',
+                 chunk_interval: float = 0.02, rate_limit_probability: float = 0.0):
+        super().__init__(('127.0.0.1', port), MockMistralHandler)
+        self.config = {'chat_latency': parse_latency(chat_latency),
+                       'embedding_latency': parse_latency(embedding_latency),
+                       'chunk_interval': chunk_interval,
+                       'rate_limit_probability': rate_limit_probability}
+        self.request_counts = {}
+        self.lock = threading.Lock()
+
+    def record(self, path: str):
+        with self.lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    def get_endpoint(self):
+        # The base URL, like https://api.mistral.ai
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+def start_mock_server(port: int = 0, **config):
+    """
+    Starts the mock server on a background thread and returns it, port 0 picks a free port
+    """
+    server = MockMistralServer(port, **config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_mock_server(connection, port: int, config: dict):
+    server = MockMistralServer(port, **config)
+    connection.send(server.get_endpoint())
+    server.serve_forever()
+
+
+def start_mock_server_process(port: int = 0, **config):
+    """
+    Starts the mock server in its own process, so its threads don't compete for the GIL with the code being measured.
+    Returns (process, endpoint).
+    """
+    context = multiprocessing.get_context('spawn')
+    parent_connection, child_connection = context.Pipe()
+    process = context.Process(target=run_mock_server, args=(child_connection, port, config), daemon=True)
+    process.start()
+    return process, parent_connection.recv()
@@ -0,0 +1,218 @@
+# Imports
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import requests
+from langchain_mistralai import MistralAIEmbeddings
+
+from src.Sports import Sports
+from src.dedup import normalize_text, collapse_duplicate_documents
+from src.admission import SingleFlight, AdmissionController
+from src.context_compression import compress_context
+from src.league_classifier import classify_league
+from src.faiss_db import load_faiss_db, query_faiss_db, rerank_documents, get_season_change, query_rule_changes
+from src.inference import construct_prompt, invoke_llm, stream_llm, context_required
+from src.retrieval_service import ShardedRetriever
+from src.constants import MISTRAL_API_KEY, MISTRAL_ENDPOINT, RETRIEVAL_SERVICE_ENDPOINTS, RETRIEVAL_DISCOVERY_RETRY_SECONDS
+from src.constants import MAX_LOADED_INDEXES
+
+# Shared by every session in the process so identical questions and stage limits are seen across users
+single_flight = SingleFlight()
+admission = AdmissionController()
+
+# Loaded indexes are kept instead of being reloaded on every turn, up to MAX_LOADED_INDEXES
+_dbs = OrderedDict()
+_dbs_loading = {}  # (sport, season) -> Future of the load in progress
+_dbs_lock = threading.Lock()
+
+# Indexes preloaded for the life of the process, e.g. before forking workers, are never dropped
+_pinned_dbs = {}
+
+def pin_db(sport: Sports, season: str = None):
+    season = season or sport.value.current_season
+    _pinned_dbs[(sport, season)] = load_faiss_db(sport=sport, season=season)
+
+
+def get_db(sport: Sports, season: str = None):
+    season = season or sport.value.current_season
+    key = (sport, season)
+    if key in _pinned_dbs:
+        return _pinned_dbs[key]
+    with _dbs_lock:
+        if key in _dbs:
+            _dbs.move_to_end(key)
+            return _dbs[key]
+        future = _dbs_loading.get(key)
+        is_loader = future is None
+        if is_loader:
+            future = _dbs_loading[key] = Future()
+    if not is_loader:
+        return future.result()
+
+    # Load outside the lock so warming up one league doesn't block questions about another,
+    # while a question about the league being warmed up waits for that load instead of starting its own
+    try:
+        db = load_faiss_db(sport=sport, season=season)
+    except Exception as e:
+        with _dbs_lock:
+            _dbs_loading.pop(key, None)
+        future.set_exception(e)
+        raise
+    with _dbs_lock:
+        _dbs[key] = db
+        while len(_dbs) > MAX_LOADED_INDEXES:
+            _dbs.popitem(last=False)
+        _dbs_loading.pop(key, None)
+    future.set_result(db)
+    return db
+
+
+def is_db_loaded(sport: Sports, season: str = None):
+    season = season or sport.value.current_season
+    with _dbs_lock:
+        return (sport, season) in _pinned_dbs or (sport, season) in _dbs
+
+
+# Client for the retrieval service, and when it last could not be reached
+_retriever = None
+_retriever_failed_at = None
+_retriever_lock = threading.Lock()
+
+def get_retriever():
+    """
+    Returns the retrieval service client when the service is configured and reachable, otherwise None so the caller
+    searches in process. An unreachable service is asked again after RETRIEVAL_DISCOVERY_RETRY_SECONDS.
+    """
+    global _retriever, _retriever_failed_at
+    if not RETRIEVAL_SERVICE_ENDPOINTS:
+        return None
+    with _retriever_lock:
+        if _retriever is None and (_retriever_failed_at is None or time.monotonic() - _retriever_failed_at > RETRIEVAL_DISCOVERY_RETRY_SECONDS):
+            try:
+                _retriever = ShardedRetriever(RETRIEVAL_SERVICE_ENDPOINTS)
+            except requests.RequestException as e:
+                print(f'Retrieval service unavailable, searching locally: {e}')
+                _retriever_failed_at = time.monotonic()
+        return _retriever
+
+
+def search_index(shards: list, question: str, query_embedding: list = None, k: int = 15):
+    """
+    Searches the index of every (sport, season) in shards and returns the k closest chunks across all of them
+    """
+    retriever = get_retriever()
+    if query_embedding is None and (retriever is not None or len(shards) > 1):
+        query_embedding = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY, endpoint=MISTRAL_ENDPOINT).embed_query(question)
+
+    if retriever is not None:
+        try:
+            docs, missing = retriever.search([(sport.name, season or sport.value.current_season) for sport, season in shards], query_embedding, k=k)
+            if not missing:
+                return docs
+        except requests.RequestException as e:
+            print(f'Retrieval service search failed: {e}')
+        # A shard did not answer in time or the service failed, search locally rather than answer without context
+
+    if query_embedding is None:
+        sport, season = shards[0]
+        return query_faiss_db(get_db(sport, season=season), query=question, k=k)
+    # Every index holds the same embeddings so their distances can be compared directly
+    results = []
+    for sport, season in shards:
+        results.extend(get_db(sport, season=season).similarity_search_with_score_by_vector(query_embedding, k=k))
+    results.sort(key=lambda result: result[1])
+    return [doc for doc, _ in results[:k]]
+
+
+def retrieve_context(shards: list, question: str, query_embedding: list = None):
+    # Questions about what changed between seasons search the precomputed diff index of the first league instead.
+    # Each change is already a short passage, and compressing it could drop the header naming its league and seasons.
+    sport = shards[0][0]
+    season_change = get_season_change(sport=sport, query=question)
+    if season_change is not None:
+        with admission.admit('retrieval'):
+            return query_rule_changes(sport, from_season=season_change[0], to_season=season_change[1], query=question)
+
+    with admission.admit('retrieval'):
+        docs = search_index(shards, question, query_embedding=query_embedding)
+    with admission.admit('rerank'):
+        context_list = rerank_documents(collapse_duplicate_documents(docs), query=question)
+
+    # Only keep the sentences that answer the question
+    with admission.admit('compression'):
+        return compress_context(context_list, query=question)
+
+
+def build_prompt(sport: Sports, question: str, season: str = None, query_embedding: list = None, router_history: list = None,
+                 answer_history: list = None, detect_league: bool = False):
+    """
+    Runs the router and, if it asks for context, retrieval and reranking. Returns the prompt for the answer and the
+    leagues whose rulebooks were searched, most likely first (empty if the router did not ask for context).
+    With detect_league the selected sport is only a prior: the keywords pick the league for the router, and the
+    centroids (and so an embedding call) are only used once the router asks for context.
+    """
+    selected = sport
+    if detect_league:
+        sport = classify_league(question, prior=selected, use_centroids=False)[0][0][0]
+    with admission.admit('router'):
+        needs_context = context_required(sport=sport, query=question, chat_history=router_history or [])
+    if not needs_context:
+        return construct_prompt(sport=sport, query=question, context_list=None, chat_history=answer_history or []), []
+
+    # Search every league the classifier is confident enough about, the selected season only applies to the selected league
+    sports = [sport]
+    if detect_league:
+        ranked, query_embedding = classify_league(question, prior=selected, query_embedding=query_embedding)
+        sports = [league for league, _ in ranked]
+    shards = [(league, season if league == selected else None) for league in sports]
+    context_list = retrieve_context(shards, question, query_embedding=query_embedding)
+    return construct_prompt(sport=sports[0], query=question, context_list=context_list, chat_history=answer_history or []), sports
+
+
+def get_flight_key(sport: Sports, question: str, season: str, router_history: list, answer_history: list, stream: bool, detect_league: bool = False):
+    # Only questions asked without history can share an answer, anything else depends on the conversation
+    if router_history or answer_history:
+        return None
+    return (sport.name, season or sport.value.current_season, normalize_text(question), stream, detect_league)
+
+
+def answer_question(sport: Sports, question: str, season: str = None, query_embedding: list = None, router_history: list = None,
+                    answer_history: list = None, detect_league: bool = False):
+    """
+    Answers a question end to end, returning (answer, prompt, leagues searched). Identical in-flight questions without
+    history share one execution. Raises OverloadedError if a stage is at capacity.
+    """
+    def run():
+        prompt, leagues = build_prompt(sport, question, season, query_embedding, router_history, answer_history, detect_league)
+        with admission.admit('generation'):
+            return invoke_llm(prompt=prompt), prompt, leagues
+
+    key = get_flight_key(sport, question, season, router_history, answer_history, stream=False, detect_league=detect_league)
+    if key is None:
+        return run()
+    return single_flight.do(key, run)
+
+
+def stream_answer(sport: Sports, question: str, season: str = None, query_embedding: list = None, router_history: list = None,
+                  answer_history: list = None, detect_league: bool = False):
+    """
+    Streams the answer to a question. The first item is (prompt, leagues searched), once the prompt is built, and the rest
+    are the text tokens. Identical in-flight questions without history share one upstream stream and every caller
+    receives all of it. The answer is generated on a background thread, so the generation slot is released as soon as
+    the model finishes, not when the caller finishes reading. Raises OverloadedError if a stage is at capacity.
+    """
+    def run():
+        prompt, leagues = build_prompt(sport, question, season, query_embedding, router_history, answer_history, detect_league)
+        yield prompt, leagues
+        with admission.admit('generation'):
+            for chunk in stream_llm(prompt=prompt):
+                yield chunk.content
+
+    key = get_flight_key(sport, question, season, router_history, answer_history, stream=True, detect_league=detect_league)
+    return single_flight.stream(key, run)
+
+
+def get_pipeline_metrics():
+    return {'admission': admission.get_metrics(), 'coalescing': single_flight.get_metrics()}
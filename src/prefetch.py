@@ -0,0 +1,100 @@
+# Imports
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_mistralai import MistralAIEmbeddings
+
+from src.Sports import Sports
+from src.dedup import normalize_text
+from src.faiss_db import load_ranker
+from src.pipeline import get_db, is_db_loaded
+from src.constants import (MISTRAL_API_KEY, MISTRAL_ENDPOINT, PREFETCH_ENABLED, PREFETCH_WORKERS, PREFETCH_MAX_EMBEDDINGS,
+                           PREFETCH_RETRY_SECONDS, STARTER_QUESTIONS)
+
+
+class Prefetcher():
+    """
+    Warms up a league in the background as soon as it is selected: loads its index and the reranker and
+    embeds its starter questions. Shared by every session, so each league is only warmed once at a time.
+    """
+
+    def __init__(self, enabled: bool = PREFETCH_ENABLED, max_workers: int = PREFETCH_WORKERS, max_embeddings: int = PREFETCH_MAX_EMBEDDINGS):
+        self.enabled = enabled
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+        self.in_flight = {}
+        self.failed_at = {}  # (sport, season) -> when its last warm up failed
+        self.max_embeddings = max_embeddings
+        self.embeddings = OrderedDict()  # (league, normalized question) -> query embedding
+        self.first_question_latency = {'prefetched': deque(maxlen=1000), 'cold': deque(maxlen=1000)}
+        self.lock = threading.RLock()
+
+    def prefetch(self, sport: Sports, season: str = None):
+        """
+        Starts warming up the league without waiting for it. Does nothing if it is already warm or warming,
+        or if warming it up failed less than PREFETCH_RETRY_SECONDS ago.
+        """
+        if not self.enabled:
+            return
+        key = (sport, season or sport.value.current_season)
+        with self.lock:
+            if key in self.in_flight and not self.in_flight[key].done():
+                return
+            if key in self.failed_at and time.monotonic() - self.failed_at[key] < PREFETCH_RETRY_SECONDS:
+                return
+            if is_db_loaded(*key) and self.has_starter_embeddings(sport):
+                return
+            self.in_flight[key] = self.executor.submit(self.warm_up, *key)
+
+    def warm_up(self, sport: Sports, season: str):
+        try:
+            get_db(sport, season=season)
+            load_ranker()
+            if not self.has_starter_embeddings(sport):
+                questions = STARTER_QUESTIONS.get(sport.name, [])
+                embedding_model = MistralAIEmbeddings(mistral_api_key=MISTRAL_API_KEY, endpoint=MISTRAL_ENDPOINT)
+                for question, embedding in zip(questions, embedding_model.embed_documents(questions)):
+                    self.add_embedding(sport, question, embedding)
+        except Exception as e:
+            print(f'Could not warm up {sport.value.league_name} {season}: {e}')
+            with self.lock:
+                self.failed_at[(sport, season)] = time.monotonic()
+            return
+        with self.lock:
+            self.failed_at.pop((sport, season), None)
+
+    def has_starter_embeddings(self, sport: Sports):
+        with self.lock:
+            return all((sport.name, normalize_text(q)) in self.embeddings for q in STARTER_QUESTIONS.get(sport.name, []))
+
+    def add_embedding(self, sport: Sports, question: str, embedding: list):
+        with self.lock:
+            self.embeddings[(sport.name, normalize_text(question))] = embedding
+            while len(self.embeddings) > self.max_embeddings:
+                self.embeddings.popitem(last=False)
+
+    def get_query_embedding(self, sport: Sports, question: str):
+        # Returns the pre-computed embedding if the question is one of the league's starter questions
+        key = (sport.name, normalize_text(question))
+        with self.lock:
+            if key in self.embeddings:
+                self.embeddings.move_to_end(key)
+                return self.embeddings[key]
+        return None
+
+    def is_warm(self, sport: Sports, season: str = None):
+        return is_db_loaded(sport, season) and self.has_starter_embeddings(sport)
+
+    def record_first_question(self, seconds: float, prefetched: bool):
+        with self.lock:
+            self.first_question_latency['prefetched' if prefetched else 'cold'].append(seconds)
+
+    def get_stats(self):
+        with self.lock:
+            stats = {'embeddings': len(self.embeddings)}
+            for state, latencies in self.first_question_latency.items():
+                stats[f'{state}_count'] = len(latencies)
+                stats[f'{state}_p50'] = float(np.percentile(latencies, 50)) if latencies else None
+            return stats
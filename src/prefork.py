@@ -0,0 +1,178 @@
+# Imports
+import os
+import gc
+import json
+import random
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import faiss
+import requests
+
+from src.Sports import Sports
+from src.admission import OverloadedError
+from src.faiss_db import load_ranker
+from src.pipeline import pin_db, answer_question
+from src.constants import (FAISS_DB_FOLDER, PREFORK_WORKERS, PREFORK_MAX_TASKS_PER_CHILD, PREFORK_TIMEOUT_SECONDS, RERANKER_BACKEND,
+                           RERANKER_INTRA_OP_THREADS, RERANKER_INTER_OP_THREADS)
+
+
+_preloaded = False
+
+def preload():
+    """
+    Loads every league's index and docstore (and the reranker when it is safe to fork) in this process,
+    then freezes them out of the garbage collector so forked workers keep sharing their pages.
+    The flashrank reranker and multi-threaded ONNX engines run their own thread pools, which do not survive
+    a fork, so those are loaded separately in every worker by init_worker.
+    """
+    global _preloaded
+    if _preloaded:
+        return
+
+    # The tokenizers thread pool does not survive a fork
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+    for sport in Sports:
+        if not os.path.exists(os.path.join(FAISS_DB_FOLDER, sport.value.index_name, 'index.faiss')):
+            print(f'Not preloading {sport.value.league_name}, its index has not been built')
+            continue
+        pin_db(sport)
+
+    # An ONNX Runtime session with its own thread pool would hang in the children, so only share single threaded engines
+    if RERANKER_BACKEND == 'onnx' and RERANKER_INTRA_OP_THREADS == 1 and RERANKER_INTER_OP_THREADS == 1:
+        load_ranker()
+
+    gc.collect()
+    gc.freeze()
+    _preloaded = True
+
+
+def init_worker():
+    # Each worker is one core, so keep FAISS single threaded, and load the reranker here if the parent couldn't
+    faiss.omp_set_num_threads(1)
+    random.seed()
+    load_ranker()
+
+
+def answer_turn(request: dict):
+    answer, prompt, leagues = answer_question(Sports[request['league']], request['question'], season=request.get('season'),
+                                              query_embedding=request.get('query_embedding'), router_history=request.get('router_history'),
+                                              answer_history=request.get('answer_history'), detect_league=request.get('detect_league', False))
+    return {'answer': answer, 'prompt': prompt, 'leagues': [league.name for league in leagues], 'pid': os.getpid()}
+
+
+def read_memory(pid: int):
+    # Resident memory of a process, split into pages shared with the parent and pages it owns
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {'pid': pid, 'rss_mb': fields.get('Rss', 0.0), 'pss_mb': fields.get('Pss', 0.0),
+            'shared_mb': fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0),
+            'private_mb': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0)}
+
+
+class PreforkServer():
+    """
+    Preloads the indexes and reranker once, then forks a pool of workers that answer turns using the shared
+    copy-on-write pages. Workers are replaced after max_tasks_per_child turns to bound any growth in their memory.
+
+    The workers are forked by a fork server rather than by this process: the pool and the HTTP front end run
+    threads here, and a replacement worker forked from a threaded process can inherit a lock held by another thread.
+    The fork server stays single threaded and preloads everything once (see src/prefork_preload.py).
+    """
+
+    def __init__(self, num_workers: int = PREFORK_WORKERS, max_tasks_per_child: int = PREFORK_MAX_TASKS_PER_CHILD, timeout: float = PREFORK_TIMEOUT_SECONDS):
+        self.num_workers = num_workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.timeout = timeout
+        self.pool = None
+
+    def start(self):
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['src.prefork_preload'])
+        self.pool = context.Pool(self.num_workers, initializer=init_worker, maxtasksperchild=self.max_tasks_per_child)
+
+    def answer(self, request: dict):
+        try:
+            return self.pool.apply_async(answer_turn, (request,)).get(timeout=self.timeout)
+        except multiprocessing.TimeoutError:
+            raise OverloadedError('No worker answered in time, please try again shortly')
+
+    def get_worker_memory(self):
+        # The workers are children of the fork server, so they are looked up through the pool
+        memory = []
+        for worker in list(self.pool._pool):
+            try:
+                memory.append(read_memory(worker.pid))
+            except FileNotFoundError:
+                pass  # Replaced since the list was taken
+        return memory
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+class PreforkHandler(BaseHTTPRequestHandler):
+    """
+    Front end for the worker pool: POST /answer runs a turn on a worker, GET /workers reports their memory
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path != '/workers':
+            return self.send_json(404, {'error': 'not found'})
+        self.send_json(200, {'workers': self.server.prefork.get_worker_memory(), 'parent': read_memory(os.getpid())})
+
+    def do_POST(self):
+        if self.path != '/answer':
+            return self.send_json(404, {'error': 'not found'})
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        try:
+            self.send_json(200, self.server.prefork.answer(request))
+        except OverloadedError as e:
+            self.send_json(503, {'error': str(e)})
+
+
+def serve(port: int, prefork: PreforkServer):
+    prefork.start()
+    server = ThreadingHTTPServer(('127.0.0.1', port), PreforkHandler)
+    server.prefork = prefork
+    server.serve_forever()
+
+
+def answer_remote(endpoint: str, sport: Sports, question: str, season: str = None, query_embedding: list = None,
+                  router_history: list = None, answer_history: list = None, detect_league: bool = False):
+    """
+    Same as answer_question, but runs the turn on a pre-fork server's workers. Returns (answer, prompt, leagues searched).
+    If the server cannot be reached the turn is answered in this process instead, if it is too slow OverloadedError is raised.
+    """
+    request = {'league': sport.name, 'question': question, 'season': season, 'router_history': router_history, 'answer_history': answer_history,
+               'detect_league': detect_league, 'query_embedding': [float(v) for v in query_embedding] if query_embedding is not None else None}
+    try:
+        response = requests.post(f'{endpoint}/answer', json=request, timeout=PREFORK_TIMEOUT_SECONDS)
+    except requests.ConnectionError as e:
+        print(f'Pre-fork server unavailable, answering locally: {e}')
+        return answer_question(sport, question, season=season, query_embedding=query_embedding, router_history=router_history,
+                               answer_history=answer_history, detect_league=detect_league)
+    except requests.Timeout:
+        raise OverloadedError('No worker answered in time, please try again shortly')
+    if response.status_code == 503:
+        raise OverloadedError(response.json()['error'])
+    response.raise_for_status()
+    body = response.json()
+    return body['answer'], body['prompt'], [Sports[league] for league in body['leagues']]
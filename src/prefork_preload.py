@@ -0,0 +1,4 @@
+# Imported by the pre-fork server's fork server before it forks any worker, so every worker shares what it loads
+from src.prefork import preload
+
+preload()
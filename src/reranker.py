@@ -0,0 +1,157 @@
+# Imports
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from src.constants import (MODEL_FOLDER, RERANKER_PRECISION, RERANKER_HF_MODEL, RERANKER_INTRA_OP_THREADS, RERANKER_INTER_OP_THREADS,
+                           RERANKER_MAX_TOKENS, RERANKER_CACHE_TTL_SECONDS, RERANKER_CACHE_SIZE, RERANKER_BATCH_PAIRS)
+
+RERANKER_FOLDER = os.path.join(MODEL_FOLDER, 'ms-marco-MiniLM-L-12-v2')
+
+
+def get_onnx_model_path(precision: str):
+    return os.path.join(RERANKER_FOLDER, 'model.onnx' if precision == 'fp32' else f'model_{precision}.onnx')
+
+
+def export_onnx_models():
+    """
+    Exports the cross-encoder to ONNX next to its tokenizer, plus an int8 dynamically quantized copy
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    model = AutoModelForSequenceClassification.from_pretrained(RERANKER_HF_MODEL).eval()
+    tokenizer = AutoTokenizer.from_pretrained(RERANKER_FOLDER)
+    sample = tokenizer(['query'], ['passage'], return_tensors='pt')
+    input_names = ['input_ids', 'attention_mask', 'token_type_ids']
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[name] for name in input_names), get_onnx_model_path('fp32'),
+                          input_names=input_names, output_names=['logits'], opset_version=14,
+                          dynamic_axes={**{name: {0: 'batch', 1: 'sequence'} for name in input_names}, 'logits': {0: 'batch'}})
+    quantize_dynamic(get_onnx_model_path('fp32'), get_onnx_model_path('int8'), weight_type=QuantType.QInt8)
+
+
+def load_tokenizer(max_tokens: int = RERANKER_MAX_TOKENS):
+    """
+    Loads the cross-encoder's tokenizer, padding batches and cutting each pair to max_tokens. Tokens are cut from
+    whichever of the query and passage is longer, so a query longer than max_tokens still fits.
+    """
+    from tokenizers import Tokenizer
+
+    tokenizer = Tokenizer.from_file(os.path.join(RERANKER_FOLDER, 'tokenizer.json'))
+    tokenizer.enable_truncation(max_length=max_tokens, strategy='longest_first')
+    tokenizer.enable_padding(pad_id=tokenizer.token_to_id('[PAD]'), pad_token='[PAD]')
+    return tokenizer
+
+
+def score_pairs(ranker, pairs: list, batch_size: int = RERANKER_BATCH_PAIRS):
+    """
+    Relevance in [0, 1] of each (query, text) pair, running the cross-encoder on batch_size pairs per call.
+    Works with flashrank's Ranker as well as RerankerEngine, since both hold an ONNX session and its tokenizer.
+    """
+    input_names = [model_input.name for model_input in ranker.session.get_inputs()]
+    scores = []
+    for start in range(0, len(pairs), batch_size):
+        encodings = ranker.tokenizer.encode_batch([tuple(pair) for pair in pairs[start:start + batch_size]])
+        inputs = {'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+                  'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                  'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64)}
+        logits = ranker.session.run(None, {name: inputs[name] for name in input_names})[0]
+        # The relevant class is the last logit, whether the model has one output or two
+        scores.extend((1 / (1 + np.exp(-logits[:, -1]))).tolist())
+    return scores
+
+
+class ScoreCache():
+    """
+    Keeps scores for a short time so the same chunks reranked for the same query aren't run through the model again
+    """
+
+    def __init__(self, ttl: float = RERANKER_CACHE_TTL_SECONDS, max_size: int = RERANKER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.scores = OrderedDict()  # key -> (expiry, score)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.scores.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, score: float):
+        with self.lock:
+            self.scores[key] = (time.monotonic() + self.ttl, score)
+            self.scores.move_to_end(key)
+            while len(self.scores) > self.max_size:
+                self.scores.popitem(last=False)
+
+
+class RerankerEngine():
+    """
+    Cross-encoder reranker on ONNX Runtime with a chosen precision, pinned thread counts, pair truncation
+    and a short lived score cache. rerank() takes the same request as flashrank's Ranker so it can replace it.
+    """
+
+    def __init__(self, precision: str = RERANKER_PRECISION, intra_op_threads: int = RERANKER_INTRA_OP_THREADS,
+                 inter_op_threads: int = RERANKER_INTER_OP_THREADS, max_tokens: int = RERANKER_MAX_TOKENS, cache: ScoreCache = None):
+        if not os.path.exists(get_onnx_model_path(precision)):
+            raise FileNotFoundError(f'No {precision} reranker model, run scripts/export_reranker.py first')
+        # Only needed when this engine is used, so the flashrank backend doesn't load it
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL if inter_op_threads == 1 else ort.ExecutionMode.ORT_PARALLEL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(get_onnx_model_path(precision), sess_options=options, providers=['CPUExecutionProvider'])
+
+        self.tokenizer = load_tokenizer(max_tokens)
+        self.cache = cache if cache is not None else ScoreCache()
+
+    def predict(self, query: str, texts: list):
+        # Relevance in [0, 1] of each text to the query
+        return score_pairs(self, [(query, text) for text in texts])
+
+    def score_batch(self, requests: list):
+        """
+        Scores the passages ({'id', 'text', 'meta'}) of many (query, passages) requests, running the model once over
+        every pair that is not cached. Chunks are identified by their chunk hash when they have one, otherwise by their text.
+        """
+        pairs, keys = [], []
+        for query, passages in requests:
+            for passage in passages:
+                pairs.append((query, passage['text']))
+                keys.append((query, passage.get('meta', {}).get('chunk_hash') or hashlib.sha256(passage['text'].encode()).hexdigest()))
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            for i, score in zip(missing, score_pairs(self, [pairs[i] for i in missing])):
+                scores[i] = score
+                self.cache.put(keys[i], score)
+
+        # Split the flat scores back into one list per request
+        results, start = [], 0
+        for _, passages in requests:
+            results.append(scores[start:start + len(passages)])
+            start += len(passages)
+        return results
+
+    def score(self, query: str, passages: list):
+        return self.score_batch([(query, passages)])[0]
+
+    def rerank(self, request):
+        scores = self.score(request.query, request.passages)
+        results = [{**passage, 'score': score} for passage, score in zip(request.passages, scores)]
+        return sorted(results, key=lambda result: result['score'], reverse=True)
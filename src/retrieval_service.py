@@ -0,0 +1,201 @@
+# Imports
+import os
+import json
+import resource
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_core.documents import Document
+
+from src.Sports import Sports
+from src.faiss_db import load_faiss_db
+from src.constants import (FAISS_DB_FOLDER, RETRIEVAL_WORKERS, RETRIEVAL_BASE_PORT, RETRIEVAL_MAX_LOADED_SHARDS,
+                           RETRIEVAL_SHARD_TIMEOUT_SECONDS)
+
+
+def list_shards():
+    # Every (league, season) index that has been built
+    shards = []
+    for sport in Sports:
+        for season in sport.value.get_seasons():
+            if os.path.exists(os.path.join(FAISS_DB_FOLDER, sport.value.for_season(season).index_name, 'index.faiss')):
+                shards.append((sport.name, season))
+    return shards
+
+
+def get_shard_bytes(shard: tuple):
+    league, season = shard
+    return os.path.getsize(os.path.join(FAISS_DB_FOLDER, Sports[league].value.for_season(season).index_name, 'index.faiss'))
+
+
+def assign_shards(shards: list, num_workers: int):
+    """
+    Spreads the shards over the workers so each holds roughly the same number of index bytes, biggest shards first
+    """
+    assignments = [[] for _ in range(num_workers)]
+    loads = [0] * num_workers
+    for shard in sorted(shards, key=get_shard_bytes, reverse=True):
+        worker = loads.index(min(loads))
+        assignments[worker].append(shard)
+        loads[worker] += get_shard_bytes(shard)
+    return assignments
+
+
+class ShardCache():
+    """
+    Keeps at most max_loaded of a worker's assigned indexes in memory, dropping the least recently used
+    """
+
+    def __init__(self, shards: list, max_loaded: int = RETRIEVAL_MAX_LOADED_SHARDS):
+        self.shards = set(shards)
+        self.max_loaded = max_loaded
+        self.loaded = OrderedDict()
+        self.loading = {}  # shard -> Future of the load in progress
+        self.lock = threading.Lock()
+
+    def get(self, shard: tuple):
+        with self.lock:
+            if shard in self.loaded:
+                self.loaded.move_to_end(shard)
+                return self.loaded[shard]
+            future = self.loading.get(shard)
+            is_loader = future is None
+            if is_loader:
+                future = self.loading[shard] = Future()
+        if not is_loader:
+            return future.result()
+
+        # Load outside the lock so searches of loaded shards aren't held up, concurrent requests for this shard wait on the future
+        try:
+            db = load_faiss_db(Sports[shard[0]], season=shard[1])
+        except Exception as e:
+            with self.lock:
+                self.loading.pop(shard, None)
+            future.set_exception(e)
+            raise
+        with self.lock:
+            self.loaded[shard] = db
+            while len(self.loaded) > self.max_loaded:
+                self.loaded.popitem(last=False)
+            self.loading.pop(shard, None)
+        future.set_result(db)
+        return db
+
+
+class ShardHandler(BaseHTTPRequestHandler):
+    """
+    Serves GET /shards and POST /search for the shards assigned to this worker
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path != '/shards':
+            return self.send_json(404, {'error': 'not found'})
+        cache = self.server.shard_cache
+        with cache.lock:
+            loaded = [list(shard) for shard in cache.loaded]
+        self.send_json(200, {'shards': [list(shard) for shard in cache.shards], 'loaded': loaded,
+                             'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+
+    def do_POST(self):
+        if self.path != '/search':
+            return self.send_json(404, {'error': 'not found'})
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        shard = (body['league'], body['season'])
+        if shard not in self.server.shard_cache.shards:
+            return self.send_json(404, {'error': f'shard {shard} is not served here'})
+        db = self.server.shard_cache.get(shard)
+        results = db.similarity_search_with_score_by_vector(body['embedding'], k=body['k'])
+        self.send_json(200, {'results': [{'page_content': doc.page_content, 'metadata': doc.metadata, 'score': float(score)}
+                                         for doc, score in results]})
+
+
+def run_shard_worker(port: int, shards: list, max_loaded: int = RETRIEVAL_MAX_LOADED_SHARDS):
+    server = ThreadingHTTPServer(('127.0.0.1', port), ShardHandler)
+    server.shard_cache = ShardCache([tuple(shard) for shard in shards], max_loaded=max_loaded)
+    server.serve_forever()
+
+
+def start_retrieval_service(num_workers: int = RETRIEVAL_WORKERS, base_port: int = RETRIEVAL_BASE_PORT, shards: list = None):
+    """
+    Starts one process per worker, each serving its share of the shards. Returns (processes, endpoints).
+    Workers are spawned rather than forked so none of them inherits indexes loaded by the parent.
+    """
+    assignments = assign_shards(shards if shards is not None else list_shards(), num_workers)
+    context = multiprocessing.get_context('spawn')
+    processes, endpoints = [], []
+    for i, worker_shards in enumerate(assignments):
+        process = context.Process(target=run_shard_worker, args=(base_port + i, worker_shards), daemon=True)
+        process.start()
+        processes.append(process)
+        endpoints.append(f'http://127.0.0.1:{base_port + i}')
+    return processes, endpoints
+
+
+class ShardedRetriever():
+    """
+    Client for the retrieval service: sends a query to every relevant shard in parallel and merges the top k.
+    Shards that fail or miss the timeout are reported as missing instead of failing the whole search.
+    """
+
+    def __init__(self, endpoints: list, timeout: float = RETRIEVAL_SHARD_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(endpoints), pool_maxsize=4 * len(endpoints))
+        self.session.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=4 * len(endpoints))
+
+        # Ask each worker which shards it serves
+        self.shard_endpoints = {}
+        for endpoint in endpoints:
+            response = self.session.get(f'{endpoint}/shards', timeout=timeout)
+            response.raise_for_status()
+            for league, season in response.json()['shards']:
+                self.shard_endpoints[(league, season)] = endpoint
+
+    def search_shard(self, shard: tuple, query_embedding: list, k: int):
+        response = self.session.post(f'{self.shard_endpoints[shard]}/search', timeout=self.timeout,
+                                     json={'league': shard[0], 'season': shard[1], 'embedding': list(query_embedding), 'k': k})
+        response.raise_for_status()
+        return response.json()['results']
+
+    def search(self, shards: list, query_embedding: list, k: int = 15):
+        """
+        Returns (documents, missing shards), the documents ordered by distance across all shards that answered
+        """
+        missing = [shard for shard in shards if shard not in self.shard_endpoints]
+        futures = {self.executor.submit(self.search_shard, shard, query_embedding, k): shard
+                   for shard in shards if shard in self.shard_endpoints}
+        done, not_done = wait(futures, timeout=self.timeout)
+        missing.extend(futures[future] for future in not_done)
+
+        results = []
+        for future in done:
+            if future.exception() is not None:
+                missing.append(futures[future])
+            else:
+                results.extend(future.result())
+        results.sort(key=lambda result: result['score'])
+        return [Document(page_content=r['page_content'], metadata=r['metadata']) for r in results[:k]], missing
+
+    def get_worker_stats(self):
+        stats = {}
+        for endpoint in set(self.shard_endpoints.values()):
+            stats[endpoint] = self.session.get(f'{endpoint}/shards', timeout=self.timeout).json()
+        return stats
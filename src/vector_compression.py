@@ -0,0 +1,131 @@
+# Imports
+import os
+import pickle
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from src.constants import RESCORE_FACTOR, PQ_SUBQUANTIZERS
+
+COMPRESSION_METHODS = ['fp16', 'sq8', 'pq']
+
+
+def get_compressed_index_path(index_folder: str, method: str):
+    return os.path.join(index_folder, f'index_{method}.faiss')
+
+
+def get_float_store_path(index_folder: str):
+    return os.path.join(index_folder, 'vectors.f32')
+
+
+def create_compressed_index(vectors, method: str):
+    """
+    Creates and trains a compressed FAISS index over the given float32 vectors
+    """
+    dimension = vectors.shape[1]
+    if method == 'fp16':
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    elif method == 'sq8':
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    elif method == 'pq':
+        # Small rulebooks have fewer vectors than the 256 centroids of 8 bit codes, so use fewer bits for them
+        nbits = max(1, min(8, int(np.log2(len(vectors)))))
+        index = faiss.IndexPQ(dimension, PQ_SUBQUANTIZERS, nbits, faiss.METRIC_L2)
+    else:
+        raise ValueError('Compression method not supported')
+
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def compress_index(index_folder: str, method: str):
+    """
+    Writes a compressed copy of a saved FAISS index plus a float32 store of the original vectors for re-scoring
+    """
+    index = faiss.read_index(os.path.join(index_folder, 'index.faiss'))
+    vectors = index.reconstruct_n(0, index.ntotal)
+
+    # The float store is memory mapped at query time, so only the re-scored rows are ever paged in
+    float_store = np.memmap(get_float_store_path(index_folder), dtype=np.float32, mode='w+', shape=vectors.shape)
+    float_store[:] = vectors
+    float_store.flush()
+
+    faiss.write_index(create_compressed_index(vectors, method), get_compressed_index_path(index_folder, method))
+
+
+class RescoredFAISS(FAISS):
+    """
+    FAISS vectorstore that searches a compressed index and re-scores the top candidates with the exact float vectors
+    """
+
+    def __init__(self, *args, float_store=None, rescore_factor: int = RESCORE_FACTOR, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.float_store = float_store
+        self.rescore_factor = rescore_factor
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, filter=None, fetch_k: int = 20, **kwargs):
+        if filter is not None:
+            raise ValueError('Filtering is not supported on compressed indexes')
+
+        # Over-fetch from the compressed index, then rank the candidates by their exact distance
+        vector = np.array([embedding], dtype=np.float32)
+        _, indices = self.index.search(vector, k * self.rescore_factor)
+        candidates = [i for i in indices[0] if i != -1]
+        distances = ((self.float_store[candidates] - vector) ** 2).sum(axis=1)
+
+        docs = []
+        for position in np.argsort(distances)[:k]:
+            doc = self.docstore.search(self.index_to_docstore_id[candidates[position]])
+            docs.append((doc, float(distances[position])))
+        return docs
+
+
+def load_compressed_db(index_folder: str, embedding_model, method: str):
+    # index.pkl holds the docstore and the mapping from FAISS ids to docstore ids
+    with open(os.path.join(index_folder, 'index.pkl'), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    index = faiss.read_index(get_compressed_index_path(index_folder, method))
+    float_store = np.memmap(get_float_store_path(index_folder), dtype=np.float32, mode='r').reshape(index.ntotal, index.d)
+    return RescoredFAISS(embedding_model, index, docstore, index_to_docstore_id, float_store=float_store)
+
+
+def get_index_bytes(index):
+    return faiss.serialize_index(index).nbytes
+
+
+def compare_compression(index_folder: str, num_queries: int = 100, k: int = 3, noise: float = 0.01, seed: int = 0):
+    """
+    Compares the memory used and recall@k of each compression method against the exact float32 index.
+    Queries are perturbed copies of the stored vectors so no embedding calls are needed.
+    """
+    index = faiss.read_index(os.path.join(index_folder, 'index.faiss'))
+    vectors = index.reconstruct_n(0, index.ntotal)
+    float_store = vectors  # In memory here, the served index memory maps it instead
+
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+    queries = vectors[rows] + rng.normal(scale=noise, size=(len(rows), vectors.shape[1])).astype(np.float32)
+    _, exact = index.search(queries, k)
+
+    results = [{'method': 'float32', 'bytes': get_index_bytes(index), 'recall': 1.0, 'rescored_recall': 1.0}]
+    for method in COMPRESSION_METHODS:
+        compressed = create_compressed_index(vectors, method)
+
+        # Recall of the compressed index on its own
+        _, approx = compressed.search(queries, k)
+        recall = np.mean([len(set(a) & set(e)) / k for a, e in zip(approx, exact)])
+
+        # Recall after re-scoring the over-fetched candidates with the exact vectors
+        _, candidates = compressed.search(queries, k * RESCORE_FACTOR)
+        rescored = []
+        for query, row in zip(queries, candidates):
+            row = row[row != -1]
+            distances = ((float_store[row] - query) ** 2).sum(axis=1)
+            rescored.append(row[np.argsort(distances)[:k]])
+        rescored_recall = np.mean([len(set(r) & set(e)) / k for r, e in zip(rescored, exact)])
+
+        results.append({'method': method, 'bytes': get_index_bytes(compressed), 'recall': float(recall), 'rescored_recall': float(rescored_recall)})
+    return results
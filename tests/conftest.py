@@ -0,0 +1,4 @@
+import os
+
+# src.constants reads the API key at import time, the tests never call the API
+os.environ.setdefault('MISTRAL_API_KEY', 'test')
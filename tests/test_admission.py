@@ -0,0 +1,93 @@
+import time
+import threading
+
+import pytest
+
+from src.admission import SingleFlight, AdmissionController, OverloadedError
+
+
+def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'Timed out waiting for the condition'
+        time.sleep(0.01)
+
+
+def test_identical_requests_share_one_execution():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        yield 'a'
+        release.wait(2)
+        yield 'b'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(list(single_flight.stream('key', work)))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: single_flight.get_metrics()['coalesced'] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+
+    assert results == [['a', 'b']] * 3
+    assert len(calls) == 1
+    assert single_flight.get_metrics()['in_flight'] == 0
+
+
+def test_stalled_execution_is_abandoned_and_the_key_freed():
+    single_flight = SingleFlight(timeout=0.2)
+    stall = threading.Event()
+
+    def stalled():
+        stall.wait(5)
+        yield 'late'
+
+    with pytest.raises(OverloadedError):
+        list(single_flight.stream('key', stalled))
+    assert single_flight.get_metrics()['in_flight'] == 0
+
+    # The next identical request runs again instead of waiting on the stalled one
+    assert list(single_flight.stream('key', lambda: iter(['fresh']))) == ['fresh']
+    # The stalled execution finishing later does not evict the newer one's key or reach its callers
+    stall.set()
+    assert single_flight.get_metrics()['executions'] == 2
+
+
+def test_failed_execution_is_not_shared_with_later_requests():
+    single_flight = SingleFlight()
+
+    def failing():
+        raise ValueError('upstream failed')
+
+    with pytest.raises(ValueError):
+        single_flight.do('key', failing)
+    assert single_flight.do('key', lambda: 'answer') == 'answer'
+    assert single_flight.get_metrics()['executions'] == 2
+
+
+def test_slot_is_released_when_generation_ends_not_when_reading_ends():
+    single_flight = SingleFlight()
+    admission = AdmissionController(limits={'generation': 1}, max_queue=1, timeout=0.1)
+
+    def generate():
+        with admission.admit('generation'):
+            yield from ['a', 'b', 'c']
+
+    # The caller reads one token and stops, yet the slot is free for the next request
+    stream = single_flight.stream(None, generate)
+    assert next(stream) == 'a'
+    wait_for(lambda: admission.get_metrics()['generation']['active'] == 0)
+    assert list(single_flight.stream(None, generate)) == ['a', 'b', 'c']
+
+
+def test_busy_stage_sheds_requests():
+    admission = AdmissionController(limits={'rerank': 1}, max_queue=1, timeout=0.1)
+    with admission.admit('rerank'):
+        with pytest.raises(OverloadedError):
+            with admission.admit('rerank'):
+                pass
+    assert admission.get_metrics()['rerank']['timed_out'] == 1
@@ -0,0 +1,37 @@
+from langchain_core.documents import Document
+
+from src import pipeline
+from src.Sports import Sports
+from src.context_compression import compress_context, count_tokens
+
+CHUNKS = [
+    Document(page_content='Icing is called when a player shoots the puck across both the red line and the goal line. '
+                          'The linesman then stops play. Play resumes with a faceoff in the offending team\'s zone.',
+             metadata={'league': 'NHL', 'page': 1}),
+    Document(page_content='Each team has five skaters and a goaltender. Icing is waved off when the team is shorthanded.',
+             metadata={'league': 'NHL', 'page': 2}),
+]
+
+
+def test_lexical_compression_keeps_the_answering_sentence_within_budget():
+    compressed = compress_context(CHUNKS, query='when is icing waved off', token_budget=15, method='lexical')
+
+    text = ' '.join(doc.page_content for doc in compressed)
+    assert 'Icing is waved off when the team is shorthanded.' in text
+    assert 'five skaters' not in text
+    assert sum(count_tokens(doc.page_content) for doc in compressed) <= 15
+    # The metadata of each chunk stays with the sentences kept from it
+    assert all(doc.metadata['league'] == 'NHL' for doc in compressed)
+
+
+def test_compression_off_returns_the_chunks_unchanged():
+    assert compress_context(CHUNKS, query='icing', method='none') == CHUNKS
+
+
+def test_season_change_context_is_not_compressed(monkeypatch):
+    changes = [Document(page_content='[NHL 2023 -> 2024] Icing is waved off on a penalty kill.')]
+    monkeypatch.setattr(pipeline, 'get_season_change', lambda sport, query: ('2023', '2024'))
+    monkeypatch.setattr(pipeline, 'query_rule_changes', lambda sport, from_season, to_season, query: changes)
+    monkeypatch.setattr(pipeline, 'compress_context', lambda *args, **kwargs: [])
+
+    assert pipeline.retrieve_context([(Sports.NHL, None)], 'What changed about icing from 2023 to 2024?') == changes
@@ -0,0 +1,40 @@
+from langchain_core.documents import Document
+
+from src.dedup import ChunkDeduplicator, collapse_duplicate_documents
+from src.embedding_cache import EmbeddingCache
+
+RULE = ('A player who commits a flagrant foul is ejected from the game and the opposing team is awarded two free throws '
+        'and possession of the ball at the point nearest to where play was stopped.')
+
+
+class CountingEmbeddings():
+
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts: list):
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_same_rule_in_two_leagues_is_one_canonical_chunk():
+    deduplicator = ChunkDeduplicator()
+    assert deduplicator.find_or_add(('NBA', 0), RULE.replace('game', 'NBA game')) == ('NBA', 0)
+    assert deduplicator.find_or_add(('WNBA', 0), RULE.replace('game', 'WNBA game')) == ('NBA', 0)
+    assert deduplicator.find_or_add(('WNBA', 1), 'The shot clock resets to 14 seconds after an offensive rebound.') == ('WNBA', 1)
+
+
+def test_shared_chunks_are_embedded_once(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.pkl'))
+    embeddings = CountingEmbeddings()
+    nba = cache.embed([RULE.replace('game', 'NBA game')], embeddings)
+    wnba = cache.embed([RULE.replace('game', 'WNBA game')], embeddings)
+
+    assert len(embeddings.texts) == 1 and wnba == nba
+    assert cache.stats['near_duplicates'] == 1
+
+
+def test_collapse_keeps_the_higher_ranked_copy():
+    docs = [Document(page_content=RULE, metadata={'league': 'NBA'}), Document(page_content=RULE, metadata={'league': 'WNBA'}),
+            Document(page_content='Icing is waved off when the team is shorthanded.', metadata={'league': 'NHL'})]
+    assert [doc.metadata['league'] for doc in collapse_duplicate_documents(docs)] == ['NBA', 'NHL']
@@ -0,0 +1,163 @@
+import time
+import threading
+
+import pytest
+
+from src import inference
+from src.inference import RequestPolicy, CircuitBreaker
+
+MAIN_MODEL = 'main'
+FALLBACK_MODEL = 'fallback'
+
+
+class FakeChunk():
+
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChat():
+    """
+    Plays one script per request: a list of delays before each token, and optionally an error before the first token
+    """
+
+    def __init__(self, scripts: list):
+        self.scripts = scripts
+        self.requests = 0
+        self.closed = []
+        self.lock = threading.Lock()
+
+    def next_script(self):
+        with self.lock:
+            script = self.scripts[min(self.requests, len(self.scripts) - 1)]
+            self.requests += 1
+            return script
+
+    def stream(self, prompt: str):
+        name, delays, error = self.next_script()
+        try:
+            if error is not None:
+                time.sleep(delays[0])
+                raise error
+            for i, delay in enumerate(delays):
+                time.sleep(delay)
+                yield FakeChunk(f'{name} {i}')
+        finally:
+            self.closed.append(name)
+
+    def invoke(self, prompt: str):
+        return FakeChunk(' '.join(chunk.content for chunk in self.stream(prompt)))
+
+
+@pytest.fixture
+def chats(monkeypatch):
+    chats = {FALLBACK_MODEL: FakeChat([('fallback', [0.0, 0.0], None)])}
+    monkeypatch.setattr(inference, 'initialize_mistral_chat', lambda model: chats[model])
+    return chats
+
+
+def make_policy(timeout: float = 2.0, hedge_delay: float = 0.1):
+    policy = RequestPolicy(fallback_model=FALLBACK_MODEL, timeout=timeout, enabled=True)
+    policy.get_hedge_delay = lambda model, call: hedge_delay
+    return policy
+
+
+def read_stream(policy: RequestPolicy, timeout: float = 3.0):
+    # Reads the stream on a thread so a hang fails the test instead of blocking it
+    result = {}
+
+    def read():
+        try:
+            result['chunks'] = [chunk.content for chunk in policy.stream('prompt', model=MAIN_MODEL)]
+        except Exception as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'The stream hung'
+    return result
+
+
+def wait_for_attempts_to_end(policy: RequestPolicy):
+    deadline = time.monotonic() + 2
+    while policy.attempts_in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return policy.attempts_in_flight
+
+
+def test_hedge_wins_and_streams_to_the_end(chats):
+    # The first request is slower than the hedge delay, the duplicate answers first and keeps streaming after the loser's first token
+    chats[MAIN_MODEL] = FakeChat([('slow', [0.3, 0.0, 0.0], None), ('hedge', [0.0, 0.2, 0.2, 0.0], None)])
+    policy = make_policy(hedge_delay=0.1)
+
+    result = read_stream(policy)
+
+    assert result == {'chunks': ['hedge 0', 'hedge 1', 'hedge 2', 'hedge 3']}
+    assert policy.stats['hedges'] == 1 and policy.stats['hedge_wins'] == 1
+    # The loser was stopped and its stream closed, and no attempt is left running
+    assert wait_for_attempts_to_end(policy) == 0
+    assert 'slow' in chats[MAIN_MODEL].closed
+
+
+def test_first_request_wins_without_a_hedge(chats):
+    chats[MAIN_MODEL] = FakeChat([('main', [0.0, 0.0], None)])
+    policy = make_policy(hedge_delay=1.0)
+    assert read_stream(policy) == {'chunks': ['main 0', 'main 1']}
+    assert policy.stats['hedges'] == 0
+
+
+def test_failed_first_request_is_hedged_right_away(chats):
+    chats[MAIN_MODEL] = FakeChat([('broken', [0.0], ConnectionError('reset')), ('retry', [0.0], None)])
+    policy = make_policy(hedge_delay=5.0)
+    start = time.monotonic()
+    assert read_stream(policy) == {'chunks': ['retry 0']}
+    assert time.monotonic() - start < 1.0
+
+
+def test_slow_model_falls_back_after_the_timeout(chats):
+    chats[MAIN_MODEL] = FakeChat([('stuck', [1.0], None)])
+    policy = make_policy(timeout=0.3, hedge_delay=0.1)
+    assert read_stream(policy) == {'chunks': ['fallback 0', 'fallback 1']}
+    assert policy.stats['timeouts'] == 1 and policy.stats['fallbacks'] == 1
+    assert policy.get_breaker(MAIN_MODEL).failures == 1
+
+
+def test_winner_that_stalls_mid_stream_is_given_up_on(chats):
+    chats[MAIN_MODEL] = FakeChat([('stalls', [0.0, 1.0], None)])
+    policy = make_policy(timeout=0.3, hedge_delay=1.0)
+    result = read_stream(policy)
+    assert isinstance(result['error'], TimeoutError)
+
+
+def test_no_hedge_while_the_pool_is_full(chats):
+    chats[MAIN_MODEL] = FakeChat([('slow', [0.2], None)])
+    policy = make_policy(hedge_delay=0.05)
+    policy.max_attempts = 1
+    assert read_stream(policy) == {'chunks': ['slow 0']}
+    assert policy.stats['hedges'] == 0 and policy.stats['hedges_skipped'] == 1
+
+
+def test_invoke_takes_the_hedge_when_it_answers_first(chats):
+    chats[MAIN_MODEL] = FakeChat([('slow', [0.5], None), ('hedge', [0.0], None)])
+    policy = make_policy(hedge_delay=0.1)
+    assert policy.invoke('prompt', model=MAIN_MODEL) == 'hedge 0'
+    assert policy.stats['hedge_wins'] == 1
+
+
+def test_open_circuit_skips_the_main_model_until_the_reset(chats):
+    chats[MAIN_MODEL] = FakeChat([('main', [0.0], None)])
+    policy = make_policy()
+    policy.breakers[MAIN_MODEL] = breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.2)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert breaker.get_state() == 'open'
+    assert policy.invoke('prompt', model=MAIN_MODEL) == 'fallback 0 fallback 1'
+    assert policy.stats['circuit_skips'] == 1 and chats[MAIN_MODEL].requests == 0
+
+    # After the reset one trial request reaches the main model and closes the circuit when it succeeds
+    time.sleep(0.25)
+    assert breaker.get_state() == 'half-open'
+    assert policy.invoke('prompt', model=MAIN_MODEL) == 'main 0'
+    assert breaker.get_state() == 'closed'
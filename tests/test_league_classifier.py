@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from src import league_classifier
+from src.Sports import Sports
+from src.league_classifier import classify_league
+
+
+class FailingEmbeddings():
+    # Fails the test if the classifier makes an embedding call
+
+    def embed_query(self, text: str):
+        raise AssertionError('The keywords should have been decisive')
+
+
+class FakeEmbeddings():
+
+    def __init__(self, vector):
+        self.vector = vector
+        self.calls = 0
+
+    def embed_query(self, text: str):
+        self.calls += 1
+        return self.vector
+
+
+@pytest.fixture
+def centroids(monkeypatch):
+    # One axis per league, so a query along an axis is closest to that league
+    names = Sports.get_all_names()
+    fake = {name: np.eye(len(names), dtype=np.float32)[i] for i, name in enumerate(names)}
+    monkeypatch.setattr(league_classifier, 'load_centroids', lambda: fake)
+    return names
+
+
+def test_decisive_keywords_skip_the_embedding_call():
+    ranked, query_embedding = classify_league('Is icing waved off during a power play?', embedding_model=FailingEmbeddings())
+    assert [sport for sport, _ in ranked] == [Sports.NHL]
+    assert query_embedding is None
+
+
+def test_ambiguous_question_is_settled_by_the_centroids(centroids):
+    vector = np.eye(len(centroids))[centroids.index('PGA')].tolist()
+    embeddings = FakeEmbeddings(vector)
+    ranked, query_embedding = classify_league('What happens if you lose your ball?', embedding_model=embeddings)
+
+    assert ranked[0][0] == Sports.PGA
+    assert embeddings.calls == 1 and query_embedding == vector
+
+
+def test_keywords_only_never_embeds():
+    ranked, query_embedding = classify_league('What happens if you lose your ball?', prior=Sports.MLB,
+                                              embedding_model=FailingEmbeddings(), use_centroids=False)
+    assert ranked[0][0] == Sports.MLB
+    assert query_embedding is None
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+from tokenizers import Tokenizer
+from langchain_mistralai import ChatMistralAI, MistralAIEmbeddings
+
+from src import constants
+from src.mock_mistral import start_mock_server, MOCK_ANSWER, EMBEDDING_DIMENSION
+from src.reranker import RERANKER_FOLDER
+
+
+@pytest.fixture
+def server():
+    server = start_mock_server(chat_latency='fixed:0', embedding_latency='fixed:0', chunk_interval=0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.skipif('MISTRAL_ENDPOINT' in os.environ, reason='The endpoint is overridden')
+def test_default_endpoint_is_the_base_url():
+    # The client adds /v1/... itself, a /v1 here would request /v1/v1/...
+    assert constants.MISTRAL_ENDPOINT == 'https://api.mistral.ai'
+
+
+def test_clients_round_trip_through_the_mock_server(server):
+    chat = ChatMistralAI(mistral_api_key='test', endpoint=server.get_endpoint(), model='mistral-small', max_retries=1)
+    # The embeddings client only uses its tokenizer to size batches, a local one avoids downloading Mixtral's
+    embeddings = MistralAIEmbeddings(mistral_api_key='test', endpoint=server.get_endpoint(),
+                                     tokenizer=Tokenizer.from_file(os.path.join(RERANKER_FOLDER, 'tokenizer.json')))
+
+    assert chat.invoke('What is icing?').content == MOCK_ANSWER
+    assert ''.join(chunk.content for chunk in chat.stream('What is icing?')) == MOCK_ANSWER
+    assert len(embeddings.embed_query('What is icing?')) == EMBEDDING_DIMENSION
+
+    # Only the real API paths were requested, so the same endpoint setting works against api.mistral.ai
+    assert server.request_counts == {'/v1/chat/completions': 2, '/v1/embeddings': 1}
+
+
+def test_unknown_paths_are_not_found(server):
+    chat = ChatMistralAI(mistral_api_key='test', endpoint=server.get_endpoint() + '/v1', model='mistral-small', max_retries=1)
+    with pytest.raises(Exception, match='404|Unknown endpoint'):
+        chat.invoke('What is icing?')
+    assert server.request_counts == {'/v1/v1/chat/completions': 1}
@@ -0,0 +1,90 @@
+import time
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from src import pipeline, prefetch
+from src.Sports import Sports
+from src.prefetch import Prefetcher
+
+
+class FakeEmbeddings():
+
+    def __init__(self, **kwargs):
+        pass
+
+    def embed_documents(self, texts: list):
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.fixture
+def league(monkeypatch):
+    # NHL with one starter question, its index "loaded" once get_db has been called for it
+    loaded = []
+    monkeypatch.setattr(prefetch, 'STARTER_QUESTIONS', {'NHL': ['What is icing?']})
+    monkeypatch.setattr(prefetch, 'MistralAIEmbeddings', FakeEmbeddings)
+    monkeypatch.setattr(prefetch, 'load_ranker', lambda: None)
+    monkeypatch.setattr(prefetch, 'get_db', lambda sport, season=None: loaded.append((sport, season)))
+    monkeypatch.setattr(prefetch, 'is_db_loaded', lambda sport, season=None: bool(loaded))
+    return loaded
+
+
+def wait_for_warm_up(prefetcher: Prefetcher):
+    for future in list(prefetcher.in_flight.values()):
+        future.result(timeout=2)
+
+
+def test_selecting_a_league_warms_it_once(league):
+    prefetcher = Prefetcher(enabled=True)
+    prefetcher.prefetch(Sports.NHL)
+    wait_for_warm_up(prefetcher)
+    prefetcher.prefetch(Sports.NHL)
+    wait_for_warm_up(prefetcher)
+
+    assert league == [(Sports.NHL, Sports.NHL.value.current_season)]
+    assert prefetcher.is_warm(Sports.NHL)
+    assert prefetcher.get_query_embedding(Sports.NHL, 'what is ICING') == [14.0]
+
+
+def test_failed_warm_up_is_not_retried_right_away(league, monkeypatch):
+    attempts = []
+
+    def get_db(sport, season=None):
+        attempts.append(sport)
+        raise FileNotFoundError('no index')
+
+    monkeypatch.setattr(prefetch, 'get_db', get_db)
+    prefetcher = Prefetcher(enabled=True)
+    for _ in range(3):
+        prefetcher.prefetch(Sports.NHL)
+        wait_for_warm_up(prefetcher)
+    assert attempts == [Sports.NHL]
+
+    # Once the backoff has passed the league is tried again
+    monkeypatch.setattr(prefetch, 'PREFETCH_RETRY_SECONDS', 0)
+    prefetcher.prefetch(Sports.NHL)
+    wait_for_warm_up(prefetcher)
+    assert attempts == [Sports.NHL, Sports.NHL]
+
+
+def test_question_during_warm_up_waits_for_the_same_load(monkeypatch):
+    loads = []
+
+    def load_faiss_db(sport, season=None):
+        loads.append((sport, season))
+        time.sleep(0.1)
+        return object()
+
+    monkeypatch.setattr(pipeline, 'load_faiss_db', load_faiss_db)
+    monkeypatch.setattr(pipeline, '_dbs', OrderedDict())
+    dbs = []
+    threads = [threading.Thread(target=lambda: dbs.append(pipeline.get_db(Sports.NHL))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2)
+
+    assert len(loads) == 1
+    assert len(dbs) == 3 and all(db is dbs[0] for db in dbs)
+    assert pipeline.is_db_loaded(Sports.NHL)
@@ -0,0 +1,95 @@
+import os
+import gc
+import socket
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from src import prefork
+from src.Sports import Sports
+from src.admission import OverloadedError
+from src.prefork import PreforkHandler, answer_remote, read_memory
+
+
+class FakePrefork():
+    # Stands in for the worker pool behind the HTTP front end
+
+    def __init__(self, overloaded: bool = False):
+        self.overloaded = overloaded
+        self.requests = []
+
+    def answer(self, request: dict):
+        self.requests.append(request)
+        if self.overloaded:
+            raise OverloadedError('No worker answered in time, please try again shortly')
+        return {'answer': 'Icing is waved off.', 'prompt': 'prompt', 'leagues': [request['league']], 'pid': 1}
+
+    def get_worker_memory(self):
+        return [read_memory(os.getpid())]
+
+
+@pytest.fixture
+def front_end():
+    servers = []
+
+    def start(prefork_server):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), PreforkHandler)
+        server.daemon_threads = True
+        server.prefork = prefork_server
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_address[1]}'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_preload_pins_built_indexes_and_skips_missing_ones(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / Sports.NHL.value.index_name)
+    (tmp_path / Sports.NHL.value.index_name / 'index.faiss').touch()
+    pinned = []
+    monkeypatch.setattr(prefork, 'FAISS_DB_FOLDER', str(tmp_path))
+    monkeypatch.setattr(prefork, 'pin_db', pinned.append)
+    monkeypatch.setattr(prefork, '_preloaded', False)
+    monkeypatch.setattr(prefork, 'RERANKER_BACKEND', 'flashrank')
+
+    try:
+        prefork.preload()
+        prefork.preload()
+    finally:
+        gc.unfreeze()
+    assert pinned == [Sports.NHL]
+
+
+def test_turn_round_trips_through_the_front_end(front_end):
+    fake = FakePrefork()
+    endpoint = front_end(fake)
+    answer, prompt, leagues = answer_remote(endpoint, Sports.NHL, 'When is icing waved off?', query_embedding=[0.5, 1])
+
+    assert (answer, prompt, leagues) == ('Icing is waved off.', 'prompt', [Sports.NHL])
+    assert fake.requests[0]['query_embedding'] == [0.5, 1.0]
+
+
+def test_overloaded_workers_are_reported_to_the_caller(front_end):
+    endpoint = front_end(FakePrefork(overloaded=True))
+    with pytest.raises(OverloadedError):
+        answer_remote(endpoint, Sports.NHL, 'When is icing waved off?')
+
+
+def test_unreachable_server_answers_locally(monkeypatch):
+    # Find a port nothing is listening on
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    monkeypatch.setattr(prefork, 'answer_question', lambda sport, question, **kwargs: ('local answer', 'prompt', [sport]))
+
+    assert answer_remote(f'http://127.0.0.1:{port}', Sports.NHL, 'When is icing waved off?') == ('local answer', 'prompt', [Sports.NHL])
+
+
+def test_worker_memory_is_split_into_shared_and_private():
+    memory = read_memory(os.getpid())
+    assert memory['rss_mb'] > 0
+    assert memory['shared_mb'] + memory['private_mb'] == pytest.approx(memory['rss_mb'], abs=1.0)
@@ -0,0 +1,126 @@
+import os
+import time
+
+import numpy as np
+from tokenizers import Tokenizer
+from langchain_core.documents import Document
+
+from src import faiss_db, reranker
+from flashrank import RerankRequest
+
+from src.reranker import RerankerEngine, ScoreCache, RERANKER_FOLDER, load_tokenizer
+
+
+class FakeInput():
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class FakeSession():
+    """
+    Scores each pair by how many of its tokens the passage shares with the query, and counts model calls
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def get_inputs(self):
+        return [FakeInput('input_ids'), FakeInput('attention_mask'), FakeInput('token_type_ids')]
+
+    def run(self, output_names, inputs):
+        self.calls.append(len(inputs['input_ids']))
+        logits = []
+        for ids, mask, types in zip(inputs['input_ids'], inputs['attention_mask'], inputs['token_type_ids']):
+            query = set(ids[(mask == 1) & (types == 0)]) - {101, 102}
+            passage = set(ids[(mask == 1) & (types == 1)]) - {101, 102}
+            logits.append([len(query & passage) - 2.0])
+        return [np.array(logits)]
+
+
+class FakeRanker():
+    # Same session and tokenizer attributes as flashrank's Ranker
+
+    def __init__(self):
+        self.session = FakeSession()
+        self.tokenizer = Tokenizer.from_file(os.path.join(RERANKER_FOLDER, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=128)
+        self.tokenizer.enable_padding(pad_id=0, pad_token='[PAD]')
+
+
+def make_engine(max_tokens: int = 128, cache: ScoreCache = None):
+    # An engine without the exported model, set up like __init__ apart from the fake session
+    engine = RerankerEngine.__new__(RerankerEngine)
+    engine.session, engine.tokenizer, engine.cache = FakeSession(), load_tokenizer(max_tokens), cache or ScoreCache()
+    return engine
+
+
+DOCS = [Document(page_content=text, metadata={'chunk_hash': str(i)}) for i, text in enumerate([
+    'A goal is scored when the ball crosses the goal line.',
+    'The disc may not be handed off to a teammate.',
+    'A foul is called on contact with the thrower.',
+    'Players substitute after each point is scored.',
+])]
+
+
+def test_batch_rerank_scores_every_question_in_few_model_calls(monkeypatch):
+    ranker = FakeRanker()
+    monkeypatch.setattr(faiss_db, 'load_ranker', lambda: ranker)
+    queries = ['when is a goal scored', 'can the disc be handed off', 'what is a foul on the thrower']
+
+    context_lists = faiss_db.rerank_documents_batch([DOCS] * len(queries), queries=queries)
+
+    # 12 pairs fit in one model call instead of one call per question
+    assert ranker.session.calls == [12]
+    assert [contexts[0].page_content for contexts in context_lists] == [DOCS[0].page_content, DOCS[1].page_content, DOCS[2].page_content]
+    assert all(len(contexts) == faiss_db.RERANKER_TOP_N for contexts in context_lists)
+    assert all('relevance_score' in doc.metadata for contexts in context_lists for doc in contexts)
+
+
+def test_score_pairs_splits_pairs_into_batches():
+    ranker = FakeRanker()
+    scores = reranker.score_pairs(ranker, [('goal', doc.page_content) for doc in DOCS] * 3, batch_size=5)
+    assert ranker.session.calls == [5, 5, 2]
+    assert len(scores) == 12 and all(0 < score < 1 for score in scores)
+
+
+def test_engine_batch_only_scores_uncached_pairs(monkeypatch):
+    engine = make_engine()
+    monkeypatch.setattr(faiss_db, 'load_ranker', lambda: engine)
+
+    first = faiss_db.rerank_documents_batch([DOCS, DOCS], queries=['when is a goal scored', 'can the disc be handed off'])
+    second = faiss_db.rerank_documents_batch([DOCS, DOCS[:2]], queries=['when is a goal scored', 'what is a foul on the thrower'])
+
+    # The first question was cached, so only the new question's two pairs reach the model
+    assert engine.session.calls == [8, 2]
+    assert [doc.page_content for doc in second[0]] == [doc.page_content for doc in first[0]]
+
+
+def test_long_pairs_are_cut_from_the_longer_side():
+    tokenizer = load_tokenizer(max_tokens=32)
+    long_query = ' '.join(['icing'] * 40)
+    long_passage = ' '.join(['offside'] * 40)
+
+    # A query longer than the limit no longer pushes the passage out entirely
+    encoding = tokenizer.encode(long_query, 'offside is called')
+    assert len(encoding.ids) == 32
+    assert sum(encoding.type_ids) == len(tokenizer.encode('offside is called', add_special_tokens=False).ids) + 1
+    # Two long sides are cut to roughly equal shares
+    encoding = tokenizer.encode(long_query, long_passage)
+    assert len(encoding.ids) == 32 and abs(encoding.type_ids.count(0) - encoding.type_ids.count(1)) <= 2
+
+
+def test_engine_ranks_like_flashrank_and_caches_scores():
+    engine = make_engine(cache=ScoreCache(ttl=0.1))
+    passages = [{'id': i, 'text': doc.page_content, 'meta': doc.metadata} for i, doc in enumerate(DOCS)]
+    request = RerankRequest(query='can the disc be handed off', passages=passages)
+
+    results = engine.rerank(request)
+    assert results[0]['id'] == 1 and results[0]['score'] >= results[1]['score']
+    assert engine.rerank(request) == results
+    assert engine.session.calls == [4]
+
+    # Scores expire after the TTL
+    time.sleep(0.15)
+    engine.rerank(request)
+    assert engine.session.calls == [4, 4]
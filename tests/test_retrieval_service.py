@@ -0,0 +1,92 @@
+import time
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+from langchain_community.vectorstores import FAISS
+from langchain_community.embeddings import FakeEmbeddings
+
+from src import pipeline, retrieval_service
+from src.Sports import Sports
+from src.retrieval_service import ShardCache, ShardHandler, ShardedRetriever, assign_shards
+
+SHARD_TEXTS = {
+    ('NHL', '2024'): [('Icing is waved off when shorthanded.', [0.0, 0.0]), ('A faceoff follows icing.', [3.0, 0.0])],
+    ('NBA', '2024'): [('The shot clock is 24 seconds.', [1.0, 0.0]), ('A dunk counts two points.', [5.0, 0.0])],
+}
+
+
+def make_db(shard: tuple):
+    return FAISS.from_embeddings(SHARD_TEXTS[shard], FakeEmbeddings(size=2))
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    # Counts index loads, each taking long enough for concurrent requests to overlap
+    loads = []
+
+    def load_faiss_db(sport, season=None):
+        loads.append((sport.name, season))
+        time.sleep(0.1)
+        return make_db((sport.name, season))
+
+    monkeypatch.setattr(retrieval_service, 'load_faiss_db', load_faiss_db)
+    return loads
+
+
+def start_worker(shards: list):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ShardHandler)
+    server.daemon_threads = True
+    server.shard_cache = ShardCache(shards)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def test_shards_are_balanced_by_index_bytes(monkeypatch):
+    sizes = {('NFL', '2024'): 50, ('NBA', '2024'): 40, ('NHL', '2024'): 30, ('MLB', '2024'): 20}
+    monkeypatch.setattr(retrieval_service, 'get_shard_bytes', lambda shard: sizes[shard])
+    assignments = assign_shards(list(sizes), num_workers=2)
+    assert sorted(sum(sizes[shard] for shard in worker) for worker in assignments) == [70, 70]
+
+
+def test_concurrent_requests_load_a_shard_once(loads):
+    cache = ShardCache([('NHL', '2024')])
+    dbs = []
+    threads = [threading.Thread(target=lambda: dbs.append(cache.get(('NHL', '2024')))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2)
+    assert loads == [('NHL', '2024')]
+    assert len(dbs) == 4 and all(db is dbs[0] for db in dbs)
+
+
+def test_scatter_gather_merges_shards_and_reports_missing(loads):
+    servers = [start_worker([('NHL', '2024')]), start_worker([('NBA', '2024')])]
+    try:
+        retriever = ShardedRetriever([endpoint for _, endpoint in servers])
+        docs, missing = retriever.search([('NHL', '2024'), ('NBA', '2024'), ('MLB', '2024')], [0.4, 0.0], k=3)
+    finally:
+        for server, _ in servers:
+            server.shutdown()
+            server.server_close()
+
+    # Ordered by distance across both workers
+    assert [doc.page_content for doc in docs] == ['Icing is waved off when shorthanded.', 'The shot clock is 24 seconds.',
+                                                  'A faceoff follows icing.']
+    assert missing == [('MLB', '2024')]
+
+
+class FailingRetriever():
+
+    def search(self, shards, query_embedding, k=15):
+        raise requests.ConnectionError('worker went away')
+
+
+def test_search_falls_back_to_local_indexes_when_the_service_fails(monkeypatch):
+    monkeypatch.setattr(pipeline, 'get_retriever', lambda: FailingRetriever())
+    monkeypatch.setattr(pipeline, 'get_db', lambda sport, season=None: make_db((sport.name, '2024')))
+
+    docs = pipeline.search_index([(Sports.NHL, None), (Sports.NBA, None)], 'icing', query_embedding=[0.4, 0.0], k=2)
+    assert [doc.page_content for doc in docs] == ['Icing is waved off when shorthanded.', 'The shot clock is 24 seconds.']
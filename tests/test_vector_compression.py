@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_community.embeddings import FakeEmbeddings
+
+from src.vector_compression import compress_index, load_compressed_db, compare_compression
+
+DIMENSION = 128  # A multiple of PQ_SUBQUANTIZERS, like the 1024 of mistral-embed
+
+
+@pytest.fixture
+def index_folder(tmp_path):
+    # A saved float32 index of random vectors, like the ones scripts/build.py writes
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(300, DIMENSION)).astype(np.float32)
+    db = FAISS.from_embeddings([(f'chunk {i}', vector.tolist()) for i, vector in enumerate(vectors)], FakeEmbeddings(size=DIMENSION))
+    db.save_local(str(tmp_path))
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize('method', ['fp16', 'sq8', 'pq'])
+def test_compressed_db_rescores_with_exact_distances(index_folder, method):
+    exact_db = FAISS.load_local(index_folder, FakeEmbeddings(size=DIMENSION), allow_dangerous_deserialization=True)
+    compress_index(index_folder, method)
+    compressed_db = load_compressed_db(index_folder, FakeEmbeddings(size=DIMENSION), method=method)
+
+    query = (exact_db.index.reconstruct(7) + 0.01).tolist()
+    exact = exact_db.similarity_search_with_score_by_vector(query, k=3)
+    compressed = compressed_db.similarity_search_with_score_by_vector(query, k=3)
+
+    # The nearest chunk is found and its distance comes from the float32 store, not the compressed codes
+    assert compressed[0][0].page_content == exact[0][0].page_content == 'chunk 7'
+    assert compressed[0][1] == pytest.approx(exact[0][1], rel=1e-4)
+
+
+def test_compression_report_shrinks_the_index(index_folder):
+    results = {result['method']: result for result in compare_compression(index_folder, num_queries=50)}
+    assert results['sq8']['bytes'] < results['fp16']['bytes'] < results['float32']['bytes']
+    assert results['sq8']['rescored_recall'] >= 0.9
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+from src.Sports import base
+from src.Sports.ultimate import USAU_Ultimate
+from src.Sports.soccer import MLS_Soccer
+
+
+class FakeResponse():
+
+    def __init__(self, status_code: int, content: bytes = b'', headers: dict = None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f'HTTP {self.status_code}')
+
+
+class FakeSession():
+    """
+    Serves a page with an ETag and answers 304 when the request repeats it
+    """
+
+    def __init__(self, content: bytes, etag: str = '"v1"'):
+        self.content = content
+        self.etag = etag
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append(headers or {})
+        if (headers or {}).get('If-None-Match') == self.etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.content, {'ETag': self.etag})
+
+
+def read_fixture(sport_obj):
+    with open(sport_obj.get_http_fixture_path(sport_obj.online_link), 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def http_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(base, 'HTTP_CACHE_FOLDER', str(tmp_path))
+    monkeypatch.setattr(base, 'HTTP_OFFLINE', False)
+    return tmp_path
+
+
+def use_session(monkeypatch, session):
+    monkeypatch.setattr(base, 'get_http_session', lambda: session)
+
+
+def test_usau_parser_reads_rules_and_appendices_once():
+    sport_obj = USAU_Ultimate()
+    text = sport_obj.parse_rules(read_fixture(sport_obj))
+    assert 'A player may not run while holding the disc.' in text
+    assert 'Appendix A: Youth Ultimate' in text
+    assert text.count('Ultimate relies upon a spirit of sportsmanship') == 1
+
+
+def test_mls_parser_reads_article_body():
+    sport_obj = MLS_Soccer()
+    text = sport_obj.parse_rules(read_fixture(sport_obj))
+    assert 'If two or more clubs are tied on points' in text
+    assert 'Competition Guidelines' not in text
+
+
+def test_fetch_sends_etag_and_reports_unchanged_on_304(http_cache, monkeypatch):
+    sport_obj = USAU_Ultimate()
+    session = FakeSession(read_fixture(sport_obj))
+    use_session(monkeypatch, session)
+
+    first, changed = sport_obj.fetch(sport_obj.online_link, parse=sport_obj.parse_rules)
+    assert changed
+    second, changed = sport_obj.fetch(sport_obj.online_link, parse=sport_obj.parse_rules)
+    assert not changed
+    assert second == first
+    assert session.requests[1]['If-None-Match'] == '"v1"'
+    assert sport_obj.scrape_data(only_if_changed=True) is None
+
+
+def test_fetch_does_not_cache_a_page_that_fails_to_parse(http_cache, monkeypatch):
+    sport_obj = USAU_Ultimate()
+    use_session(monkeypatch, FakeSession(b'<html><body>Maintenance</body></html>'))
+    with pytest.raises(AttributeError):
+        sport_obj.fetch(sport_obj.online_link, parse=sport_obj.parse_rules)
+    assert os.listdir(http_cache) == []
+
+    # Once the page is fixed it is fetched without a conditional header and reported as changed
+    session = FakeSession(read_fixture(sport_obj))
+    use_session(monkeypatch, session)
+    _, changed = sport_obj.fetch(sport_obj.online_link, parse=sport_obj.parse_rules)
+    assert changed
+    assert 'If-None-Match' not in session.requests[0]
+
+
+def test_offline_replays_fixture_without_network(http_cache, monkeypatch):
+    monkeypatch.setattr(base, 'HTTP_OFFLINE', True)
+    monkeypatch.setattr(base, 'get_http_session', lambda: pytest.fail('Offline mode made a request'))
+    sport_obj = MLS_Soccer()
+    assert 'MLS Regular Season' in sport_obj.scrape_data()
+    assert sport_obj.scrape_data(only_if_changed=True) is None
@@ -1,9 +1,15 @@
 # Imports
+import time
+import uuid
 import streamlit as st
 
 from src.Sports import Sports
-from src.faiss_db import load_faiss_db, query_faiss_db, query_faiss_with_rerank
-from src.inference import construct_prompt, invoke_llm, stream_llm, context_required
+from src.conversation import create_conversation_store
+from src.admission import OverloadedError
+from src.pipeline import stream_answer, get_pipeline_metrics
+from src.prefetch import Prefetcher
+from src.prefork import answer_remote
+from src.constants import ROUTER_HISTORY_MESSAGES, ANSWER_HISTORY_MESSAGES, PREFORK_ENDPOINT
 
 # Constants
 SPORT_LEAGUE_MAPPING = {
@@ -29,9 +35,24 @@ LEAGUE_TO_ENUM_MAPPING = {
     'PGA': Sports.PGA
 }
 
+@st.cache_resource
+def get_conversation_store():
+    # One store shared by every session in this process
+    return create_conversation_store()
+
+@st.cache_resource
+def get_prefetcher():
+    # One prefetcher shared by every session so each league is only warmed up once
+    return Prefetcher()
+
 def clear_chat_history():
-    if "messages" in st.session_state:
-        st.session_state.messages = []
+    if "session_id" in st.session_state:
+        get_conversation_store().clear(st.session_state.session_id)
+
+def show_leagues(leagues: list, selected: Sports):
+    # Say when the answer comes from a rulebook other than the selected one
+    if leagues and leagues != [selected]:
+        st.caption(f'Answered from the {", ".join(league.value.league_name for league in leagues)} rulebook{"s" if len(leagues) > 1 else ""}')
 
 def main():
     # Create a title for the app
@@ -46,46 +67,84 @@ def main():
     
     # Link the rulebook of the sport they are on
     sport_enum = LEAGUE_TO_ENUM_MAPPING[league]
+    seasons = sport_enum.value.get_seasons()
+    season = seasons[-1]
+    if len(seasons) > 1:
+        season = st.selectbox('Select a season', list(reversed(seasons)), on_change=clear_chat_history)
+    # Start loading the selected league in the background while the user types, on page load and on every change.
+    # The pre-fork workers already hold every index, so there is nothing to load here when they answer the turns.
+    prefetcher = get_prefetcher()
+    if not PREFORK_ENDPOINT:
+        prefetcher.prefetch(sport_enum, season)
     st.markdown(f'Check out the [Offical {sport_enum.value.league_name} Rulebook]({sport_enum.value.online_link})')
+    auto_detect = st.toggle('Detect the league from my question', value=True)
     
     # Create the chat message box and introduce ourself
     st.chat_message('assistant').write("""Welcome, I am here to answer any questions you may have about the official rules of different sports. 
                             Select a sport and corresponding league from the drop-down menus above and then feel free to ask me anything!""")
     
     # Initialize chat history
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    store = get_conversation_store()
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = str(uuid.uuid4())
+    session_id = st.session_state.session_id
 
     # Display chat messages from history on app rerun
-    for message in st.session_state.messages:
+    for message in store.get_messages(session_id):
         with st.chat_message(message["role"]):
             st.write(message["content"])
     
     if question := st.chat_input("Ask a question", max_chars=250):
+        # Time the first question of each session to see what prefetching saves
+        start = time.perf_counter()
+        first_question = not store.get_messages(session_id)
+        prefetched = prefetcher.is_warm(sport_enum, season)
+
         # Display user message in chat message container
         st.chat_message('User').write(question)
-        # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": question})
 
-        # Determine if we need to get context with RAG or not
-        if context_required(sport=sport_enum, query=question, chat_history=st.session_state.messages):
-            # Load the appropriate FAISS db
-            db = load_faiss_db(sport=sport_enum)
-            context_list = query_faiss_with_rerank(db, query=question)
-        else:
-            context_list = None
-        
-        # Get a response from the LLM
-        prompt = construct_prompt(sport=sport_enum,
-                                  query=question,
-                                  context_list=context_list,
-                                  chat_history=st.session_state.messages)
+        query_embedding = prefetcher.get_query_embedding(sport_enum, question)
 
-        #response_stream = stream_llm(prompt=prompt)
-        response = invoke_llm(prompt=prompt)
-        st.chat_message('assistant').write(response)
-        # Add assistant response to chat history
-        st.session_state.messages.append({"role": "assistant", "content": response})
+        # Run the router, retrieval and answer stages, sharing work with identical questions from other users.
+        # With auto detect on, the selected league is only a prior and the question may be answered from other rulebooks.
+        router_history = store.get_history(session_id, max_messages=ROUTER_HISTORY_MESSAGES, include_summary=False)
+        answer_history = store.get_history(session_id, max_messages=ANSWER_HISTORY_MESSAGES)
+        try:
+            if PREFORK_ENDPOINT:
+                # Let the pre-fork server's workers run the turn instead of this process
+                response, prompt, leagues = answer_remote(PREFORK_ENDPOINT, sport_enum, question, season=season, query_embedding=query_embedding,
+                                                          router_history=router_history, answer_history=answer_history, detect_league=auto_detect)
+                show_leagues(leagues, sport_enum)
+                st.chat_message('assistant').write(response)
+            else:
+                stream = stream_answer(sport_enum, question, season=season, query_embedding=query_embedding,
+                                       router_history=router_history, answer_history=answer_history, detect_league=auto_detect)
+                prompt, leagues = next(stream)
+                show_leagues(leagues, sport_enum)
+                response = st.chat_message('assistant').write_stream(stream)
+        except OverloadedError as e:
+            # The question is only stored once it has been answered, so the user can simply ask it again
+            st.error(f'{e}. Lots of people are asking questions right now.')
+            return
+        if first_question:
+            prefetcher.record_first_question(time.perf_counter() - start, prefetched=prefetched)
+        # Add the question and response to chat history
+        store.append(session_id, role="user", content=question)
+        store.append(session_id, role="assistant", content=response)
+        
+        # Report how much history this session is holding and sending
+        stats = store.get_stats(session_id)
+        st.sidebar.caption(f'Session history: {stats["messages"]} messages, {stats["bytes"]} bytes held. '
+                           f'Last answer prompt: {len(prompt)} chars.')
+        metrics = get_pipeline_metrics()
+        with st.sidebar.expander('Server load'):
+            st.caption(f'Shared answers: {metrics["coalescing"]["coalesced"]} of '
+                       f'{metrics["coalescing"]["coalesced"] + metrics["coalescing"]["executions"]} questions')
+            st.table(metrics['admission'])
+            prefetch_stats = prefetcher.get_stats()
+            for state in ['prefetched', 'cold']:
+                if prefetch_stats[f'{state}_p50'] is not None:
+                    st.caption(f'First question p50 ({state}): {prefetch_stats[f"{state}_p50"]:.2f}s over {prefetch_stats[f"{state}_count"]} sessions')
 
 if __name__ == '__main__':
     main()
\ No newline at end of file